@@ -0,0 +1,98 @@
+"""
+Benchmark the tiled, multithreaded Z-projection of reduceAxis against the single NumPy call it replaces.
+
+Each case projects an in-memory stack with every reduction, once with NumPy and once per worker count, checks the
+results are bit-identical and reports the best time and the effective memory bandwidth (input bytes per second):
+
+    python -m benchmarks.reduction_benchmarks --preset production
+    python -m benchmarks.reduction_benchmarks --workers 1 2 4 8 --output benchmarks/results/reduction.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from benchmarks.run_benchmarks import getRunInfo
+from domilyzer.functions_gui.reduction_functions import REDUCTIONS, REDUCTION_FUNCTIONS, DEFAULT_TILE_BYTES, reduceAxis
+
+# (Z, Y, X) uint16 stacks per preset, production matches a Flamingo stack and a Bruker cycle file
+CASES = {
+    'smoke': [{'name': 'stack_16x256x256', 'shape': (16, 256, 256)}],
+    'production': [
+        {'name': 'bruker_30x512x512', 'shape': (30, 512, 512)},
+        {'name': 'flamingo_200x2048x2048', 'shape': (200, 2048, 2048)},
+    ],
+}
+
+def timeBest(function, repeat: int) -> float:
+    """
+    Return the best wall time of repeat calls of function.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchmarkCase(case: dict, reductions: list, workers: list, repeat: int, tile_bytes: int) -> list:
+    """
+    Time NumPy and reduceAxis on one stack for each reduction and worker count.
+
+    Returns:
+    list: One result per reduction and worker count (0 is the NumPy call), with the best time and bandwidth.
+    """
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 4096, size=case['shape'], dtype=np.uint16)
+    results = []
+    for reduction in reductions:
+        expected = REDUCTION_FUNCTIONS[reduction](stack, axis=0)
+        for num_workers in [0, *workers]:
+            if reduceAxis(stack, 0, reduction, workers=num_workers, tile_bytes=tile_bytes).tobytes() != expected.tobytes():
+                raise AssertionError(f"{case['name']} {reduction} with {num_workers} workers differs from NumPy")
+            seconds = timeBest(lambda: reduceAxis(stack, 0, reduction, workers=num_workers, tile_bytes=tile_bytes), repeat)
+            results.append({'case': case['name'],
+                            'shape': list(case['shape']),
+                            'reduction': reduction,
+                            'workers': num_workers,
+                            'seconds': seconds,
+                            'gb_per_second': stack.nbytes / seconds / 1e9})
+    return results
+
+def formatResults(results: list) -> str:
+    """
+    Return a table of the results, with the speedup of each worker count over the NumPy call.
+    """
+    numpy_seconds = {(result['case'], result['reduction']): result['seconds'] for result in results if result['workers'] == 0}
+    lines = [f"{'Case':<24} {'Reduction':<9} {'Workers':>7} {'Seconds':>9} {'GB/s':>7} {'Speedup':>8}"]
+    for result in results:
+        speedup = numpy_seconds[(result['case'], result['reduction'])] / result['seconds']
+        workers = 'numpy' if result['workers'] == 0 else result['workers']
+        lines.append(f"{result['case']:<24} {result['reduction']:<9} {workers:>7} {result['seconds']:>9.4f} "
+                     f"{result['gb_per_second']:>7.2f} {speedup:>7.2f}x")
+    return '\n'.join(lines)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.reduction_benchmarks', description='Benchmark the tiled Z-projection kernels.')
+    parser.add_argument('--preset', choices=list(CASES), default='smoke', help='Set of stacks to project.')
+    parser.add_argument('--reduction', action='append', choices=REDUCTIONS, help='Only run the named reduction(s).')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='Worker counts to time.')
+    parser.add_argument('--tile-bytes', type=int, default=DEFAULT_TILE_BYTES, help='Target input bytes per tile.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed projections per case, the best is reported.')
+    parser.add_argument('--output', help='Optional results JSON path.')
+    args = parser.parse_args(argv)
+
+    results = []
+    for case in CASES[args.preset]:
+        results.extend(benchmarkCase(case, args.reduction or list(REDUCTIONS), sorted(set(args.workers)), args.repeat, args.tile_bytes))
+    print(formatResults(results))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump({'run': dict(getRunInfo(args.preset), tile_bytes=args.tile_bytes), 'results': results}, file, indent=2)
+
+if __name__ == '__main__':
+    sys.exit(main())
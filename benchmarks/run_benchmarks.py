@@ -0,0 +1,317 @@
+"""
+Benchmark the Bruker, Olympus and Flamingo conversions on synthetic data at production scale.
+
+Each scenario generates its acquisition folders once (reused by later runs), then converts them with the real
+iterateBrukerImages / iterateOlympusImages / processFlamingoImages in a fresh process, so peak RSS is that of
+the conversion alone. Results are written as JSON tagged with the git commit, so runs can be compared:
+
+    python -m benchmarks.run_benchmarks --preset production
+    python -m benchmarks.run_benchmarks --preset production --compare benchmarks/results/<baseline>.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import tifffile
+
+from benchmarks.synthetic_data import generateBrukerFolder, generateOlympusFolder, generateFlamingoFolder
+from domilyzer.functions_gui.general_functions import createImageJMetadataTags
+from domilyzer.functions_gui.instrumentation_functions import StageTimer, getPeakRSS
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.workflows.olympus_workflow import iterateOlympusImages
+from domilyzer.workflows.flamingo_workflow import processFlamingoImages
+
+DEFAULT_RESULTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Scenarios per preset. 'smoke' runs in seconds, 'production' matches typical acquisitions (tens of GB in total).
+SCENARIOS = {
+    'smoke': [
+        {'name': 'bruker_zt_max', 'microscope_type': 'Bruker', 'projection_type': 'max', 'folders': 2, 'T': 3, 'Z': 4, 'C': 2, 'Y': 64, 'X': 64},
+        {'name': 'bruker_zt_full', 'microscope_type': 'Bruker', 'projection_type': None, 'folders': 2, 'T': 3, 'Z': 4, 'C': 2, 'Y': 64, 'X': 64},
+        {'name': 'olympus_zt_max', 'microscope_type': 'Olympus', 'projection_type': 'max', 'folders': 2, 'T': 3, 'Z': 4, 'C': 2, 'Y': 64, 'X': 64},
+        {'name': 'flamingo_zt_max', 'microscope_type': 'Flamingo', 'projection_type': 'max', 'folders': 1, 'T': 2, 'Z': 8, 'C': 2, 'Y': 64, 'X': 64},
+    ],
+    'production': [
+        {'name': 'bruker_zt_max', 'microscope_type': 'Bruker', 'projection_type': 'max', 'folders': 4, 'T': 60, 'Z': 30, 'C': 2, 'Y': 512, 'X': 512},
+        {'name': 'bruker_zt_avg', 'microscope_type': 'Bruker', 'projection_type': 'avg', 'folders': 4, 'T': 60, 'Z': 30, 'C': 2, 'Y': 512, 'X': 512},
+        {'name': 'bruker_zt_full', 'microscope_type': 'Bruker', 'projection_type': None, 'folders': 2, 'T': 60, 'Z': 30, 'C': 2, 'Y': 512, 'X': 512},
+        {'name': 'olympus_zt_max', 'microscope_type': 'Olympus', 'projection_type': 'max', 'folders': 4, 'T': 30, 'Z': 20, 'C': 2, 'Y': 512, 'X': 512},
+        {'name': 'olympus_zt_full', 'microscope_type': 'Olympus', 'projection_type': None, 'folders': 2, 'T': 30, 'Z': 20, 'C': 2, 'Y': 512, 'X': 512},
+        {'name': 'flamingo_zt_max', 'microscope_type': 'Flamingo', 'projection_type': 'max', 'folders': 1, 'T': 4, 'Z': 200, 'C': 2, 'Y': 1024, 'X': 1024},
+    ],
+}
+
+GENERATORS = {'Bruker': generateBrukerFolder, 'Olympus': generateOlympusFolder, 'Flamingo': generateFlamingoFolder}
+
+def getScenarioKey(scenario: dict) -> str:
+    """
+    Return a name for the scenario's input data that changes whenever its size does.
+    """
+    return f"{scenario['microscope_type'].lower()}_{scenario['folders']}x_T{scenario['T']}_Z{scenario['Z']}_C{scenario['C']}_{scenario['Y']}x{scenario['X']}"
+
+def generateScenarioData(scenario: dict, data_directory: str) -> str:
+    """
+    Generate the acquisition folders of a scenario, unless a complete copy from an earlier run exists.
+
+    Parameters:
+    scenario (dict): The scenario, with microscope_type, folders and T/Z/C/Y/X sizes.
+    data_directory (str): Directory holding the generated data of all scenarios.
+
+    Returns:
+    str: The parent folder of the scenario's acquisition folders.
+    """
+    parent_folder_path = os.path.join(data_directory, getScenarioKey(scenario))
+    complete_marker = os.path.join(parent_folder_path, '!complete')
+    if os.path.exists(complete_marker):
+        return parent_folder_path
+
+    shutil.rmtree(parent_folder_path, ignore_errors=True)
+    os.makedirs(parent_folder_path)
+    print(f"Generating {getScenarioKey(scenario)}...")
+    for folder_index in range(scenario['folders']):
+        GENERATORS[scenario['microscope_type']](parent_folder_path,
+                                                f"{scenario['microscope_type'].lower()}_{folder_index:03d}",
+                                                T=scenario['T'], Z=scenario['Z'], C=scenario['C'],
+                                                Y=scenario['Y'], X=scenario['X'], seed=folder_index)
+    open(complete_marker, 'w').close()
+
+    return parent_folder_path
+
+def getImageFolders(parent_folder_path: str) -> list:
+    return sorted(folder for folder in os.listdir(parent_folder_path) if os.path.isdir(os.path.join(parent_folder_path, folder)))
+
+def getTiffBytes(folder_path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(folder_path) for file in files if file.endswith('.tif'))
+
+def convertScenario(scenario: dict,
+                    parent_folder_path: str,
+                    output_directory: str,
+                    read_ahead: int,
+                    stage_timer: StageTimer
+                    ) -> int:
+    """
+    Convert all folders of a scenario with the real workflow, writing the outputs to output_directory.
+
+    Returns:
+    int: Total bytes of the written files.
+    """
+    gray = np.tile(np.arange(256, dtype='uint8'), (3, 1))
+    imagej_tags = createImageJMetadataTags(LUTs={'LUTs': [gray, gray, gray, gray]})
+    image_folders = getImageFolders(parent_folder_path)
+
+    options = ConversionOptions(projection_type=scenario['projection_type'],
+                                imagej_tags=imagej_tags,
+                                read_ahead=read_ahead,
+                                stage_timer=stage_timer)
+
+    if scenario['microscope_type'] == 'Bruker':
+        log_details = {'Files Not Processed': [], 'Files Processed': [], 'Issues': [], 'Other Notes': []}
+        for _ in iterateBrukerImages(parent_folder_path=parent_folder_path,
+                                     image_folders=image_folders,
+                                     processed_images_path=output_directory,
+                                     metadata_csv_path=os.path.join(output_directory, '!image_metadata.csv'),
+                                     options=options,
+                                     log_details=log_details):
+            pass
+        if log_details['Files Not Processed']:
+            raise RuntimeError(f"Bruker conversion failed: {log_details['Files Not Processed']}")
+        return getTiffBytes(output_directory)
+
+    elif scenario['microscope_type'] == 'Olympus':
+        errors = [f'{result.name}: {result.error}'
+                  for result in iterateOlympusImages(parent_folder_path=parent_folder_path,
+                                                     processed_images_path=output_directory,
+                                                     options=options,
+                                                     image_folders=image_folders)
+                  if not result.processed]
+        if errors:
+            raise RuntimeError(f"Olympus conversion failed: {errors}")
+        return getTiffBytes(output_directory)
+
+    elif scenario['microscope_type'] == 'Flamingo':
+        # Flamingo writes its hyperstack into the acquisition folder, move it out so the next run starts clean
+        output_bytes = 0
+        for image_folder in image_folders:
+            folder_path = os.path.join(parent_folder_path, image_folder)
+            processFlamingoImages(parent_folder_path=folder_path, options=options)
+            for file in os.listdir(folder_path):
+                if file.startswith(image_folder) and file.endswith('.tif'):
+                    output_bytes += os.path.getsize(os.path.join(folder_path, file))
+                    shutil.move(os.path.join(folder_path, file), os.path.join(output_directory, file))
+        return output_bytes
+
+def runScenario(scenario: dict,
+                parent_folder_path: str,
+                scratch_directory: str,
+                repeat: int = 3,
+                read_ahead: int = 4,
+                track_memory: bool = True
+                ) -> dict:
+    """
+    Time repeated conversions of a scenario, then measure its peak memory in one more conversion with
+    tracemalloc on (kept out of the timings, as tracing slows allocation down).
+
+    Parameters:
+    scenario (dict): The scenario to run.
+    parent_folder_path (str): Parent folder of the scenario's generated acquisition folders.
+    scratch_directory (str): Directory for the converted outputs, emptied before each run.
+    repeat (int): Number of timed conversions.
+    read_ahead (int): Number of TIFF files read ahead in background threads.
+    track_memory (bool): Whether to do the extra conversion measuring peak memory.
+
+    Returns:
+    dict: The scenario with its input/output bytes, timings, throughput, stage totals and peak memory.
+    """
+    input_bytes = getTiffBytes(parent_folder_path)
+    seconds = []
+    stage_totals = None
+    for _ in range(repeat + (1 if track_memory else 0)):
+        shutil.rmtree(scratch_directory, ignore_errors=True)
+        os.makedirs(scratch_directory)
+        memory_run = track_memory and len(seconds) == repeat
+        stage_timer = StageTimer(track_memory=memory_run)
+        start_time = time.perf_counter()
+        output_bytes = convertScenario(scenario, parent_folder_path, scratch_directory, read_ahead, stage_timer)
+        elapsed_seconds = time.perf_counter() - start_time
+        if memory_run:
+            stage_timer.stopMemoryTracking()
+            folder_memory = stage_timer.getFolderMemory()
+        else:
+            seconds.append(elapsed_seconds)
+            stage_totals = stage_timer.getStageTotals()
+    shutil.rmtree(scratch_directory, ignore_errors=True)
+
+    best_seconds = min(seconds)
+    result = {**scenario,
+              'input_bytes': input_bytes,
+              'output_bytes': output_bytes,
+              'seconds': [round(value, 4) for value in seconds],
+              'best_seconds': round(best_seconds, 4),
+              'median_seconds': round(statistics.median(seconds), 4),
+              'input_mb_per_second': round(input_bytes / 1024 ** 2 / best_seconds, 2),
+              'stage_totals': stage_totals,
+              'peak_rss_bytes': getPeakRSS()}
+    if track_memory:
+        peak_traced_bytes = max(memory['peak_traced_bytes'] for memory in folder_memory.values())
+        result['peak_traced_bytes'] = peak_traced_bytes
+        result['peak_to_output_ratio'] = max((memory['peak_to_output_ratio'] for memory in folder_memory.values()
+                                              if memory['peak_to_output_ratio'] is not None), default=None)
+
+    return result
+
+def getRunInfo(preset: str) -> dict:
+    """
+    Return the commit, library versions and machine the benchmarks ran on.
+    """
+    repository_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=repository_path, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repository_path,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    return {'commit': commit,
+            'dirty': dirty,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'preset': preset,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'tifffile': tifffile.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+def compareResults(baseline: dict, current: dict) -> str:
+    """
+    Return a table comparing the best times and peak memory of the scenarios two runs have in common.
+    """
+    baseline_scenarios = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    lines = [f"Baseline {str(baseline['run']['commit'])[:8]} vs current {str(current['run']['commit'])[:8]}",
+             f"{'Scenario':<20} {'Base s':>9} {'Now s':>9} {'Speedup':>8} {'Base MB':>9} {'Now MB':>9}"]
+    for scenario in current['scenarios']:
+        if scenario['name'] not in baseline_scenarios:
+            continue
+        base = baseline_scenarios[scenario['name']]
+        base_memory, memory = base.get('peak_traced_bytes'), scenario.get('peak_traced_bytes')
+        lines.append(f"{scenario['name']:<20} {base['best_seconds']:>9.2f} {scenario['best_seconds']:>9.2f} "
+                     f"{base['best_seconds'] / scenario['best_seconds']:>7.2f}x "
+                     f"{base_memory / 1024 ** 2 if base_memory else float('nan'):>9.1f} {memory / 1024 ** 2 if memory else float('nan'):>9.1f}")
+
+    return '\n'.join(lines)
+
+def runBenchmarks(preset: str = 'smoke',
+                  data_directory: str = None,
+                  results_path: str = None,
+                  scenario_names: list = None,
+                  repeat: int = 3,
+                  read_ahead: int = 4,
+                  track_memory: bool = True
+                  ) -> dict:
+    """
+    Generate the data of each scenario of a preset, run each scenario in its own process and save the results.
+
+    Returns:
+    dict: The results, as written to results_path.
+    """
+    data_directory = data_directory or os.path.join(tempfile.gettempdir(), 'domilyzer_benchmarks')
+    scenarios = [scenario for scenario in SCENARIOS[preset] if not scenario_names or scenario['name'] in scenario_names]
+    results = {'run': getRunInfo(preset), 'scenarios': []}
+
+    for scenario in scenarios:
+        parent_folder_path = generateScenarioData(scenario, data_directory)
+        scratch_directory = os.path.join(data_directory, '!output', scenario['name'])
+        # A fresh process per scenario, so peak RSS is not carried over from the previous one
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(runScenario, scenario, parent_folder_path, scratch_directory,
+                                     repeat, read_ahead, track_memory).result()
+        print(f"{result['name']}: {result['best_seconds']:.2f} s, {result['input_mb_per_second']:.1f} MB/s, "
+              f"peak RSS {result['peak_rss_bytes'] / 1024 ** 2:.0f} MB")
+        results['scenarios'].append(result)
+
+    if results_path is None:
+        os.makedirs(DEFAULT_RESULTS_DIRECTORY, exist_ok=True)
+        commit = (results['run']['commit'] or 'nocommit')[:8]
+        results_path = os.path.join(DEFAULT_RESULTS_DIRECTORY, f"{preset}_{datetime.now():%Y%m%d_%H%M%S}_{commit}.json")
+    with open(results_path, 'w') as file:
+        json.dump(results, file, indent=1)
+    print(f"Saved results to {results_path}")
+
+    return results
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run_benchmarks', description='Benchmark the conversions on synthetic data.')
+    parser.add_argument('--preset', choices=list(SCENARIOS), default='smoke', help='Set of scenarios to run.')
+    parser.add_argument('--scenario', action='append', help='Only run the named scenario(s) of the preset.')
+    parser.add_argument('--data-dir', help='Where generated data is kept between runs. Defaults to the temp directory.')
+    parser.add_argument('--output', help='Results JSON path. Defaults to benchmarks/results/<preset>_<time>_<commit>.json.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed conversions per scenario, the best is reported.')
+    parser.add_argument('--read-ahead', type=int, default=4, help='TIFF files read ahead in background threads.')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the extra conversion measuring peak memory.')
+    parser.add_argument('--compare', help='Results JSON of an earlier run to compare against.')
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(preset=args.preset,
+                            data_directory=args.data_dir,
+                            results_path=args.output,
+                            scenario_names=args.scenario,
+                            repeat=args.repeat,
+                            read_ahead=args.read_ahead,
+                            track_memory=not args.no_memory)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            print(compareResults(json.load(file), results))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+Generators for synthetic acquisition folders laid out like the real instrument output, at any T/Z/C/Y/X size.
+
+Pixel data is random uint16 noise (so compression and projections do real work), generated in one
+(Y, X) plane pool per folder and reused, so generating a multi-GB folder is bound by disk speed.
+"""
+import os
+import numpy as np
+import tifffile
+import xml.etree.ElementTree as ET
+
+def generatePlanePool(shape_yx: tuple, pool_size: int = 8, seed: int = 0) -> np.ndarray:
+    """
+    Return a pool of random uint16 planes to draw synthetic image data from.
+
+    Parameters:
+    shape_yx (tuple): (Y, X) size of each plane.
+    pool_size (int): Number of distinct planes.
+    seed (int): Random seed, so a folder is generated identically every time.
+
+    Returns:
+    np.ndarray: Array of shape (pool_size, Y, X).
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 4096, size=(pool_size, *shape_yx), dtype=np.uint16)
+
+def getPlanes(plane_pool: np.ndarray, start: int, count: int) -> np.ndarray:
+    """
+    Return count planes from the pool, starting at start and wrapping around.
+    """
+    return plane_pool[np.arange(start, start + count) % len(plane_pool)]
+
+def generateBrukerFolder(parent_folder_path: str,
+                         folder_name: str,
+                         T: int,
+                         Z: int,
+                         C: int,
+                         Y: int,
+                         X: int,
+                         frame_period: float = 0.5,
+                         seed: int = 0
+                         ) -> str:
+    """
+    Write a Bruker PrairieView folder: an XML file plus one multi-page <folder>_CycleNNNNN_ChN_000001.ome.tif per
+    timepoint and channel, with the Z planes (or the frames, for single-plane T-series with Z=1 and T>1) as pages.
+
+    Parameters:
+    parent_folder_path (str): Folder to create the acquisition folder in.
+    folder_name (str): Name of the acquisition folder.
+    T, Z, C, Y, X (int): Size of each dimension.
+    frame_period (float): Seconds between Z planes, used for the absolute times in the XML.
+    seed (int): Random seed for the pixel data.
+
+    Returns:
+    str: Path to the acquisition folder.
+    """
+    folder_path = os.path.join(parent_folder_path, folder_name)
+    os.makedirs(folder_path, exist_ok=True)
+    plane_pool = generatePlanePool((Y, X), seed=seed)
+
+    pv_scan = ET.Element('PVScan', version='5.8.64.700')
+    state_shard = ET.SubElement(pv_scan, 'PVStateShard')
+    for key, value in [('bitDepth', '12'), ('dwellTime', '2'), ('framePeriod', str(frame_period)),
+                       ('objectiveLens', 'Synthetic 60x/1.20 Water')]:
+        ET.SubElement(state_shard, 'PVStateValue', key=key, value=value)
+    helios_nd_filter = ET.SubElement(state_shard, 'PVStateValue', key='heliosNDFilter')
+    ET.SubElement(helios_nd_filter, 'IndexedValue', index='0', value='0', description='Open')
+    laser_power = ET.SubElement(state_shard, 'PVStateValue', key='laserPower')
+    for index, description in enumerate(['405 nm', '488 nm', '561 nm', '640 nm']):
+        ET.SubElement(laser_power, 'IndexedValue', index=str(index), value='10', description=description)
+    microns_per_pixel = ET.SubElement(state_shard, 'PVStateValue', key='micronsPerPixel')
+    for axis, value in [('XAxis', '0.266'), ('YAxis', '0.266'), ('ZAxis', '1')]:
+        ET.SubElement(microns_per_pixel, 'IndexedValue', index=axis, value=value)
+
+    for cycle in range(1, T + 1):
+        sequence = ET.SubElement(pv_scan, 'Sequence', type='TSeries ZSeries Element', cycle=str(cycle))
+        for z in range(1, Z + 1):
+            absolute_time = ((cycle - 1) * Z + z) * frame_period
+            frame = ET.SubElement(sequence, 'Frame', index=str(z), absoluteTime=f'{absolute_time:.6f}')
+            for channel in range(1, C + 1):
+                ET.SubElement(frame, 'File', channel=str(channel), page=str(z),
+                              filename=f'{folder_name}_Cycle{cycle:05d}_Ch{channel}_000001.ome.tif')
+
+        for channel in range(1, C + 1):
+            tifffile.imwrite(os.path.join(folder_path, f'{folder_name}_Cycle{cycle:05d}_Ch{channel}_000001.ome.tif'),
+                             getPlanes(plane_pool, (cycle * C + channel) * Z, Z),
+                             photometric='minisblack')
+
+    ET.ElementTree(pv_scan).write(os.path.join(folder_path, f'{folder_name}.xml'), encoding='utf-8', xml_declaration=True)
+
+    return folder_path
+
+def generateOlympusFolder(parent_folder_path: str,
+                          folder_name: str,
+                          T: int,
+                          Z: int,
+                          C: int,
+                          Y: int,
+                          X: int,
+                          frame_interval_ms: float = 1000.0,
+                          seed: int = 0
+                          ) -> str:
+    """
+    Write an Olympus FluoView acquisition: a <name>.oif settings file and a <name>.oif.files folder with one
+    single-page s_C001Z001T001.tif per plane. The Z and T parts are left out of the file names when that
+    dimension has size 1, like FluoView does.
+
+    Parameters:
+    parent_folder_path (str): Folder to create the .oif file and .oif.files folder in.
+    folder_name (str): Name of the acquisition, without extension.
+    T, Z, C, Y, X (int): Size of each dimension.
+    frame_interval_ms (float): Milliseconds between timepoints.
+    seed (int): Random seed for the pixel data.
+
+    Returns:
+    str: Path to the .oif.files folder.
+    """
+    files_folder_path = os.path.join(parent_folder_path, f'{folder_name}.oif.files')
+    os.makedirs(files_folder_path, exist_ok=True)
+    plane_pool = generatePlanePool((Y, X), seed=seed)
+
+    # The .oif file is a UTF-16 INI file, only the sections oiffile and the conversion read are written
+    settings = ['[Acquisition Parameters Common]',
+                'Acquisition Device="FV1000"',
+                f'ScanMode="XY{"Z" if Z > 1 else ""}{"T" if T > 1 else ""}"',
+                '[Axis 4 Parameters Common]',
+                'AxisCode="T"',
+                f'EndPosition={(T - 1) * frame_interval_ms:.1f}',
+                f'MaxSize={T}',
+                'StartPosition=0.0',
+                '[Reference Image Parameter]',
+                'HeightConvertValue=1.242',
+                'HeightUnit="um"',
+                f'ImageHeight={Y}',
+                f'ImageWidth={X}',
+                'WidthConvertValue=1.242',
+                'WidthUnit="um"',
+                '[ProfileSaveInfo]',
+                f'FrameCount={T * Z * C}',
+                'Name="COFAImages"',
+                'Version="2.0.0.0"']
+    with open(os.path.join(parent_folder_path, f'{folder_name}.oif'), 'w', encoding='utf-16', newline='\r\n') as file:
+        file.write('\n'.join(settings) + '\n')
+
+    plane_index = 0
+    for channel in range(1, C + 1):
+        for z in range(1, Z + 1):
+            for t in range(1, T + 1):
+                z_part = f'Z{z:03d}' if Z > 1 else ''
+                t_part = f'T{t:03d}' if T > 1 else ''
+                tifffile.imwrite(os.path.join(files_folder_path, f's_C{channel:03d}{z_part}{t_part}.tif'),
+                                 getPlanes(plane_pool, plane_index, 1)[0],
+                                 photometric='minisblack')
+                plane_index += 1
+
+    return files_folder_path
+
+def generateFlamingoFolder(parent_folder_path: str,
+                           folder_name: str,
+                           T: int,
+                           Z: int,
+                           C: int,
+                           Y: int,
+                           X: int,
+                           illumination_sides: int = 2,
+                           seed: int = 0
+                           ) -> str:
+    """
+    Write a Flamingo light-sheet acquisition folder with one Z-stack per timepoint, channel and illumination
+    side, named S000_t000000_V000_R0000_X000_Y000_C00_I0_D0_P00366.tif (P is the number of Z planes).
+
+    Parameters:
+    parent_folder_path (str): Folder to create the acquisition folder in.
+    folder_name (str): Name of the acquisition folder.
+    T, Z, C, Y, X (int): Size of each dimension.
+    illumination_sides (int): Number of illumination sides, merged by the conversion.
+    seed (int): Random seed for the pixel data.
+
+    Returns:
+    str: Path to the acquisition folder.
+    """
+    folder_path = os.path.join(parent_folder_path, folder_name)
+    os.makedirs(folder_path, exist_ok=True)
+    plane_pool = generatePlanePool((Y, X), seed=seed)
+
+    stack_index = 0
+    for t in range(T):
+        for channel in range(C):
+            for side in range(illumination_sides):
+                tifffile.imwrite(os.path.join(folder_path, f'S000_t{t:06d}_V000_R0000_X000_Y000_C{channel:02d}_I{side}_D0_P{Z:05d}.tif'),
+                                 getPlanes(plane_pool, stack_index * Z, Z),
+                                 photometric='minisblack')
+                stack_index += 1
+
+    return folder_path
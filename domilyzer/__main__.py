@@ -1,5 +1,6 @@
 import os
 import timeit
+import argparse
 import shutil
 import numpy as np
 from domilyzer.functions_gui.gui import BaseGUI, FlamingoGUI, OlympusGUI
@@ -9,11 +10,34 @@ from domilyzer.functions_gui.general_functions import (
     saveLogFile,
     createImageJMetadataTags,
 )
-from domilyzer.workflows.bruker_workflow import processBrukerImages
-from domilyzer.workflows.olympus_workflow import processOlympusImages
+from domilyzer.functions_gui.staging_functions import StagingCache
+from domilyzer.functions_gui.selection_functions import parseSelection
+from domilyzer.functions_gui.transform_functions import createUserTransforms
+from domilyzer.functions_gui.planning_functions import planConversion, printConversionPlan
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.instrumentation_functions import StageTimer
+from domilyzer.functions_gui.tracing_functions import PipelineTracer
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.workflows.olympus_workflow import iterateOlympusImages
 from domilyzer.workflows.flamingo_workflow import processFlamingoImages
 
-def main():
+def parseArguments(argv: list = None) -> argparse.Namespace:
+    '''
+    Parse the command line options. The conversion inputs themselves come from the GUI.
+    '''
+    parser = argparse.ArgumentParser(prog='domilyzer', description='Convert raw microscope files to ImageJ hyperstacks.')
+    parser.add_argument('--plan', action='store_true',
+                        help='Dry run: report image types, dimensions, output sizes, peak RAM and time estimates for each folder without converting anything.')
+    parser.add_argument('--schedule', choices=['name', 'smallest_first', 'newest_first'], default='name',
+                        help='Order to convert the folders in: by name, smallest input first, or most recently modified first.')
+    parser.add_argument('--track-memory', action='store_true',
+                        help='Record peak memory (tracemalloc and peak RSS) per folder and stage, and add it to the log. Slows conversion down.')
+    parser.add_argument('--trace', action='store_true',
+                        help='Record a timeline of folder, file read, projection and write activity per thread, saved as !conversion_trace.json (open in chrome://tracing or ui.perfetto.dev).')
+    return parser.parse_args(argv)
+
+def main(argv: list = None):
+    args = parseArguments(argv)
     manual_test = False # Set to True for manual testing purposes, will skip GUI and use test data. Also will not move folders to processed images folder.
     
     if not manual_test:
@@ -92,8 +116,65 @@ def main():
         microscope_type = 'Olympus' # 'Flamingo' or 'Bruker'
         auto_metadata_extract = True
         
-    # Performance tracker
+    # Number of raw files read ahead in background threads, hides per-file latency on network shares. 0 reads sequentially
+    read_ahead = int(os.environ.get('DOMILYZER_READ_AHEAD', 4))
+    
+    # Optional local scratch directory that acquisition folders are staged to before conversion
+    staging_directory = os.environ.get('DOMILYZER_STAGING_DIR')
+    staging_max_gb = float(os.environ.get('DOMILYZER_STAGING_MAX_GB', 100))
+    staging_cache = StagingCache(cache_dir=staging_directory, max_bytes=int(staging_max_gb * 1024 ** 3)) if staging_directory else None
+    
+    # Optional worker processes for reading and projecting Z-stacks, results come back through shared memory
+    process_workers = int(os.environ.get('DOMILYZER_PROCESS_WORKERS', 0))
+    
+    # Optional scratch directory, full hyperstacks are assembled there on disk instead of in RAM
+    scratch_directory = os.environ.get('DOMILYZER_SCRATCH_DIR')
+    
+    # Optional writer threads, output files are preallocated and the planes written straight into them
+    write_workers = int(os.environ.get('DOMILYZER_WRITE_WORKERS', 0))
+    
+    # Optional lossless compression of the output files ('zlib', 'lzw' or 'auto', which picks between them), opens in stock Fiji.
+    # 'zstd' is accepted with a warning, its files need the Bio-Formats importer
+    compression = os.environ.get('DOMILYZER_COMPRESSION')
+    
+    # Optional downsampled pyramid levels in the output TIFFs, for instant opening in pyramid-aware viewers
+    pyramid_levels = int(os.environ.get('DOMILYZER_PYRAMID_LEVELS', 0))
+    pyramid_binning = os.environ.get('DOMILYZER_PYRAMID_BINNING', 'mean')
+    
+    # Optional crop ('x,y,width,height' in pixels, or in microns with DOMILYZER_CROP_UNIT=microns) and integer binning
+    # of every plane as it is read, so only the region of interest is held in memory and written
+    crop = os.environ.get('DOMILYZER_CROP')
+    crop = tuple(float(value) for value in crop.split(',')) if crop else None
+    crop_unit = os.environ.get('DOMILYZER_CROP_UNIT', 'pixels')
+    binning = int(os.environ.get('DOMILYZER_BINNING', 1))
+    binning_mode = os.environ.get('DOMILYZER_BINNING_MODE', 'mean')
+    
+    # Optional Z-plane and timepoint selection, 0-based 'start:stop:step' (e.g. '10:40' or '::5'), other files and pages are skipped
+    z_selection = parseSelection(os.environ.get('DOMILYZER_Z_RANGE'))
+    t_selection = parseSelection(os.environ.get('DOMILYZER_T_RANGE'))
+    
+    # Optional corrections applied to every plane as it is read, a JSON list of transforms such as
+    # [{"transform": "dark_frame", "dark_frame": "dark.tif"}, {"transform": "clip", "maximum": 4095}]
+    transforms_config = os.environ.get('DOMILYZER_TRANSFORMS')
+    user_transforms = createUserTransforms(transforms_config) if transforms_config else None
+    
+    # Optional threads per Z-projection, each projecting tiles of rows (identical result, uses more cores per stack)
+    reduce_workers = int(os.environ.get('DOMILYZER_REDUCE_WORKERS', 0))
+    
+    # Optional compiled Numba kernels for the Z-projections and Flamingo side fusion (identical result, needs numba)
+    use_numba = os.environ.get('DOMILYZER_USE_NUMBA', '0') == '1'
+    
+    # Output container for Flamingo runs, 'tiff' or 'ome-zarr' (chunked, written in parallel, local directory)
+    output_format = os.environ.get('DOMILYZER_OUTPUT_FORMAT', 'tiff')
+    
+    # Optional RAM budget, folders are converted in parallel while their estimated peak memory fits in it
+    ram_budget_gb = os.environ.get('DOMILYZER_RAM_BUDGET_GB')
+    ram_budget_bytes = int(float(ram_budget_gb) * 1024 ** 3) if ram_budget_gb else None
+        
+    # Performance tracker, overall and per pipeline stage
     start_time = timeit.default_timer()
+    tracer = PipelineTracer() if args.trace else None
+    stage_timer = StageTimer(track_memory=args.track_memory, tracer=tracer)
 
     # Check if neither max nor avg projection are selected, default to saving full hyperstacks
     if not avg_projection and not max_projection:
@@ -107,9 +188,48 @@ def main():
         projection_type = 'avg'
         
     # Create a dictionary of imagej metadata tags, with the LUTs for each channel. Will be used for all workflows.
-    imagej_tags = createImageJMetadataTags(LUTs = {'LUTs': [ch1_lut, ch2_lut, ch3_lut, ch4_lut]},
-                                           byteorder = '>')
+    # Native byte order, matching saveImageJHyperstack, so the pixel data is written without byteswapping
+    imagej_tags = createImageJMetadataTags(LUTs = {'LUTs': [ch1_lut, ch2_lut, ch3_lut, ch4_lut]})
     
+    # All the options of the run, passed unchanged through the workflows to every folder
+    options = ConversionOptions(projection_type=projection_type,
+                                single_plane=single_plane,
+                                auto_metadata_extract=auto_metadata_extract,
+                                test=manual_test,
+                                imagej_tags=imagej_tags,
+                                luts=[ch1_lut, ch2_lut, ch3_lut, ch4_lut],
+                                read_ahead=read_ahead,
+                                staging_cache=staging_cache,
+                                ram_budget_bytes=ram_budget_bytes,
+                                scheduling_policy=args.schedule,
+                                stage_timer=stage_timer,
+                                process_workers=process_workers,
+                                reduce_workers=reduce_workers,
+                                use_numba=use_numba,
+                                scratch_directory=scratch_directory,
+                                write_workers=write_workers,
+                                compression=compression,
+                                pyramid_levels=pyramid_levels,
+                                pyramid_binning=pyramid_binning,
+                                output_format=output_format,
+                                crop=crop,
+                                crop_unit=crop_unit,
+                                binning=binning,
+                                binning_mode=binning_mode,
+                                z_selection=z_selection,
+                                t_selection=t_selection,
+                                user_transforms=user_transforms)
+        
+    if args.plan:
+        # Dry run: only directory listings and TIFF headers are read, nothing is written or moved
+        conversion_plan = planConversion(parent_folder_path=parent_folder_path,
+                                         microscope_type=microscope_type,
+                                         projection_type=projection_type,
+                                         single_plane=single_plane,
+                                         options=options)
+        printConversionPlan(conversion_plan)
+        return
+        
     if microscope_type != 'Flamingo':
         # Get the Bruker image folders
         image_folders = sorted([folder for folder in os.listdir(parent_folder_path) if os.path.isdir(os.path.join(parent_folder_path, folder))])
@@ -125,37 +245,31 @@ def main():
     
     # BRUKER WORKFLOW
     if microscope_type == 'Bruker':
-        log_details, hyperstack_arrays = processBrukerImages(parent_folder_path = parent_folder_path,
-                                           image_folders = image_folders,
-                                           processed_images_path = processed_images_path,
-                                           metadata_csv_path = metadata_csv_path,
-                                           microscope_type = microscope_type,
-                                           projection_type = projection_type,
-                                           single_plane = single_plane,
-                                           auto_metadata_extract = auto_metadata_extract,
-                                           test = manual_test,
-                                           imagej_tags = imagej_tags,
-                                           log_details = log_details
-                                           )
+        # Each folder's result is dropped as soon as it completes, the log details are updated in place
+        for _ in iterateBrukerImages(parent_folder_path = parent_folder_path,
+                                     image_folders = image_folders,
+                                     processed_images_path = processed_images_path,
+                                     metadata_csv_path = metadata_csv_path,
+                                     options = options,
+                                     log_details = log_details
+                                     ):
+            pass
                                           
             
     # OLYMPUS WORKFLOW
     elif microscope_type == 'Olympus':
-        hyperstack_arrays = processOlympusImages(parent_folder_path=parent_folder_path,
-                                                processed_images_path=processed_images_path,
-                                                microscope_type=microscope_type,
-                                                projection_type=projection_type,
-                                                imagej_tags=imagej_tags,
-                                                image_folders=image_folders,
-                                                test = manual_test
-                                                )
+        for _ in iterateOlympusImages(parent_folder_path=parent_folder_path,
+                                      processed_images_path=processed_images_path,
+                                      options=options,
+                                      image_folders=image_folders
+                                      ):
+            pass
                                     
     # FLAMINGO WORKFLOW
     elif microscope_type == 'Flamingo':
         processFlamingoImages(parent_folder_path=parent_folder_path,
-                                projection_type=projection_type,
-                                imagej_tags=imagej_tags
-                                )
+                              options=options
+                              )
           
     if microscope_type != 'Flamingo' and manual_test == False: # not doing olympus for testing for now  
         for folder_name in image_folders:
@@ -171,10 +285,26 @@ def main():
             # Save the log file
             saveLogFile(log_file_path, log_details)    
     
+    # Per-stage timings: structured reports next to the log, and a summary table at the end of the run
+    stage_summary = stage_timer.formatSummaryTable()
+    print(stage_summary)
+    if manual_test == False:
+        report_directory = processed_images_path if microscope_type != 'Flamingo' else parent_folder_path
+        stage_timer.writeReport(output_directory = report_directory)
+        if tracer is not None:
+            print(f'Saved trace to {tracer.writeTrace(output_directory = report_directory)}')
+        if microscope_type != 'Flamingo':
+            log_details["Stage Timings"] = '\n' + stage_summary
+            if args.track_memory:
+                log_details["Peak Memory"] = '\n' + stage_timer.formatMemoryTable()
+            saveLogFile(log_file_path, log_details)
+    if args.track_memory:
+        print(stage_timer.formatMemoryTable())
+        stage_timer.stopMemoryTracking()
+    
     end_time = timeit.default_timer()
     print(f'Time elapsed: {end_time - start_time:.2f} seconds')    
               
 if __name__ == '__main__':
     main()
-
-print('Done with script!')
+    print('Done with script!')
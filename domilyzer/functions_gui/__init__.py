@@ -2,6 +2,25 @@ from domilyzer.functions_gui.general_functions import *
 from domilyzer.functions_gui.bruker_functions import *
 from domilyzer.functions_gui.flamingo_functions import *
 from domilyzer.functions_gui.olympus_functions import *
+from domilyzer.functions_gui.prefetch_functions import *
+from domilyzer.functions_gui.staging_functions import *
+from domilyzer.functions_gui.scheduling_functions import *
+from domilyzer.functions_gui.planning_functions import *
+from domilyzer.functions_gui.instrumentation_functions import *
+from domilyzer.functions_gui.tracing_functions import *
+from domilyzer.functions_gui.shared_memory_functions import *
+from domilyzer.functions_gui.outofcore_functions import *
+from domilyzer.functions_gui.compression_functions import *
+from domilyzer.functions_gui.ome_zarr_functions import *
+from domilyzer.functions_gui.pyramid_functions import *
+from domilyzer.functions_gui.ingest_functions import *
+from domilyzer.functions_gui.selection_functions import *
+from domilyzer.functions_gui.reduction_functions import *
+from domilyzer.functions_gui.kernel_functions import *
+from domilyzer.functions_gui.lazy_functions import *
+from domilyzer.functions_gui.engine_functions import *
+from domilyzer.functions_gui.transform_functions import *
+from domilyzer.functions_gui.options_functions import *
 
 __all__ = ["initializeOutputFolders",
            "initializeLogFile",
@@ -18,6 +37,9 @@ __all__ = ["initializeOutputFolders",
            "writeMetadataCsvBruker",
            "extractMetadataFromXMLBruker",
            
+           "FlamingoFileIndex",
+           "parseFilenamesFlamingo",
+           "getFileIndexFlamingo",
            "getNumChannelsFlamingo",
            "getNumFramesFlamingo",
            "getNumZPlanesFlamingo",
@@ -26,8 +48,108 @@ __all__ = ["initializeOutputFolders",
            "zProject",
            "mergeNumpyArrayIlluminationSidesFlamingo",
            
-           "stackChannelsGenHyperstackOlympus"
+           "stackChannelsGenHyperstackOlympus",
            "generateChannelProjectionsOlympus",
            "extractTNumber",
-           "extractMetadataFromOIFOlympus"
+           "extractMetadataFromOIFOlympus",
+           
+           "ReadAheadPrefetcher",
+           "readFileBytes",
+           "readTiffFiles",
+           
+           "StagingCache",
+           "getFolderManifest",
+           
+           "getFolderTiffBytes",
+           "orderImageFolders",
+           "estimateFolderPeakMemory",
+           "runFoldersWithinMemoryBudget",
+           "iterateFoldersWithinMemoryBudget",
+           "FolderResult",
+           
+           "loadThroughputCalibration",
+           "planFolder",
+           "checkImageJLimits",
+           "planConversion",
+           "printConversionPlan",
+           
+           "StageTimer",
+           "getStageTimer",
+           "getPeakRSS",
+           
+           "PipelineTracer",
+           "traceSpan",
+           
+           "SharedArrayManager",
+           "attachSharedArray",
+           "projectFilesInProcesses",
+           
+           "createScratchArray",
+           "iterateHyperstackPlanes",
+           "planStackGroupsOlympus",
+           "getFrameChannelFilesFlamingo",
+           
+           "getImageJWriteOptions",
+           "createImageJHyperstackFile",
+           "writePlanesInParallel",
+           "checkImageJTagsByteorder",
+           "NATIVE_BYTEORDER",
+           
+           "getAvailableCodecs",
+           "getCompressionOptions",
+           "chooseCompression",
+           
+           "OmeZarrArray",
+           "createOmeZarrAttributes",
+           "saveOmeZarrHyperstack",
+           
+           "binPlane",
+           "getPyramidLevelShapes",
+           "iteratePlanesBuildingPyramid",
+           "writeImageJPyramid",
+           "createImageJDescription",
+           
+           "binImage",
+           "getPixelCrop",
+           "IngestTransform",
+           "createIngestTransform",
+           "readTiffHeader",
+           "readTiffImage",
+           
+           "parseSelection",
+           "checkSelection",
+           "getSelectionStep",
+           "selectIndices",
+           "selectFilesByNumber",
+           "countFramesOlympus",
+           "getFrameNumberFlamingo",
+           "getFrameNumbersFlamingo",
+           "reduceAxis",
+           "getTileBounds",
+           "isRowMajor",
+           "useNumba",
+           "projectStackInto",
+           "fuseSidesInto",
+           "LazyHyperstack",
+           "createLazyHyperstackBruker",
+           "createLazyHyperstackSinglePlaneBruker",
+           "createLazyHyperstackOlympus",
+           "createLazyHyperstackFlamingo",
+           "FolderPlan",
+           "ReaderBackend",
+           "registerReaderBackend",
+           "getReaderBackend",
+           "registerOutputWriter",
+           "projectPlan",
+           "projectFileStack",
+           "readPlan",
+           "convertFolder",
+           "UserTransforms",
+           "DarkFrameSubtraction",
+           "FlatFieldCorrection",
+           "ClipValues",
+           "registerUserTransform",
+           "createUserTransforms",
+           "ConversionOptions",
+           "getConversionOptions"
 ]
\ No newline at end of file
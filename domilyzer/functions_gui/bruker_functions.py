@@ -2,8 +2,14 @@ import os
 import csv
 import shutil
 import tifffile
+import warnings
 import numpy as np
 import xml.etree.ElementTree as ET
+from domilyzer.functions_gui.ingest_functions import IngestTransform
+from domilyzer.functions_gui.prefetch_functions import readTiffFiles
+from domilyzer.functions_gui.reduction_functions import reduceAxis
+from domilyzer.functions_gui.selection_functions import selectIndices
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack, DEFAULT_PLANE_CACHE_BYTES
 
 def determineImageTypeBruker(folder_path: str, 
                              projection_type: str, 
@@ -56,17 +62,21 @@ def convertImagesToNumpyArraysBruker(channel_filenames: dict) -> dict:
     """ 
     Convert images to numpy arrays for each channel.
     
+    Deprecated, convertFolder(folder_path, 'Bruker') reads the folder with the Bruker reader backend.
+    
     Parameters:
     channel_filenames (dict): A dictionary where keys are channel names and values are lists of file paths.
     
     Returns:
     dict: A dictionary where keys are channel names and values are lists of numpy arrays.
     """
+    warnings.warn("convertImagesToNumpyArraysBruker is deprecated, use convertFolder(folder_path, 'Bruker').",
+                  DeprecationWarning, stacklevel=2)
     # Read/create images for each channel
     channel_image_arrays = {}
     for channel_name, files in channel_filenames.items():
         try:
-            channel_image_arrays[channel_name] = [tifffile.imread(file, is_ome=False) for file in files]
+            channel_image_arrays[channel_name] = list(readTiffFiles(files, is_ome=False))
         except Exception as e:
             print(f"Error reading TIFF file for channel {channel_name}: {e}")
             return None, None
@@ -79,6 +89,8 @@ def adjustNumpyArrayAxesBruker(hyperstack: np.array,
     """
     Adjust the axes of the numpy array based on the image type.
     
+    Deprecated, the Bruker reader backend indexes each folder in its output axes.
+    
     Parameters:
     hyperstack (np.array): The numpy array representing the image stack.
     image_type (str): The type of the image stack.
@@ -86,6 +98,8 @@ def adjustNumpyArrayAxesBruker(hyperstack: np.array,
     Returns:
     tuple: A tuple containing the adjusted hyperstack and the updated image type.
     """
+    warnings.warn("adjustNumpyArrayAxesBruker is deprecated, use convertFolder(folder_path, 'Bruker').",
+                  DeprecationWarning, stacklevel=2)
     # Adjust axes based on image type, max projected images do not need to be adjusted
     if image_type == "multi_plane_multi_timepoint" or image_type == "multi_plane_single_timepoint":
         hyperstack = np.moveaxis(hyperstack, [0, 1, 2, 3, 4], [0, 2, 1, 3, 4])   
@@ -106,6 +120,8 @@ def projectNumpyArraysBruker(hyperstack: np.array,
     """
     Project the numpy arrays based on the image type and projection type.
     
+    Deprecated, convertFolder(folder_path, 'Bruker') projects each z-stack as it is read.
+    
     Parameters:
     hyperstack (np.array): The numpy array representing the image stack.
     image_type (str): The type of the image stack.
@@ -114,14 +130,79 @@ def projectNumpyArraysBruker(hyperstack: np.array,
     Returns:
     np.array: The projected numpy array.
     """
+    warnings.warn("projectNumpyArraysBruker is deprecated, use convertFolder(folder_path, 'Bruker').",
+                  DeprecationWarning, stacklevel=2)
     if projection_type == 'max' and "single_plane" not in image_type:
-        hyperstack = np.max(hyperstack, axis = 2)
+        hyperstack = reduceAxis(hyperstack, axis=2, reduction='max')
     if projection_type == 'avg' and "single_plane" not in image_type:
-        hyperstack = np.mean(hyperstack, axis = 2)
+        hyperstack = reduceAxis(hyperstack, axis=2, reduction='mean')
         hyperstack = np.round(hyperstack).astype(np.uint16) 
         
     return hyperstack
 
+def createLazyHyperstackBruker(channel_filenames: dict,
+                               ingest_transform: IngestTransform = None,
+                               cache_bytes: int = DEFAULT_PLANE_CACHE_BYTES
+                               ) -> LazyHyperstack:
+    """
+    Index a multi-plane folder as a LazyHyperstack, a TZCYX array with one cycle file per timepoint and channel,
+    reading each Z plane from its file only when it is indexed.
+
+    Parameters:
+    channel_filenames (dict): A dictionary where keys are channel names and values are lists of file paths, one per timepoint.
+    ingest_transform (IngestTransform): If given, only its selected pages are indexed and each one is cropped and binned when read.
+    cache_bytes (int): Maximum bytes of decoded planes kept in memory.
+
+    Returns:
+    LazyHyperstack: The TZCYX hyperstack.
+    """
+    # Number of Z planes from the TIFF header of the first file, without reading pixels
+    first_file = next(iter(channel_filenames.values()))[0]
+    with tifffile.TiffFile(first_file, is_ome=False) as tif:
+        num_pages = len(tif.pages)
+    pages = selectIndices(num_pages, ingest_transform.pages if ingest_transform is not None else None)
+    num_timepoints = min(len(files) for files in channel_filenames.values())
+
+    plane_sources = {(timepoint, z_index, channel_index): [(file, page)]
+                     for channel_index, files in enumerate(channel_filenames.values())
+                     for timepoint, file in enumerate(files[:num_timepoints])
+                     for z_index, page in enumerate(pages)}
+
+    return LazyHyperstack(plane_sources, (num_timepoints, len(pages), len(channel_filenames)), ingest_transform,
+                          cache_bytes=cache_bytes, is_ome=False)
+
+def createLazyHyperstackSinglePlaneBruker(channel_filenames: dict,
+                                          ingest_transform: IngestTransform = None,
+                                          cache_bytes: int = DEFAULT_PLANE_CACHE_BYTES
+                                          ) -> LazyHyperstack:
+    """
+    Index a single-plane folder as a LazyHyperstack, a TZCYX array with the frames of each file as timepoints and
+    its files as Z planes, reading each frame from its file only when it is indexed.
+
+    Parameters:
+    channel_filenames (dict): A dictionary where keys are channel names and values are lists of file paths, one per plane.
+    ingest_transform (IngestTransform): If given, only its selected pages (frames) are indexed and each one is cropped
+        and binned when read. Files of a single frame keep it.
+    cache_bytes (int): Maximum bytes of decoded planes kept in memory.
+
+    Returns:
+    LazyHyperstack: The TZCYX hyperstack.
+    """
+    # Number of frames from the TIFF header of the first file, without reading pixels
+    first_file = next(iter(channel_filenames.values()))[0]
+    with tifffile.TiffFile(first_file, is_ome=False) as tif:
+        num_pages = len(tif.pages)
+    pages = [0] if num_pages == 1 else selectIndices(num_pages, ingest_transform.pages if ingest_transform is not None else None)
+    num_planes = min(len(files) for files in channel_filenames.values())
+
+    plane_sources = {(timepoint, z_index, channel_index): [(file, page)]
+                     for channel_index, files in enumerate(channel_filenames.values())
+                     for z_index, file in enumerate(files[:num_planes])
+                     for timepoint, page in enumerate(pages)}
+
+    return LazyHyperstack(plane_sources, (len(pages), num_planes, len(channel_filenames)), ingest_transform,
+                          cache_bytes=cache_bytes, is_ome=False)
+
 def writeMetadataCsvBruker(metadata: dict, 
                            metadata_csv_path: str, 
                            folder_name: str, 
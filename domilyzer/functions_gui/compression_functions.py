@@ -0,0 +1,132 @@
+import io
+import os
+import time
+import inspect
+import warnings
+import tifffile
+import numpy as np
+
+# Lossless TIFF codecs. zlib (deflate) needs only the standard library, LZW and zstd need the imagecodecs
+# package. ImageJ's built-in TIFF reader opens zlib and LZW, zstd needs Bio-Formats.
+COMPRESSION_CODECS = ('zlib', 'lzw', 'zstd')
+FIJI_COMPRESSION_CODECS = ('zlib', 'lzw')
+
+# Codecs (with an optional ':level') tried by the auto mode, all readable by stock Fiji
+AUTO_COMPRESSION_CANDIDATES = ('zlib:1', 'zlib:6', 'lzw')
+
+# Write bandwidth assumed for the auto mode, about a gigabit network share
+DEFAULT_STORAGE_BYTES_PER_SECOND = 100 * 1024 ** 2
+
+# Size of the compressed strips, each page is split into strips that are compressed in parallel
+STRIP_BYTES = 256 * 1024
+
+# tifffile takes the compression level as compressionargs since 2022, as a (codec, level) tuple before
+TIFFFILE_COMPRESSIONARGS = 'compressionargs' in inspect.signature(tifffile.TiffWriter.write).parameters
+
+def getAvailableCodecs() -> list:
+    """
+    Return the lossless codecs tifffile can encode with the installed packages.
+    """
+    available_codecs = []
+    for codec in COMPRESSION_CODECS:
+        try:
+            tifffile.imwrite(io.BytesIO(), np.zeros((8, 8), dtype=np.uint16), compression=codec, predictor=True)
+        except Exception:
+            continue
+        available_codecs.append(codec)
+
+    return available_codecs
+
+def getCompressionOptions(compression: str,
+                          dtype,
+                          plane_shape: tuple,
+                          write_workers: int = 0
+                          ) -> dict:
+    """
+    Return the tifffile.imwrite keyword arguments for a lossless codec.
+
+    Parameters:
+    compression (str): Codec from COMPRESSION_CODECS, optionally with a level (e.g. 'zlib:1'), or None for uncompressed output.
+    dtype: NumPy dtype of the image data.
+    plane_shape (tuple): (Y, X) shape of the pages, used to split them into strips.
+    write_workers (int): Number of threads compressing the strips of each page. 0 lets tifffile choose.
+
+    Returns:
+    dict: The keyword arguments, empty for uncompressed output.
+    """
+    if compression is None:
+        return {}
+    codec, _, level = compression.partition(':')
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError(f"Invalid compression '{compression}'. Choose one of {COMPRESSION_CODECS}, 'auto' or None.")
+    if codec not in FIJI_COMPRESSION_CODECS:
+        warnings.warn(f"{codec} compressed TIFF files do not open in stock Fiji, only with the Bio-Formats importer. "
+                      f"Use one of {FIJI_COMPRESSION_CODECS} for files that open anywhere.")
+
+    row_bytes = plane_shape[-1] * np.dtype(dtype).itemsize
+    options = {'compression': codec,
+               # Horizontal differencing makes the smooth, mostly dark fluorescence images compress much better
+               'predictor': bool(np.issubdtype(dtype, np.integer)),
+               'rowsperstrip': max(1, STRIP_BYTES // row_bytes),
+               'maxworkers': write_workers or None}
+    if level and TIFFFILE_COMPRESSIONARGS:
+        options['compressionargs'] = {'level': int(level)}
+    elif level:
+        options['compression'] = (codec, int(level))
+
+    return options
+
+def getSamplePlanes(hyperstack: np.ndarray, num_planes: int) -> np.ndarray:
+    """
+    Return the first planes of a hyperstack in storage order, without copying the rest of it.
+    """
+    leading_shape = hyperstack.shape[:-2]
+    num_planes = min(num_planes, int(np.prod(leading_shape)))
+    return np.stack([hyperstack[np.unravel_index(index, leading_shape)] for index in range(num_planes)])
+
+def chooseCompression(hyperstack: np.ndarray,
+                      candidates: tuple = AUTO_COMPRESSION_CANDIDATES,
+                      sample_planes: int = 4,
+                      write_workers: int = 0,
+                      storage_bytes_per_second: float = DEFAULT_STORAGE_BYTES_PER_SECOND
+                      ) -> str:
+    """
+    Pick the codec that writes a hyperstack fastest, from a trial compression of its first planes.
+
+    The estimated write time per byte of image data is the compression time, shared over the writer threads,
+    plus the time to send the compressed bytes to storage. Slow storage favors a better ratio, fast storage
+    favors a faster codec or no compression at all.
+
+    Parameters:
+    hyperstack (np.ndarray): The hyperstack to be saved.
+    candidates (tuple): Codecs to try, out of FIJI_COMPRESSION_CODECS. Those that are not installed are skipped.
+    sample_planes (int): Number of planes compressed in the trial.
+    write_workers (int): Number of threads that will compress the pages.
+    storage_bytes_per_second (float): Write bandwidth of the output storage.
+
+    Returns:
+    str: The chosen codec, or None if uncompressed output is fastest.
+    """
+    unreadable_candidates = [codec for codec in candidates if codec.partition(':')[0] not in FIJI_COMPRESSION_CODECS]
+    if unreadable_candidates:
+        raise ValueError(f"Auto compression only chooses codecs stock Fiji opens, {FIJI_COMPRESSION_CODECS}, not {unreadable_candidates}.")
+    sample = getSamplePlanes(hyperstack, sample_planes)
+    # tifffile compresses with half the CPU cores by default
+    num_threads = write_workers or max(1, (os.cpu_count() or 1) // 2)
+    available_codecs = getAvailableCodecs()
+
+    best_codec, best_seconds_per_byte = None, 1 / storage_bytes_per_second
+    for codec in candidates:
+        if codec.partition(':')[0] not in available_codecs:
+            continue
+        compressed_file = io.BytesIO()
+        start_time = time.perf_counter()
+        tifffile.imwrite(compressed_file, sample, photometric='minisblack',
+                         **getCompressionOptions(codec, sample.dtype, sample.shape[-2:], write_workers=1))
+        compression_seconds = time.perf_counter() - start_time
+        ratio = sample.nbytes / len(compressed_file.getvalue())
+        seconds_per_byte = compression_seconds / sample.nbytes / num_threads + 1 / (ratio * storage_bytes_per_second)
+        if seconds_per_byte < best_seconds_per_byte:
+            best_codec, best_seconds_per_byte = codec, seconds_per_byte
+
+    return best_codec
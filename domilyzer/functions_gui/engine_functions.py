@@ -0,0 +1,803 @@
+import os
+import shutil
+import functools
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from domilyzer.functions_gui.general_functions import organizeFilesByChannel, adjustImageJAxes, saveImageJHyperstack
+from domilyzer.functions_gui.bruker_functions import (determineImageTypeBruker, extractMetadataFromXMLBruker, createLazyHyperstackBruker,
+                                                      createLazyHyperstackSinglePlaneBruker)
+from domilyzer.functions_gui.olympus_functions import (extractTNumber, extractMetadataFromOIFOlympus, planStackGroupsOlympus,
+                                                       countFramesOlympus, createLazyHyperstackOlympus)
+from domilyzer.functions_gui.flamingo_functions import FlamingoFileIndex, createLazyHyperstackFlamingo
+from domilyzer.functions_gui.ome_zarr_functions import saveOmeZarrHyperstack
+from domilyzer.functions_gui.prefetch_functions import readTiffFiles
+from domilyzer.functions_gui.shared_memory_functions import projectFilesInProcesses
+from domilyzer.functions_gui.ingest_functions import IngestTransform, createIngestTransform, readTiffHeader
+from domilyzer.functions_gui.selection_functions import getSelectionStep
+from domilyzer.functions_gui.kernel_functions import projectStackInto, fuseSidesInto
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+from domilyzer.functions_gui.tracing_functions import PipelineTracer
+from domilyzer.functions_gui.scheduling_functions import FolderResult
+from domilyzer.functions_gui.instrumentation_functions import getStageTimer
+from domilyzer.functions_gui.options_functions import ConversionOptions, getConversionOptions
+
+ENGINE_PROJECTIONS = ('max', 'avg')
+
+# Outputs above this size (1 GB) get a warning before they are written
+LARGE_OUTPUT_BYTES = 1024 ** 3
+
+# Peak working set of convertFolder as a multiple of the folder's TIFF bytes, on each of its paths, measured with
+# tracemalloc on synthetic two-channel folders of 10 to 30 Z planes. Full hyperstacks ('read') hold the output and the
+# file being read. Projections of the whole folder ('project') hold its pages and the projected output. Streaming
+# projections ('streaming') hold the output and the Z-stacks being read, a larger share of the folder for short stacks.
+DEFAULT_PEAK_MEMORY_FACTORS = {'read': 1.3, 'project': 1.4, 'streaming': 0.5}
+
+class FolderPlan:
+    """
+    How one folder is converted, as indexed by the index_folder of its reader backend.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The (t, z, c) planes of the folder, each mapped to the TIFF pages it is read from.
+    image_type (str): Image type of the folder, as its workflow names it, e.g. 'multi_plane_multi_timepoint_max_project'.
+    axes (str): ImageJ axes of the output. With one axis fewer than the converted array, its single timepoint is
+        dropped, e.g. 'ZCYX' for the single-frame Bruker folders.
+    projection_type (str): 'max', 'avg', or None to convert the full hyperstack, e.g. of single-plane folders, which
+        have no Z planes to project.
+    """
+    def __init__(self,
+                 hyperstack: LazyHyperstack,
+                 image_type: str,
+                 axes: str,
+                 projection_type: str = None):
+        self.hyperstack = hyperstack
+        self.image_type = image_type
+        self.axes = axes
+        self.projection_type = projection_type
+
+    def __repr__(self) -> str:
+        return f"FolderPlan({self.hyperstack!r}, image_type='{self.image_type}', axes='{self.axes}')"
+
+class ReaderBackend:
+    """
+    A microscope the pipeline engine can read: how a folder is indexed as a plan of (t, z, c) planes, each mapped to
+    the TIFF pages it is read from, and the conventions of its projections.
+
+    Parameters:
+    name (str): Microscope type the backend is registered under, e.g. 'Bruker'.
+    index_folder (callable): index_folder(folder_path, ingest_transform, options) returns the FolderPlan of the folder.
+    read_metadata (callable): read_metadata(folder_path, options, log_details) returns the pixel size and frame rate
+        of the folder as a dict, or None if there is none. Issues found are added to log_details, which may be None.
+    average_dtype: dtype of average projections. Integer dtypes are rounded to the nearest integer.
+    projection_function (callable): If given, applied to each projected plane after its sources are fused, e.g.
+        np.rot90 to orient Flamingo projections.
+    output_name (callable): output_name(folder_name, projection_type) returns the output file name without its
+        extension, like the workflow of the microscope names it. Defaults to the Bruker and Olympus names.
+    page_selection (callable): page_selection(options) returns the pages to keep of each multi-page file. Defaults to
+        the Z selection, for files holding a Z-stack.
+    fuse_function (callable): If given, fuse_function(source_planes, output, use_numba) fuses the projected sources
+        of a plane into the output in one pass, in place of their maximum and the projection function.
+    peak_memory_factors (dict): Peak memory of convertFolder as a multiple of the folder's TIFF bytes, for full
+        hyperstacks ('read'), projections of the whole folder ('project') and streaming projections ('streaming').
+        Missing paths use DEFAULT_PEAK_MEMORY_FACTORS.
+    """
+    def __init__(self,
+                 name: str,
+                 index_folder,
+                 read_metadata,
+                 average_dtype=np.uint16,
+                 projection_function=None,
+                 output_name=None,
+                 page_selection=None,
+                 fuse_function=None,
+                 peak_memory_factors: dict = None):
+        self.name = name
+        self.index_folder = index_folder
+        self.read_metadata = read_metadata
+        self.average_dtype = np.dtype(average_dtype)
+        self.projection_function = projection_function
+        self.output_name = output_name if output_name is not None else getOutputNameBruker
+        self.page_selection = page_selection if page_selection is not None else getZSelection
+        self.fuse_function = fuse_function
+        self.peak_memory_factors = {**DEFAULT_PEAK_MEMORY_FACTORS, **(peak_memory_factors or {})}
+
+    def __repr__(self) -> str:
+        return f"ReaderBackend('{self.name}')"
+
+    def getProjectedShape(self, plane_shape: tuple) -> tuple:
+        """
+        Return the shape of a projected plane, once oriented by the projection function.
+        """
+        if self.projection_function is None:
+            return tuple(plane_shape)
+        return self.projection_function(np.empty(plane_shape, dtype=np.uint8)).shape
+
+    def getPeakMemoryFactor(self, projection_type: str, streaming: bool = False) -> float:
+        """
+        Return the peak memory of converting a folder as a multiple of its TIFF bytes, on the path convertFolder takes.
+        Projections in worker processes hold a Z-stack at a time like streaming ones.
+        """
+        if projection_type is None:
+            return self.peak_memory_factors['read']
+        return self.peak_memory_factors['streaming' if streaming else 'project']
+
+    def fuseSources(self, source_planes: list, output: np.ndarray, use_numba: bool = False) -> np.ndarray:
+        """
+        Fuse the projected sources of a plane, e.g. its illumination sides, into the output plane.
+        """
+        if self.fuse_function is not None:
+            return self.fuse_function(source_planes, output, use_numba=use_numba)
+        plane = source_planes[0] if len(source_planes) == 1 else np.max(source_planes, axis=0)
+        output[...] = self.projection_function(plane) if self.projection_function is not None else plane
+        return output
+
+def getZSelection(options: ConversionOptions) -> slice:
+    """
+    Return the Z selection of the options, the pages to keep of files holding a Z-stack.
+    """
+    return options.z_selection
+
+READER_BACKENDS = {}
+OUTPUT_WRITERS = {}
+
+def registerReaderBackend(backend: ReaderBackend) -> ReaderBackend:
+    """
+    Register a reader backend under its name, replacing any backend of the same name, so convertFolder can read its
+    folders. A new microscope only needs a backend: reading, projection, fusion, instrumentation and the writers are shared.
+    """
+    READER_BACKENDS[backend.name] = backend
+    return backend
+
+def getReaderBackend(microscope_type: str) -> ReaderBackend:
+    """
+    Return the reader backend registered for a microscope type.
+    """
+    if microscope_type not in READER_BACKENDS:
+        raise ValueError(f"No reader backend for '{microscope_type}'. Choose one of {tuple(READER_BACKENDS)}.")
+    return READER_BACKENDS[microscope_type]
+
+def registerOutputWriter(output_format: str, write_function):
+    """
+    Register the writer of an output format, replacing any writer of the same name.
+
+    Parameters:
+    output_format (str): Name of the format, e.g. 'tiff'.
+    write_function (callable): write_function(hyperstack, axes, metadata, output_path, **options.getWriterOptions())
+        writes an np.ndarray or np.memmap and returns the number of bytes written.
+    """
+    OUTPUT_WRITERS[output_format] = write_function
+    return write_function
+
+def writeTiffOutput(hyperstack,
+                    axes: str,
+                    metadata: dict,
+                    output_path: str,
+                    imagej_tags: list = None,
+                    write_workers: int = 0,
+                    compression: str = None,
+                    pyramid_levels: int = 0,
+                    pyramid_binning: str = 'mean'
+                    ) -> int:
+    """
+    Write an ImageJ hyperstack with saveImageJHyperstack.
+
+    Returns:
+    int: Size of the output file in bytes.
+    """
+    saveImageJHyperstack(hyperstack, axes, metadata, output_path, imagej_tags=imagej_tags, write_workers=write_workers,
+                         compression=compression, pyramid_levels=pyramid_levels, pyramid_binning=pyramid_binning)
+    return os.path.getsize(output_path)
+
+def writeOmeZarrOutput(hyperstack,
+                       axes: str,
+                       metadata: dict,
+                       output_path: str,
+                       luts: list = None,
+                       zarr_chunks: dict = None,
+                       write_workers: int = 0
+                       ) -> int:
+    """
+    Write an OME-Zarr image with saveOmeZarrHyperstack.
+
+    Returns:
+    int: Number of bytes written.
+    """
+    return saveOmeZarrHyperstack(hyperstack, axes, metadata, output_path, luts=luts, chunks=zarr_chunks,
+                                 write_workers=write_workers)
+
+registerOutputWriter('tiff', writeTiffOutput)
+registerOutputWriter('ome-zarr', writeOmeZarrOutput)
+
+def getStackGroups(hyperstack: LazyHyperstack) -> dict:
+    """
+    Return the sources of each (t, c) Z-stack of a plan, plane by plane, in (t, c) order.
+    """
+    num_timepoints, num_z_planes, num_channels = hyperstack.shape[:3]
+    return {(t, c): [source for z in range(num_z_planes) for source in hyperstack.plane_sources.get((t, z, c), [])]
+            for t in range(num_timepoints) for c in range(num_channels)}
+
+def getPlaneGroups(hyperstack: LazyHyperstack) -> dict:
+    """
+    Return the sources of each (t, z, c) plane of a plan, in storage order.
+    """
+    num_timepoints, num_z_planes, num_channels = hyperstack.shape[:3]
+    return {(t, z, c): hyperstack.plane_sources.get((t, z, c), [])
+            for t in range(num_timepoints) for z in range(num_z_planes) for c in range(num_channels)}
+
+def getFilePages(groups: dict) -> dict:
+    """
+    Return the sorted pages read of each file of a plan's groups, with the files in the order the groups first use them.
+    """
+    file_pages = {}
+    for sources in groups.values():
+        for file_path, page in sources:
+            file_pages.setdefault(file_path, set()).add(page)
+
+    return {file_path: sorted(pages) for file_path, pages in file_pages.items()}
+
+def readPlanPages(hyperstack: LazyHyperstack,
+                  file_pages: dict,
+                  read_ahead: int = 0,
+                  tracer: PipelineTracer = None):
+    """
+    Read the files of a plan in order with readTiffFiles, each file whole and through the ingest transform of the
+    plan, so the pages read are those its page selection keeps, the ones index_folder put in the plan.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The indexed folder.
+    file_pages (dict): The pages of each file, see getFilePages.
+    read_ahead (int): Number of files to read ahead in background threads. 0 reads sequentially.
+    tracer (PipelineTracer): If given, every file read is recorded on the trace timeline.
+
+    Yields:
+    dict: The (file path, page index) sources of each file mapped to their cropped and binned (Y, X) pages.
+    """
+    images = readTiffFiles(list(file_pages), read_ahead=read_ahead, tracer=tracer,
+                           ingest_transform=hyperstack.ingest_transform, **hyperstack.tifffile_kwargs)
+    for (file_path, pages), image in zip(file_pages.items(), images):
+        image = image.reshape(-1, *image.shape[-2:])
+        if len(image) != len(pages):
+            raise ValueError(f"Expected {len(pages)} pages in {os.path.basename(file_path)}, read {len(image)}.")
+        yield {(file_path, page): image[index] for index, page in enumerate(pages)}
+
+def iterateCompletedGroups(hyperstack: LazyHyperstack,
+                           groups: dict,
+                           read_ahead: int = 0,
+                           tracer: PipelineTracer = None):
+    """
+    Read the files of a plan and yield each group of sources, e.g. a Z-stack or a plane, as soon as its last file is
+    read. The pages of a group are released once no group left needs them, so only the groups being read are held.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The indexed folder.
+    groups (dict): Group keys mapped to their (file path, page index) sources, see getStackGroups and getPlaneGroups.
+    read_ahead (int): Number of files to read ahead in background threads. 0 reads sequentially.
+    tracer (PipelineTracer): If given, every file read is recorded on the trace timeline.
+
+    Yields:
+    tuple: The group key, and the pages held as a dict of sources to (Y, X) pages, those of the group among them.
+    """
+    file_pages = getFilePages(groups)
+    file_positions = {file_path: position for position, file_path in enumerate(file_pages)}
+    # Each group completes with the last of its files, groups without sources before any file is read
+    completed_groups = collections.defaultdict(list)
+    for group, sources in groups.items():
+        completed_groups[max((file_positions[file_path] for file_path, _ in sources), default=-1)].append(group)
+    remaining_groups = collections.Counter(source for sources in groups.values() for source in set(sources))
+
+    pages = {}
+    for group in completed_groups[-1]:
+        yield group, pages
+    for position, file_pages_read in enumerate(readPlanPages(hyperstack, file_pages, read_ahead, tracer)):
+        pages.update(file_pages_read)
+        for group in completed_groups[position]:
+            yield group, pages
+            for source in set(groups[group]):
+                remaining_groups[source] -= 1
+                if remaining_groups[source] == 0:
+                    del pages[source]
+
+def projectFileStack(image: np.ndarray, projection_type: str, average_dtype=np.uint16, use_numba: bool = False) -> np.ndarray:
+    """
+    Z-project the stack of one file, e.g. in a worker process of projectFilesInProcesses.
+
+    Parameters:
+    image (np.ndarray): The (Z, Y, X) stack, or a single (Y, X) plane.
+    projection_type (str): 'max' or 'avg'.
+    average_dtype: dtype of average projections, see ReaderBackend.
+    use_numba (bool): See projectStackInto.
+
+    Returns:
+    np.ndarray: The projected plane, of the stack's dtype for maximum projections.
+    """
+    dtype = image.dtype if projection_type == 'max' else average_dtype
+    return projectStackInto(image, np.empty(image.shape[-2:], dtype=dtype), projection_type, use_numba=use_numba)
+
+def createProjectedArray(hyperstack: LazyHyperstack, projection_type: str, backend: ReaderBackend) -> np.ndarray:
+    """
+    Allocate the (T, C, Y, X) projection of a plan, of the projected dtype and oriented plane shape.
+    """
+    if projection_type not in ENGINE_PROJECTIONS:
+        raise ValueError(f"Invalid projection type '{projection_type}'. Choose one of {ENGINE_PROJECTIONS}.")
+    num_timepoints, _, num_channels = hyperstack.shape[:3]
+    dtype = hyperstack.dtype if projection_type == 'max' else backend.average_dtype
+    return np.empty((num_timepoints, num_channels, *backend.getProjectedShape(hyperstack.shape[3:])), dtype=dtype)
+
+def projectPlanePlan(hyperstack: LazyHyperstack,
+                     t: int,
+                     c: int,
+                     output: np.ndarray,
+                     projection_type: str,
+                     backend: ReaderBackend = None,
+                     reduce_workers: int = 0,
+                     use_numba: bool = False,
+                     read_pages=None
+                     ) -> np.ndarray:
+    """
+    Z-project the planes of one timepoint and channel of a plan into an output plane.
+
+    The pages of each plane are projected source by source, e.g. each illumination side of a Flamingo stack on its
+    own, then fused by the backend.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The indexed folder.
+    t (int), c (int): Timepoint and channel to project.
+    output (np.ndarray): The (Y, X) plane to write, of the projected dtype and oriented shape.
+    projection_type (str): 'max' or 'avg'.
+    backend (ReaderBackend): Backend of the folder, which fuses the sources. None keeps their maximum.
+    reduce_workers (int), use_numba (bool): See projectStackInto.
+    read_pages (callable): read_pages(sources) returns the pages of a list of sources, e.g. out of those convertFolder
+        has read. Defaults to hyperstack.readPages.
+
+    Returns:
+    np.ndarray: The output plane, zeros if the plan has no pages for the timepoint and channel.
+    """
+    read_pages = read_pages if read_pages is not None else hyperstack.readPages
+    z_sources = [hyperstack.plane_sources.get((t, z, c), []) for z in range(hyperstack.shape[1])]
+    num_sources = max(len(sources) for sources in z_sources)
+    if num_sources == 0:
+        output[...] = 0
+        return output
+
+    source_planes = []
+    for source in range(num_sources):
+        stack = np.stack(read_pages([sources[source] for sources in z_sources if len(sources) > source]))
+        source_planes.append(projectStackInto(stack, np.empty(stack.shape[1:], dtype=output.dtype), projection_type,
+                                              reduce_workers=reduce_workers, use_numba=use_numba))
+    if backend is not None:
+        return backend.fuseSources(source_planes, output, use_numba=use_numba)
+    output[...] = source_planes[0] if num_sources == 1 else np.max(source_planes, axis=0)
+    return output
+
+def projectPlan(hyperstack: LazyHyperstack,
+                projection_type: str,
+                backend: ReaderBackend,
+                workers: int = 0,
+                reduce_workers: int = 0,
+                use_numba: bool = False,
+                read_pages=None
+                ) -> np.ndarray:
+    """
+    Z-project every timepoint and channel of a plan into a TCYX hyperstack, one Z-stack at a time.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The indexed folder, from the index_folder of the backend.
+    projection_type (str): 'max' or 'avg'.
+    backend (ReaderBackend): Backend of the folder, for the average dtype and the fusion of the sources.
+    workers (int): Number of threads projecting (timepoint, channel) stacks at once. 0 projects them in turn.
+    reduce_workers (int), use_numba (bool), read_pages (callable): See projectPlanePlan.
+
+    Returns:
+    np.ndarray: The (T, C, Y, X) projected hyperstack.
+    """
+    projected = createProjectedArray(hyperstack, projection_type, backend)
+
+    def projectStack(index):
+        t, c = index
+        projectPlanePlan(hyperstack, t, c, projected[t, c], projection_type, backend,
+                         reduce_workers=reduce_workers, use_numba=use_numba, read_pages=read_pages)
+
+    indices = list(getStackGroups(hyperstack))
+    if workers > 0:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='projector') as executor:
+            list(executor.map(projectStack, indices))
+    else:
+        for index in indices:
+            projectStack(index)
+
+    return projected
+
+def getStackFiles(hyperstack: LazyHyperstack) -> dict:
+    """
+    Return the file of each (t, c, source) Z-stack of a plan when each one is a whole file of its own, e.g. a Bruker
+    cycle or a Flamingo illumination side, so every file can be projected on its own in a worker process.
+
+    Returns:
+    dict: (t, c, source) mapped to the file path, or None if a Z-stack is spread over several files or shares one.
+    """
+    stack_files = {}
+    for t, c in getStackGroups(hyperstack):
+        z_sources = [hyperstack.plane_sources.get((t, z, c), []) for z in range(hyperstack.shape[1])]
+        for source in range(max(len(sources) for sources in z_sources)):
+            if any(len(sources) <= source for sources in z_sources):
+                return None
+            files = {sources[source][0] for sources in z_sources}
+            if len(files) != 1:
+                return None
+            stack_files[(t, c, source)] = files.pop()
+    if len(set(stack_files.values())) != len(stack_files):
+        return None
+
+    return stack_files
+
+def projectPlanInProcesses(hyperstack: LazyHyperstack,
+                           stack_files: dict,
+                           projection_type: str,
+                           backend: ReaderBackend,
+                           process_workers: int,
+                           tracer: PipelineTracer = None,
+                           use_numba: bool = False
+                           ) -> tuple:
+    """
+    Read and Z-project the file of each Z-stack of a plan in worker processes with projectFilesInProcesses, then fuse
+    the sources of each timepoint and channel into a TCYX hyperstack.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The indexed folder.
+    stack_files (dict): The file of each (t, c, source) Z-stack, see getStackFiles.
+    projection_type (str): 'max' or 'avg'.
+    backend (ReaderBackend): Backend of the folder, for the average dtype and the fusion of the sources.
+    process_workers (int): Number of worker processes.
+    tracer (PipelineTracer): If given, every read and projection is recorded on the trace timeline.
+    use_numba (bool): See projectStackInto.
+
+    Returns:
+    np.ndarray: The (T, C, Y, X) projected hyperstack.
+    int: The number of bytes read.
+    """
+    projected = createProjectedArray(hyperstack, projection_type, backend)
+    project_function = functools.partial(projectFileStack, average_dtype=backend.average_dtype, use_numba=use_numba)
+    planes, bytes_read = projectFilesInProcesses(list(stack_files.values()),
+                                                 project_function=project_function,
+                                                 projection_type=projection_type,
+                                                 process_workers=process_workers,
+                                                 imread_kwargs=hyperstack.tifffile_kwargs,
+                                                 ingest_transform=hyperstack.ingest_transform,
+                                                 tracer=tracer)
+    source_planes = collections.defaultdict(list)
+    for (t, c, _), plane in zip(stack_files, planes):
+        source_planes[(t, c)].append(plane)
+    for t, c in getStackGroups(hyperstack):
+        if (t, c) in source_planes:
+            backend.fuseSources(source_planes[(t, c)], projected[t, c], use_numba=use_numba)
+        else:
+            projected[t, c] = 0
+
+    return projected, bytes_read
+
+def readPlan(hyperstack: LazyHyperstack,
+             scratch_directory: str = None,
+             read_ahead: int = 0,
+             tracer: PipelineTracer = None
+             ) -> np.ndarray:
+    """
+    Read the full TZCYX hyperstack of a plan, one file at a time, each plane combined from its pages and passed
+    through the plane function of the plan.
+
+    Parameters:
+    hyperstack (LazyHyperstack): The indexed folder.
+    scratch_directory (str): If given, the hyperstack is assembled in a disk-backed array in this directory, for
+        hyperstacks larger than RAM.
+    read_ahead (int): Number of files to read ahead in background threads. 0 reads sequentially.
+    tracer (PipelineTracer): If given, every file read is recorded on the trace timeline.
+
+    Returns:
+    np.ndarray: The hyperstack, an np.memmap with a scratch directory. Planes without pages are zeros.
+    """
+    if scratch_directory is not None:
+        output = createScratchArray(scratch_directory, hyperstack.shape, hyperstack.dtype)
+    else:
+        output = np.zeros(hyperstack.shape, dtype=hyperstack.dtype)
+    groups = getPlaneGroups(hyperstack)
+    for plane, pages in iterateCompletedGroups(hyperstack, groups, read_ahead, tracer):
+        if groups[plane]:
+            output[plane] = hyperstack.combinePages([pages[source] for source in groups[plane]])
+
+    return output
+
+def convertFolder(folder_path: str,
+                  microscope_type: str,
+                  output_directory: str = None,
+                  options: ConversionOptions = None,
+                  return_hyperstack: bool = False,
+                  streaming: bool = False,
+                  overwrite: bool = True,
+                  log_details: dict = None
+                  ) -> FolderResult:
+    """
+    Convert one image folder with the pipeline engine: the reader backend of the microscope indexes the folder as a
+    plan of (t, z, c) planes and their TIFF pages, the shared stages read, project and fuse it, and the writer of the
+    output format saves it. Every stage is timed on the stage timer, under the folder's name.
+
+    Projections read the whole folder, then project it. When streaming, each Z-stack is projected as soon as its
+    files are read instead, and with process_workers each file holding a Z-stack is read and projected in a worker
+    process. Full hyperstacks are read in memory, or into a disk-backed array when a scratch_directory is given.
+
+    Parameters:
+    folder_path (str): Path of the image folder.
+    microscope_type (str): Name of a registered reader backend, 'Bruker', 'Olympus' or 'Flamingo'.
+    output_directory (str): Directory of the output file. None, or test in the options, only returns the result.
+    options (ConversionOptions): Options of the run, see ConversionOptions.
+    return_hyperstack (bool): Whether to keep the hyperstack on the result.
+    streaming (bool): If True, project each Z-stack as soon as its files are read.
+    overwrite (bool): If True, an existing output is replaced. Otherwise the folder is not converted and its result
+        has the error 'Already exists!'.
+    log_details (dict): Log details the backend adds the issues it finds to, e.g. in the Bruker XML file.
+
+    Returns:
+    FolderResult: The output path, metadata, image type and hyperstack of the folder.
+    """
+    options = getConversionOptions(options)
+    backend = getReaderBackend(microscope_type)
+    if options.output_format not in OUTPUT_WRITERS:
+        raise ValueError(f"No output writer for '{options.output_format}'. Choose one of {tuple(OUTPUT_WRITERS)}.")
+    stage_timer = getStageTimer(options.stage_timer)
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    source_folder_path = folder_path
+
+    with stage_timer.trace(folder_name, 'folder', {'streaming': streaming}):
+        staging_name = None
+        if options.staging_cache is not None:
+            with stage_timer.stage(folder_name, 'staging'):
+                folder_path = options.staging_cache.stage(folder_path)
+            if folder_path != source_folder_path:
+                # Kept in the cache until the folder is converted, so staging another folder cannot evict it
+                staging_name = os.path.basename(folder_path)
+
+        try:
+            with stage_timer.stage(folder_name, 'metadata'):
+                # From the source folder, e.g. the .oif file of an Olympus folder is next to it and not staged
+                metadata = backend.read_metadata(source_folder_path, options, log_details)
+                # Select pages, crop, correct and bin every plane right after it is read, the pixel size is scaled by the binning
+                ingest_transform = createIngestTransform(options.crop, options.crop_unit, options.binning, options.binning_mode,
+                                                         metadata, pages=backend.page_selection(options),
+                                                         user_transforms=options.user_transforms)
+                if ingest_transform is not None:
+                    metadata = ingest_transform.updateMetadata(metadata)
+
+            with stage_timer.stage(folder_name, 'listing'):
+                plan = backend.index_folder(folder_path, ingest_transform, options)
+            hyperstack, projection_type = plan.hyperstack, plan.projection_type
+            print(f"Image type: {plan.image_type}")
+
+            output_path = None
+            if output_directory is not None:
+                extension = 'ome.zarr' if options.output_format == 'ome-zarr' else 'tif'
+                output_path = os.path.join(output_directory, f'{backend.output_name(folder_name, projection_type)}.{extension}')
+                if os.path.exists(output_path):
+                    if not overwrite:
+                        print(f"{folder_name} already exists!")
+                        return FolderResult(folder_name, metadata=metadata, image_type=plan.image_type, error='Already exists!')
+                    print(f"Output file {output_path} already exists. Overwriting...")
+            stack_files = getStackFiles(hyperstack) if projection_type is not None and options.process_workers > 0 else None
+
+            if projection_type is None:
+                with stage_timer.stage(folder_name, 'read') as counters:
+                    hyperstack = readPlan(hyperstack, options.scratch_directory, options.read_ahead, stage_timer.tracer)
+                    counters['bytes_out'] = hyperstack.nbytes
+            elif stack_files is not None:
+                # Each Z-stack is a file, read and projected in a worker process that writes the plane into shared memory
+                with stage_timer.stage(folder_name, 'read_project') as counters:
+                    hyperstack, counters['bytes_in'] = projectPlanInProcesses(hyperstack, stack_files, projection_type, backend,
+                                                                              options.process_workers, stage_timer.tracer,
+                                                                              use_numba=options.use_numba)
+                    counters['bytes_out'] = hyperstack.nbytes
+            elif streaming or options.process_workers > 0:
+                # Project each Z-stack as soon as its files are read, only the Z-stacks being read are held
+                with stage_timer.stage(folder_name, 'read_project') as counters:
+                    projected = createProjectedArray(hyperstack, projection_type, backend)
+                    groups = getStackGroups(hyperstack)
+                    for (t, c), pages in iterateCompletedGroups(hyperstack, groups, options.read_ahead, stage_timer.tracer):
+                        counters['bytes_in'] += sum(pages[source].nbytes for source in groups[(t, c)])
+                        projectPlanePlan(hyperstack, t, c, projected[t, c], projection_type, backend,
+                                         reduce_workers=options.reduce_workers,
+                                         use_numba=options.use_numba,
+                                         read_pages=lambda sources: [pages[source] for source in sources])
+                    hyperstack = projected
+                    counters['bytes_out'] = hyperstack.nbytes
+            else:
+                with stage_timer.stage(folder_name, 'read') as counters:
+                    pages = {}
+                    for file_pages_read in readPlanPages(hyperstack, getFilePages(getStackGroups(hyperstack)),
+                                                         options.read_ahead, stage_timer.tracer):
+                        pages.update(file_pages_read)
+                    counters['bytes_out'] = sum(page.nbytes for page in pages.values())
+                # Project each Z-stack straight into the hyperstack, the folder is never stacked unprojected
+                with stage_timer.stage(folder_name, 'projection', bytes_in=counters['bytes_out']) as counters:
+                    hyperstack = projectPlan(hyperstack, projection_type, backend, workers=options.projection_workers,
+                                             reduce_workers=options.reduce_workers,
+                                             use_numba=options.use_numba,
+                                             read_pages=lambda sources: [pages[source] for source in sources])
+                    counters['bytes_out'] = hyperstack.nbytes
+                del pages
+            if len(plan.axes) < hyperstack.ndim:
+                # A single timepoint, saved without its T axis
+                hyperstack = hyperstack[0]
+
+            if output_path is not None and not options.test:
+                # Warn if the hyperstack is too large
+                if hyperstack.nbytes > LARGE_OUTPUT_BYTES:
+                    print(f"Warning: The final hyperstack is {hyperstack.nbytes / (1024 ** 3):.2f} GB. It may take a while to save.")
+                    print("Consider splitting the data into smaller chunks.")
+                # Remove the existing file, or OME-Zarr directory
+                if os.path.isdir(output_path):
+                    shutil.rmtree(output_path)
+                elif os.path.exists(output_path):
+                    os.remove(output_path)
+                print(f"Saving hyperstack to {output_path}...")
+                with stage_timer.stage(folder_name, 'write', bytes_in=hyperstack.nbytes) as counters:
+                    counters['bytes_out'] = OUTPUT_WRITERS[options.output_format](hyperstack, plan.axes, metadata, output_path,
+                                                                                   **options.getWriterOptions())
+        finally:
+            if staging_name is not None:
+                options.staging_cache.release(staging_name)
+
+    return FolderResult(folder_name,
+                        output_path=output_path if not options.test else None,
+                        metadata=metadata,
+                        image_type=plan.image_type,
+                        hyperstack=hyperstack if return_hyperstack else None)
+
+def getOutputNameBruker(folder_name: str, projection_type: str) -> str:
+    """
+    Return the output name of a Bruker or Olympus folder, e.g. 'MAX_<folder>_raw'.
+    """
+    prefix = 'MAX_' if projection_type == 'max' else 'AVG_' if projection_type == 'avg' else ''
+    return f"{prefix}{folder_name.replace('.oif.files', '')}_raw"
+
+def getPageSelectionBruker(options: ConversionOptions) -> slice:
+    """
+    Return the pages to keep of each Bruker file: the frames of a single plane, or the Z planes of a cycle.
+    """
+    return options.t_selection if options.single_plane else options.z_selection
+
+def indexFolderBruker(folder_path: str,
+                      ingest_transform: IngestTransform = None,
+                      options: ConversionOptions = None
+                      ) -> FolderPlan:
+    """
+    Index a Bruker folder. Multi-plane folders have one file per cycle (timepoint) and channel with the Z planes as
+    pages, unselected cycles are never opened. Single-plane folders have one file per plane and channel with the
+    frames as pages, and are never projected.
+    """
+    options = getConversionOptions(options)
+    image_type, folder_tif_filenames = determineImageTypeBruker(folder_path, options.projection_type, options.single_plane)
+    channel_filenames = organizeFilesByChannel(folder_tif_filenames, 'Bruker')
+    if image_type == 'single_plane':
+        hyperstack = createLazyHyperstackSinglePlaneBruker(channel_filenames, ingest_transform, cache_bytes=0)
+        # Files of a single frame are saved as a ZCYX stack of their planes
+        image_type = 'single_plane_single_frame' if readTiffHeader(folder_tif_filenames[0])[0] == 1 else 'single_plane_multi_frame'
+        return FolderPlan(hyperstack, image_type, adjustImageJAxes(image_type))
+
+    if options.t_selection is not None:
+        channel_filenames = {channel_name: files[options.t_selection] for channel_name, files in channel_filenames.items()}
+    hyperstack = createLazyHyperstackBruker(channel_filenames, ingest_transform, cache_bytes=0)
+    return FolderPlan(hyperstack, image_type, adjustImageJAxes(image_type), options.projection_type)
+
+def readMetadataBruker(folder_path: str, options: ConversionOptions = None, log_details: dict = None) -> dict:
+    """
+    Read the pixel size and frame rate of a Bruker folder from its XML file, or None without auto_metadata_extract.
+    """
+    options = getConversionOptions(options)
+    if not options.auto_metadata_extract:
+        return None
+    folder_name = os.path.basename(os.path.normpath(folder_path))
+    xml_files = [file for file in os.listdir(folder_path) if os.path.splitext(file)[1] == '.xml']
+    if not xml_files:
+        raise FileNotFoundError(f"No XML file found in folder {folder_name}")
+    log_details = log_details if log_details is not None else {'Issues': []}
+    metadata, log_details = extractMetadataFromXMLBruker(os.path.join(folder_path, xml_files[0]), log_details)
+    if metadata is None:
+        raise ValueError(f"Could not read the metadata of {folder_name}: {log_details['Issues']}")
+    if options.single_plane:
+        # Divide by the number of frames acquired in each file, selected or not
+        first_file = min(file for file in os.listdir(folder_path) if file.endswith('.tif'))
+        metadata['framerate'] = metadata['framerate'] / readTiffHeader(os.path.join(folder_path, first_file))[0]
+    # Only every step-th timepoint is kept, so the kept frames are further apart
+    metadata['framerate'] = metadata['framerate'] * getSelectionStep(options.t_selection)
+
+    return metadata
+
+def listChannelFilesOlympus(folder_path: str) -> dict:
+    """
+    Return the TIFF files of an Olympus .oif.files folder by channel, sorted by T number, without the reference images.
+    """
+    tif_filenames = [os.path.join(folder_path, file) for file in os.listdir(folder_path)
+                     if file.endswith('.tif') and file.startswith('s') and not any(r in file for r in ['-R001', '-R002', '-R003', '-R004'])]
+    channel_filenames = organizeFilesByChannel(tif_filenames, 'Olympus')
+    for files in channel_filenames.values():
+        files.sort(key=extractTNumber)
+
+    return channel_filenames
+
+def indexFolderOlympus(folder_path: str,
+                       ingest_transform: IngestTransform = None,
+                       options: ConversionOptions = None
+                       ) -> FolderPlan:
+    """
+    Index an Olympus .oif.files folder, one single-page file per plane.
+    """
+    options = getConversionOptions(options)
+    hyperstack, image_type = createLazyHyperstackOlympus(listChannelFilesOlympus(folder_path), ingest_transform,
+                                                         options.z_selection, options.t_selection,
+                                                         cache_bytes=0)
+    if options.projection_type is None:
+        return FolderPlan(hyperstack, image_type, 'TZCYX')
+    # e.g. 'multiplane_multiframe_maxproject', the projection of a single frame is saved as ZCYX
+    image_type = image_type.replace('_raw', f'_{options.projection_type}project')
+    axes = 'ZCYX' if 'singleframe' in image_type else 'TCYX'
+    return FolderPlan(hyperstack, image_type, axes, options.projection_type)
+
+def readMetadataOlympus(folder_path: str, options: ConversionOptions = None, log_details: dict = None) -> dict:
+    """
+    Read the pixel size and frame interval of an Olympus folder from the .oif file next to it.
+    """
+    options = getConversionOptions(options)
+    oif_path = os.path.normpath(folder_path).replace('.oif.files', '.oif')
+    if not os.path.isfile(oif_path):
+        raise FileNotFoundError(f"No .oif file found for folder {os.path.basename(os.path.normpath(folder_path))}")
+    total_time_sec, pixel_width, pixel_unit = extractMetadataFromOIFOlympus(file_path=oif_path)
+    # From all the frames acquired and the step between the frames kept
+    num_frames = countFramesOlympus(planStackGroupsOlympus(listChannelFilesOlympus(folder_path)))
+    frame_interval = total_time_sec / num_frames * getSelectionStep(options.t_selection) if num_frames > 1 else 0
+
+    return {'X_microns_per_pixel': pixel_width,
+            'Y_microns_per_pixel': pixel_width,
+            'pixel_unit': pixel_unit,
+            'framerate': frame_interval}
+
+def getOutputNameFlamingo(folder_name: str, projection_type: str) -> str:
+    """
+    Return the output name of a Flamingo folder, e.g. '<folder>_MAX'.
+    """
+    name_suffix = 'MAX' if projection_type == 'max' else 'AVG' if projection_type == 'avg' else 'hyperstack'
+    return f'{folder_name}_{name_suffix}'
+
+def indexFolderFlamingo(folder_path: str,
+                        ingest_transform: IngestTransform = None,
+                        options: ConversionOptions = None
+                        ) -> FolderPlan:
+    """
+    Index a Flamingo folder, one file per frame, channel and illumination side with the Z planes as pages. The sides
+    of a plane are its sources, fused by their maximum.
+    """
+    options = getConversionOptions(options)
+    folder_path = os.path.normpath(folder_path)
+    file_index = FlamingoFileIndex.fromFolder(folder_path)
+    channel_names = file_index.channel_names
+    # Only the files of the selected frames are kept
+    file_index = file_index.selectFrames(options.t_selection)
+    print(f"Number of channels: {len(channel_names)}")
+    print(f"Number of frames: {file_index.num_frames}")
+    print(f"Number of illumination sides: {file_index.num_illumination_sides}")
+
+    hyperstack = createLazyHyperstackFlamingo(folder_path, file_index, file_index.num_frames, len(channel_names),
+                                              channel_names, ingest_transform, frames=file_index.frames,
+                                              cache_bytes=0)
+    axes = 'TCYX' if options.projection_type is not None else 'TZCYX'
+    return FolderPlan(hyperstack, options.projection_type or 'hyperstack', axes, options.projection_type)
+
+def readMetadataFlamingo(folder_path: str, options: ConversionOptions = None, log_details: dict = None) -> None:
+    """
+    Flamingo folders have no pixel size or frame rate metadata.
+    """
+    return None
+
+registerReaderBackend(ReaderBackend('Bruker', indexFolderBruker, readMetadataBruker, page_selection=getPageSelectionBruker))
+registerReaderBackend(ReaderBackend('Olympus', indexFolderOlympus, readMetadataOlympus))
+# Flamingo averages are kept as floats, and the illumination sides of each projection are fused by their maximum
+# and rotated 90 degrees counterclockwise in one pass
+registerReaderBackend(ReaderBackend('Flamingo', indexFolderFlamingo, readMetadataFlamingo, average_dtype=np.float64,
+                                    projection_function=np.rot90, output_name=getOutputNameFlamingo,
+                                    fuse_function=fuseSidesInto))
@@ -1,6 +1,241 @@
-import tqdm
+import os
+import re
 import tifffile
+import warnings
 import numpy as np
+from domilyzer.functions_gui.ingest_functions import IngestTransform
+from domilyzer.functions_gui.prefetch_functions import readTiffFiles
+from domilyzer.functions_gui.reduction_functions import reduceAxis
+from domilyzer.functions_gui.kernel_functions import fuseSidesInto
+from domilyzer.functions_gui.selection_functions import selectIndices
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack, DEFAULT_PLANE_CACHE_BYTES
+
+# Fields of a Flamingo filename, e.g. S000_t000000_V000_R0000_X000_Y000_C00_I0_D0_P00366.tif
+# S: unsure, t: time point, V: unsure, R: rotation, X: x position, Y: y position, C: channel, I: illumination side,
+# D: unsure, P: Z-planes
+FLAMINGO_FILENAME_FIELDS = ('S', 't', 'V', 'R', 'X', 'Y', 'C', 'I', 'D', 'P')
+FLAMINGO_FILENAME_PATTERN = re.compile('_'.join(rf'{field}(\d+)' for field in FLAMINGO_FILENAME_FIELDS) + r'\.tif', re.ASCII)
+# A single field, for filenames that do not follow the full pattern
+FLAMINGO_FIELD_PATTERN = re.compile(r'(?:^|_)([StVRXYCIDP])(\d+)(?=[_.]|$)', re.ASCII)
+
+def parseFilenamesFlamingo(filenames: list) -> np.array:
+    """
+    Parse the fields of Flamingo filenames into a table.
+    
+    Filenames of a folder are normally zero-padded to the same layout, in which case they are all parsed at once from
+    their characters. Otherwise each filename is parsed with the full pattern, or field by field if it does not follow
+    it, keeping the first occurrence of each field.
+    
+    Parameters
+    filenames : list
+        List of filenames.
+        
+    Returns
+    np.array
+        An (n, 10) int64 table with one column per field of FLAMINGO_FILENAME_FIELDS, -1 where a filename has no
+        such field.
+    """
+    table = np.full((len(filenames), len(FLAMINGO_FILENAME_FIELDS)), -1, dtype=np.int64)
+    if not filenames:
+        return table
+
+    match = FLAMINGO_FILENAME_PATTERN.fullmatch(filenames[0])
+    if match is not None:
+        # All the filenames side by side as rows of characters, one per line (other characters are replaced by '?')
+        characters = np.frombuffer(('\n'.join(filenames) + '\n').encode('ascii', 'replace'), dtype=np.uint8)
+        line_length = len(filenames[0]) + 1
+        if characters.size == len(filenames) * line_length:
+            characters = characters.reshape(len(filenames), line_length)
+            # Place value of each digit of each field, 0 outside the fields
+            place_values = np.zeros((line_length, len(FLAMINGO_FILENAME_FIELDS)))
+            for column in range(len(FLAMINGO_FILENAME_FIELDS)):
+                start, end = match.span(column + 1)
+                place_values[start:end, column] = 10.0 ** np.arange(end - start - 1, -1, -1)
+            is_digit = place_values.any(axis=1)
+            # Digit values, wrapping around for the other characters
+            values = characters - np.uint8(ord('0'))
+            # Same characters as the first filename outside its fields, and digits in them
+            if np.where(is_digit, values <= 9, characters == characters[0]).all():
+                # Exact in float64 for fields of up to 15 digits
+                table[:] = np.rint(values[:, is_digit].astype(np.float64) @ place_values[is_digit])
+                return table
+
+    for row, filename in enumerate(filenames):
+        match = FLAMINGO_FILENAME_PATTERN.fullmatch(filename)
+        if match is not None:
+            table[row] = [int(value) for value in match.groups()]
+            continue
+        for field, value in FLAMINGO_FIELD_PATTERN.findall(filename):
+            column = FLAMINGO_FILENAME_FIELDS.index(field)
+            if table[row, column] == -1:
+                table[row, column] = int(value)
+
+    return table
+
+class FlamingoFileIndex:
+    """
+    The TIFF files of a Flamingo folder with their parsed filename fields, so the channels, frames, illumination
+    sides and files of each frame and channel are queried from one table instead of re-splitting every filename.
+    
+    It is a sequence of the filenames, in listing order, and can be passed wherever a list of filenames is expected.
+    
+    Parameters
+    filenames : list
+        List of filenames.
+    table : np.array
+        Their parsed fields, see parseFilenamesFlamingo. Parsed from the filenames if not given.
+    """
+    def __init__(self, filenames: list, table: np.array = None):
+        self.filenames = list(filenames)
+        self.table = table if table is not None else parseFilenamesFlamingo(self.filenames)
+        self._groups = None
+
+    @classmethod
+    def fromFolder(cls, folder_path: str):
+        """
+        Index the TIFF files of a folder (named S*.tif) from a single directory scan.
+        
+        Parameters
+        folder_path : str
+            Path to the folder.
+            
+        Returns
+        FlamingoFileIndex
+            The index of the folder's files, in listing order.
+        """
+        with os.scandir(folder_path) as entries:
+            filenames = [entry.name for entry in entries if entry.name.endswith('.tif') and entry.name.startswith('S')]
+        return cls(filenames)
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    def __iter__(self):
+        return iter(self.filenames)
+
+    def __getitem__(self, index):
+        return self.filenames[index]
+
+    def __repr__(self) -> str:
+        return f"FlamingoFileIndex({len(self)} files, {self.num_frames} frames, {self.num_channels} channels)"
+
+    def getField(self, field: str) -> np.array:
+        """
+        Return the values of one field of FLAMINGO_FILENAME_FIELDS, -1 for the filenames without it.
+        """
+        return self.table[:, FLAMINGO_FILENAME_FIELDS.index(field)]
+
+    @property
+    def channel_names(self) -> list:
+        """
+        The channel numbers as written in the filenames (e.g. '00'), in order of first appearance.
+        """
+        channels = self.getField('C')
+        values, first_rows = np.unique(channels, return_index=True)
+        first_rows = np.sort(first_rows[values >= 0])
+        return [dict(FLAMINGO_FIELD_PATTERN.findall(self.filenames[row]))['C'] for row in first_rows]
+
+    @property
+    def num_channels(self) -> int:
+        channels = self.getField('C')
+        return len(np.unique(channels[channels >= 0]))
+
+    @property
+    def frames(self) -> list:
+        """
+        The frame numbers, in increasing order.
+        """
+        frames = self.getField('t')
+        return np.unique(frames[frames >= 0]).tolist()
+
+    @property
+    def num_frames(self) -> int:
+        return len(self.frames)
+
+    @property
+    def num_illumination_sides(self) -> int:
+        sides = self.getField('I')
+        return len(np.unique(sides[sides >= 0]))
+
+    @property
+    def num_z_planes(self) -> int:
+        """
+        The number of Z planes of the stacks, the largest P number.
+        """
+        z_planes = self.getField('P')
+        return int(z_planes.max()) if (z_planes >= 0).any() else None
+
+    def subset(self, rows) -> 'FlamingoFileIndex':
+        """
+        Return the index of some of the files, given by their positions or a boolean mask, in listing order.
+        """
+        rows = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else np.sort(np.asarray(rows, dtype=np.int64))
+        return FlamingoFileIndex([self.filenames[row] for row in rows], self.table[rows])
+
+    def selectFrames(self, selection: slice) -> 'FlamingoFileIndex':
+        """
+        Keep the files of the selected frames, like selectFilesByNumber with getFrameNumberFlamingo. Files without a
+        frame number are kept.
+        
+        Parameters
+        selection : slice
+            Positions to keep in the sorted frame numbers, None keeps every file.
+            
+        Returns
+        FlamingoFileIndex
+            The index of the selected files.
+        """
+        if selection is None:
+            return self
+        frames = self.frames
+        selected_frames = [frames[index] for index in selectIndices(len(frames), selection)]
+        frame_column = self.getField('t')
+        return self.subset((frame_column < 0) | np.isin(frame_column, selected_frames))
+
+    def getFrameChannelRows(self, frame: int, channels: list) -> list:
+        """
+        Get the positions of the files of one frame, grouped by channel.
+        
+        Parameters
+        frame : int
+            Frame number.
+        channels : list
+            Channel numbers, as in channel_names.
+            
+        Returns
+        list
+            One list of positions (one per illumination side, in listing order) for each channel.
+        """
+        if self._groups is None:
+            # One stable sort of the files by (frame, channel), each group is then found by binary search
+            channel_column = self.getField('C')
+            channel_stride = int(channel_column.max()) + 2 if len(self) else 1
+            keys = self.getField('t') * channel_stride + channel_column + 1
+            order = np.argsort(keys, kind='stable')
+            self._groups = (channel_stride, keys[order], order)
+        channel_stride, sorted_keys, order = self._groups
+        frame_channel_rows = []
+        for channel in channels:
+            if not 0 <= int(channel) < channel_stride - 1:
+                frame_channel_rows.append([])
+                continue
+            key = frame * channel_stride + int(channel) + 1
+            start, end = np.searchsorted(sorted_keys, [key, key + 1])
+            frame_channel_rows.append(order[start:end].tolist())
+
+        return frame_channel_rows
+
+    def getFrameChannelFiles(self, frame: int, channels: list) -> list:
+        """
+        Get the files of one frame, grouped by channel, see getFrameChannelRows.
+        """
+        return [[self.filenames[row] for row in rows] for rows in self.getFrameChannelRows(frame, channels)]
+
+def getFileIndexFlamingo(file_list: list) -> FlamingoFileIndex:
+    """
+    Return the FlamingoFileIndex of a list of filenames, or the list itself if it is already one.
+    """
+    return file_list if isinstance(file_list, FlamingoFileIndex) else FlamingoFileIndex(file_list)
 
 def getNumChannelsFlamingo(file_list: list) -> tuple:
     """
@@ -9,23 +244,14 @@ def getNumChannelsFlamingo(file_list: list) -> tuple:
     
     Parameters
     file_list : list
-        List of filenames to extract channel information from.
+        List of filenames to extract channel information from, or their FlamingoFileIndex.
         
     Returns
     tuple
         A tuple containing the number of unique channels and a list of unique channel numbers.
     """
-    # Extract the channel number from the filenames
-    channel_numbers = []
-    for file in file_list:
-        parts = file.split('_')
-        for part in parts:
-            if part.startswith('C') and part[1:].isdigit():
-                if part[1:] not in channel_numbers:
-                    channel_numbers.append(part[1:])
-                break
-
-    return len(channel_numbers), channel_numbers
+    channel_names = getFileIndexFlamingo(file_list).channel_names
+    return len(channel_names), channel_names
 
 def getNumFramesFlamingo(file_list: list) -> int:
     """
@@ -34,22 +260,45 @@ def getNumFramesFlamingo(file_list: list) -> int:
     
     Parameters
     file_list : list
-        List of filenames to extract frame information from.
+        List of filenames to extract frame information from, or their FlamingoFileIndex.
         
     Returns
     int
         The number of unique frames.
     """
-    # Extract the frame number from the filenames
-    frame_numbers = set()
-    for file in file_list:
-        parts = file.split('_')
-        for part in parts:
-            if part.startswith('t') and part[1:].isdigit():
-                frame_numbers.add(int(part[1:]))
-                break
+    return getFileIndexFlamingo(file_list).num_frames
+
+def getFrameNumberFlamingo(filename: str) -> int:
+    """
+    Extract the frame number of a filename, from its 't<number>' part.
+    
+    Parameters
+    filename : str
+        The filename.
+        
+    Returns
+    int
+        The frame number, or None if the filename has none.
+    """
+    for field, value in FLAMINGO_FIELD_PATTERN.findall(filename):
+        if field == 't':
+            return int(value)
 
-    return len(frame_numbers)
+    return None
+
+def getFrameNumbersFlamingo(file_list: list) -> list:
+    """
+    Extract the sorted unique frame numbers from the filenames.
+    
+    Parameters
+    file_list : list
+        List of filenames to extract frame information from, or their FlamingoFileIndex.
+        
+    Returns
+    list
+        The frame numbers, in increasing order.
+    """
+    return getFileIndexFlamingo(file_list).frames
 
 def getNumZPlanesFlamingo(file_list: list) -> int:
     """
@@ -58,22 +307,13 @@ def getNumZPlanesFlamingo(file_list: list) -> int:
     
     Parameters
     file_list : list
-        List of filenames to extract frame information from.
+        List of filenames to extract frame information from, or their FlamingoFileIndex.
         
     Returns
     int
         The number of unique z planes.
     """
-    # Extract the Z-plane number from the filenames
-    for file in file_list:
-        file = file.split('.')[0]
-        parts = file.split('_')
-        for part in parts:
-            if part.startswith('P') and part[1:].isdigit():
-                num_z_planes = int(part[1:])
-                break
-
-    return num_z_planes
+    return getFileIndexFlamingo(file_list).num_z_planes
 
 def getNumIlluminationSidesFlamingo(file_list: list) -> int:
     """
@@ -82,23 +322,37 @@ def getNumIlluminationSidesFlamingo(file_list: list) -> int:
     
     Parameters
     file_list : list
-        List of filenames to extract illumination side information from.
+        List of filenames to extract illumination side information from, or their FlamingoFileIndex.
         
     Returns
     int
         The number of unique illumination sides.
     """
-    # Extract the excitation side from the filenames
-    excite_sides = []
-    for file in file_list:
-        parts = file.split('_')
-        for part in parts:
-            if part.startswith('I') and part[1:].isdigit():
-                if int(part[1:]) not in excite_sides:
-                    excite_sides.append(int(part[1:]))
-                break
+    return getFileIndexFlamingo(file_list).num_illumination_sides
 
-    return len(excite_sides)
+def getFrameChannelFilesFlamingo(filenames: list,
+                                 frame: int,
+                                 num_channels: int,
+                                 channels: list
+                                 ) -> list:
+    """
+    Get the files of one frame, grouped by channel.
+    
+    Parameters
+    filenames : list
+        List of TIFF filenames, or their FlamingoFileIndex.
+    frame : int
+        Frame number.
+    num_channels : int
+        Number of channels in the images.
+    channels : list
+        List of channel numbers.
+    
+    Returns
+    list
+        One list of filenames (one per illumination side) for each channel.
+    """
+    return getFileIndexFlamingo(filenames).getFrameChannelFiles(frame, channels[:num_channels])
 
 def convertImagesToNumpyArraysAndProjectFlamingo(folder_path: str, 
                             tif_files: list, 
@@ -107,29 +361,30 @@ def convertImagesToNumpyArraysAndProjectFlamingo(folder_path: str,
     """
     Convert TIFF images to numpy arrays and apply a z-projection.
     
+    Deprecated, convertFolder(folder_path, 'Flamingo') reads and projects the folder with the Flamingo reader backend.
+    
     Parameters
     folder_path : str
         Path to the folder containing the TIFF files.
     tif_files : list
         List of TIFF filenames to be converted.
     projection_type : str
-        Type of projection to apply ('max', 'avg', or 'sum').
+        Type of projection to apply ('max', 'avg', or None).
         
     Returns
     list
         List of numpy arrays representing the images.
     """
+    warnings.warn("convertImagesToNumpyArraysAndProjectFlamingo is deprecated, use convertFolder(folder_path, 'Flamingo').",
+                  DeprecationWarning, stacklevel=2)
     all_images = []
 
-    for file_path in tqdm.tqdm(tif_files, desc="Reading files"):
-        image_path = f'{folder_path}/{file_path}'  
-        # Read the image
-        image_array = tifffile.imread(image_path)
+    for image_array in readTiffFiles([f'{folder_path}/{file_path}' for file_path in tif_files]):
         # Z-projection here to reduce the 3D image to 2D and save memory
         if projection_type == 'max':
-            image_array = zProject(image_array, projection_type='max')
+            image_array = reduceAxis(image_array, axis=0, reduction='max')
         elif projection_type == 'avg':
-            image_array = zProject(image_array, projection_type='avg')
+            image_array = reduceAxis(image_array, axis=0, reduction='mean')
 
         all_images.append(image_array)
     
@@ -141,22 +396,26 @@ def zProject(image: np.array,
     """
     Apply a z-projection to the image.
     
+    Deprecated, use reduceAxis(image, axis=0, reduction='max') or reduction='mean'.
+    
     Parameters
     image : np.array
         The image to be projected.
     projection_type : str
-        Type of projection to apply ('max', 'avg', or 'sum').
+        Type of projection to apply ('max' or 'avg').
         
     Returns
     np.array
         The projected image.
     """
+    warnings.warn("zProject is deprecated, use reduceAxis(image, axis=0, reduction='max') or reduction='mean'.",
+                  DeprecationWarning, stacklevel=2)
     if projection_type == 'max':
-        return np.max(image, axis=0)
+        return reduceAxis(image, axis=0, reduction='max')
     elif projection_type == 'avg':
-        return np.mean(image, axis=0)
+        return reduceAxis(image, axis=0, reduction='mean')
     else:
-        raise ValueError("Invalid projection type. Choose 'max', 'avg', or 'sum'.")
+        raise ValueError("Invalid projection type. Choose 'max' or 'avg'.")
 
 def mergeNumpyArrayIlluminationSidesFlamingo(images: list,
                                filenames: list,
@@ -168,11 +427,13 @@ def mergeNumpyArrayIlluminationSidesFlamingo(images: list,
     """
     Merge images from different illumination sides into a single hyperstack.
     
+    Deprecated, convertFolder(folder_path, 'Flamingo') fuses the illumination sides of each plane as it is read.
+    
     Parameters
     images : list
         List of images to be merged.
     filenames : list
-        List of filenames corresponding to the images.
+        List of filenames corresponding to the images, or their FlamingoFileIndex.
     num_frames : int
         Number of frames in the images.
     num_channels : int
@@ -180,28 +441,25 @@ def mergeNumpyArrayIlluminationSidesFlamingo(images: list,
     channels : list
         List of channel numbers.
     projection : str
-        Type of projection to apply ('max', 'avg', or 'sum').  
+        Type of projection the images were read with ('max', 'avg', or None).
     
     Returns
     np.array
         The merged hyperstack.
     """
+    warnings.warn("mergeNumpyArrayIlluminationSidesFlamingo is deprecated, use convertFolder(folder_path, 'Flamingo').",
+                  DeprecationWarning, stacklevel=2)
+    file_index = getFileIndexFlamingo(filenames)
     final_hyperstack = []
 
-    for frame in tqdm.tqdm(range(num_frames), desc="Processing frames"):
-        # Filter images for the current frame
-        frame_filter = f't{frame:06d}'
+    for frame in range(num_frames):
         frame_images = []
-        for channel in range(num_channels):
-            # Filter images for the current frame and channel
-            channel_filter = f'C{channels[channel]}'
-            channel_images = [img for img, file in zip(images, filenames) if frame_filter in file and channel_filter in file]
-            
-            # Combine all images by taking the max pixel value across all illumination sides
-            combined_image = np.max(channel_images, axis=0)
-            # Rotate the combined image 90 degrees counterclockwise
-            rotated_image = np.rot90(combined_image)
-            frame_images.append(rotated_image)
+        for rows in file_index.getFrameChannelRows(frame, channels[:num_channels]):
+            # Combine the illumination sides by their maximum, rotated 90 degrees counterclockwise
+            side_images = [images[row] for row in rows]
+            rotated_shape = (side_images[0].shape[1], side_images[0].shape[0], *side_images[0].shape[2:])
+            output = np.empty(rotated_shape, dtype=np.result_type(*side_images))
+            frame_images.append(fuseSidesInto(side_images, output))
 
         # Stack the two channels into a hyperstack, and add to the final hyperstack
         hyperstack = np.stack(frame_images, axis=0)
@@ -211,4 +469,58 @@ def mergeNumpyArrayIlluminationSidesFlamingo(images: list,
         
         final_hyperstack.append(hyperstack)
 
-    return np.stack(final_hyperstack, axis=0)
\ No newline at end of file
+    return np.stack(final_hyperstack, axis=0)
+
+def createLazyHyperstackFlamingo(folder_path: str,
+                                 tif_files: list,
+                                 num_frames: int,
+                                 num_channels: int,
+                                 channels: list,
+                                 ingest_transform: IngestTransform = None,
+                                 frames: list = None,
+                                 cache_bytes: int = DEFAULT_PLANE_CACHE_BYTES
+                                 ) -> LazyHyperstack:
+    """
+    Index a folder as a LazyHyperstack, a TZCYX array whose planes are the maximum of the illumination sides,
+    reading each Z plane of the illumination sides only when it is indexed.
+    
+    Parameters
+    folder_path : str
+        Path to the folder containing the TIFF files.
+    tif_files : list
+        List of TIFF filenames, or their FlamingoFileIndex.
+    num_frames : int
+        Number of frames in the images.
+    num_channels : int
+        Number of channels in the images.
+    channels : list
+        List of channel numbers.
+    ingest_transform : IngestTransform
+        If given, only its selected pages are indexed and each one is cropped and binned when read, in the raw
+        camera orientation.
+    frames : list
+        Frame numbers to index, e.g. a selection of them. Defaults to frames 0 to num_frames - 1.
+    cache_bytes : int
+        Maximum bytes of decoded planes kept in memory.
+    
+    Returns
+    LazyHyperstack
+        The TZCYX hyperstack.
+    """
+    frames = frames if frames is not None else range(num_frames)
+    file_index = getFileIndexFlamingo(tif_files)
+    frame_files = [file_index.getFrameChannelFiles(frame, channels[:num_channels]) for frame in frames]
+    # Number of Z planes from the TIFF header of the first file, without reading pixels
+    with tifffile.TiffFile(f'{folder_path}/{frame_files[0][0][0]}') as tif:
+        num_pages = len(tif.pages)
+    pages = selectIndices(num_pages, ingest_transform.pages if ingest_transform is not None else None)
+    
+    plane_sources = {(frame, z_index, channel): [(f'{folder_path}/{file}', page) for file in files]
+                     for frame, channel_files in enumerate(frame_files)
+                     for channel, files in enumerate(channel_files)
+                     for z_index, page in enumerate(pages)}
+    
+    # Full Flamingo hyperstacks are saved with each (Z, Y, X) stack rotated over its first two axes and Z moved back
+    # in front, which leaves every plane upside down
+    return LazyHyperstack(plane_sources, (len(frame_files), len(pages), num_channels), ingest_transform,
+                          plane_function=np.flipud, cache_bytes=cache_bytes)
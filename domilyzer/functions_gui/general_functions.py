@@ -1,7 +1,16 @@
 import os
+import sys
 import struct
 import tifffile
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from domilyzer.functions_gui.outofcore_functions import iterateHyperstackPlanes
+from domilyzer.functions_gui.compression_functions import chooseCompression, getCompressionOptions
+from domilyzer.functions_gui.pyramid_functions import getPyramidLevelShapes, iteratePlanesBuildingPyramid
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack
+
+# Byte order of this machine, written without byteswapping the pixel data. ImageJ reads either order.
+NATIVE_BYTEORDER = '<' if sys.byteorder == 'little' else '>'
 
 def initializeOutputFolders(parent_folder_path: str) -> tuple:
     '''
@@ -90,7 +99,12 @@ def saveImageJHyperstack(hyperstack: np.array,
                          axes: str, 
                          metadata: dict, 
                          image_output_name: str, 
-                         imagej_tags: list = None
+                         imagej_tags: list = None,
+                         write_workers: int = 0,
+                         byteorder: str = NATIVE_BYTEORDER,
+                         compression: str = None,
+                         pyramid_levels: int = 0,
+                         pyramid_binning: str = 'mean'
                          ) -> None:   
     """
     Save a hyperstack as a TIFF file with ImageJ metadata.
@@ -105,7 +119,156 @@ def saveImageJHyperstack(hyperstack: np.array,
     image_output_name : str
         The name of the output TIFF file.
     imagej_tags : list, optional
-        Additional ImageJ metadata tags to be included in the TIFF file.
+        Additional ImageJ metadata tags to be included in the TIFF file, created with the same byteorder.
+    write_workers : int, optional
+        If > 0, the output file is created up front with its full page layout and this many threads
+        copy the planes straight into it, instead of funnelling them through one writer.
+        With compression, the number of threads compressing the strips of each page instead.
+    byteorder : str, optional
+        Byte order of the file, '<' or '>'. Defaults to the native order, so the pixel data is written
+        without a byteswapped copy.
+    compression : str, optional
+        Lossless codec ('zlib', 'lzw' or 'zstd', optionally with a level such as 'zlib:1') with a horizontal
+        differencing predictor, or 'auto' to pick the fastest ImageJ-readable codec (or none) from a trial on
+        the first planes. None writes uncompressed.
+    pyramid_levels : int, optional
+        Number of downsampled levels (2x, 4x, 8x, ...) written as SubIFDs of each plane, so viewers that
+        understand pyramids open the file instantly. ImageJ still reads the full-resolution planes unchanged.
+    pyramid_binning : str, optional
+        'mean' or 'max' of each 2 x 2 block of pixels, for the pyramid levels.
+        
+    A disk-backed hyperstack (np.memmap) or a LazyHyperstack is written one plane at a time, so it is never loaded
+    into memory whole.
+    """
+    if compression == 'auto':
+        compression = chooseCompression(hyperstack, write_workers=write_workers)
+    
+    if pyramid_levels > 0:
+        writeImageJPyramid(hyperstack, axes, metadata, image_output_name, imagej_tags, byteorder,
+                           getCompressionOptions(compression, hyperstack.dtype, hyperstack.shape[-2:], write_workers),
+                           pyramid_levels, pyramid_binning)
+        return
+    
+    # Compressed pages have no size known up front, so they cannot be written into a preallocated file
+    if write_workers > 0 and compression is None:
+        output_hyperstack = createImageJHyperstackFile(image_output_name, hyperstack.shape, hyperstack.dtype,
+                                                       axes, metadata, imagej_tags, byteorder)
+        writePlanesInParallel(hyperstack, output_hyperstack, write_workers)
+        output_hyperstack.flush()
+        del output_hyperstack
+        return
+    
+    if isinstance(hyperstack, np.memmap):
+        # Disk-backed hyperstack, stream it plane by plane
+        data, shape, dtype = iterateHyperstackPlanes(hyperstack), hyperstack.shape, hyperstack.dtype
+    elif isinstance(hyperstack, LazyHyperstack):
+        # Planes read from the raw files as they are written
+        data, shape, dtype = hyperstack.iteratePlanes(), hyperstack.shape, hyperstack.dtype
+    else:
+        data, shape, dtype = hyperstack, None, None
+    tifffile.imwrite(image_output_name, 
+                    data, 
+                    shape=shape,
+                    dtype=dtype,
+                    **getImageJWriteOptions(axes, metadata, imagej_tags, byteorder),
+                    **getCompressionOptions(compression, hyperstack.dtype, hyperstack.shape[-2:], write_workers)
+                )
+
+def writeImageJPyramid(hyperstack: np.array,
+                       axes: str,
+                       metadata: dict,
+                       image_output_name: str,
+                       imagej_tags: list,
+                       byteorder: str,
+                       compression_options: dict,
+                       pyramid_levels: int,
+                       pyramid_binning: str = 'mean'
+                       ) -> None:
+    """
+    Write an ImageJ hyperstack whose planes each carry downsampled copies as SubIFDs.
+    
+    tifffile's ImageJ mode cannot write SubIFDs, so the ImageJ description is written by hand on a regular
+    TIFF. ImageJ only follows the main page chain, so it sees the same hyperstack as without the pyramid.
+    The levels are binned while the full-resolution planes are written; they take a third of the size
+    of the hyperstack in memory.
+    
+    Parameters
+    hyperstack : np.array
+        The hyperstack to be saved, in memory or disk-backed.
+    axes, metadata, image_output_name, imagej_tags, byteorder :
+        As for saveImageJHyperstack.
+    compression_options : dict
+        tifffile keyword arguments from getCompressionOptions, used for every level.
+    pyramid_levels : int
+        Number of downsampled levels.
+    pyramid_binning : str
+        'mean' or 'max', see binPlane.
+    """
+    imagej_options = getImageJWriteOptions(axes, metadata, imagej_tags, byteorder)
+    plane_shape = hyperstack.shape[-2:]
+    num_planes = int(np.prod(hyperstack.shape[:-2]))
+    level_shapes = getPyramidLevelShapes(plane_shape, pyramid_levels)
+    pyramid = [np.empty((num_planes, *level_shape), dtype=hyperstack.dtype) for level_shape in level_shapes]
+    # Index planes by position rather than reshaping, so transposed hyperstacks are not copied
+    planes = (hyperstack[np.unravel_index(index, hyperstack.shape[:-2])] for index in range(num_planes))
+    
+    with tifffile.TiffWriter(image_output_name, byteorder=byteorder) as tif:
+        tif.write(iteratePlanesBuildingPyramid(planes, pyramid, pyramid_binning),
+                  shape=(num_planes, *plane_shape),
+                  dtype=hyperstack.dtype,
+                  subifds=len(pyramid),
+                  photometric='minisblack',
+                  description=createImageJDescription(hyperstack.shape, axes, imagej_options['metadata']),
+                  metadata=None,
+                  resolution=imagej_options['resolution'],
+                  extratags=imagej_options['extratags'],
+                  **compression_options)
+        for level, level_array in enumerate(pyramid, start=1):
+            # Coarser levels have proportionally larger pixels
+            resolution = tuple(value / 2 ** level for value in imagej_options['resolution']) if imagej_options['resolution'] else None
+            tif.write(level_array,
+                      subfiletype=1,
+                      photometric='minisblack',
+                      metadata=None,
+                      resolution=resolution,
+                      **compression_options)
+
+def createImageJDescription(shape: tuple, axes: str, saved_metadata: dict) -> str:
+    """
+    Return the ImageDescription that marks a TIFF file as an ImageJ hyperstack, as tifffile writes it in ImageJ mode.
+    
+    Parameters
+    shape : tuple
+        Shape of the hyperstack.
+    axes : str
+        The axes of the hyperstack, in ImageJ order (e.g., 'TZCYX').
+    saved_metadata : dict
+        The ImageJ metadata from getImageJWriteOptions (axes, finterval, unit, mode).
+    """
+    sizes = dict(zip(axes, shape))
+    description = ['ImageJ=1.11a', f'images={int(np.prod(shape[:-2]))}']
+    for axis, key in (('C', 'channels'), ('Z', 'slices'), ('T', 'frames')):
+        if sizes.get(axis, 1) > 1:
+            description.append(f'{key}={sizes[axis]}')
+    description.append('hyperstack=true')
+    if 'mode' in saved_metadata:
+        description.append(f"mode={saved_metadata['mode']}")
+    if sizes.get('T', 1) > 1:
+        description.append('loop=false')
+    for key in ('finterval', 'unit'):
+        if saved_metadata.get(key) is not None:
+            description.append(f'{key}={saved_metadata[key]}')
+    
+    return '\n'.join(description) + '\n'
+
+def getImageJWriteOptions(axes: str,
+                          metadata: dict,
+                          imagej_tags: list = None,
+                          byteorder: str = NATIVE_BYTEORDER
+                          ) -> dict:
+    """
+    Return the tifffile.imwrite keyword arguments shared by every ImageJ hyperstack the pipeline writes:
+    byte order, ImageJ axes and frame interval, pixel size and the LUT extratags.
     """
     # Write the hyperstack to a TIFF file
     if metadata is None: # for the flamingo data for now, and if user does not want to save metadata
@@ -121,23 +284,106 @@ def saveImageJHyperstack(hyperstack: np.array,
             'unit': 'um',
             'mode': 'composite'
         }
-    tifffile.imwrite(image_output_name, 
-                    hyperstack, 
-                    byteorder='>', 
-                    imagej=True,
-                    resolution=(1 / metadata['X_microns_per_pixel'], 1 / metadata['Y_microns_per_pixel']) if metadata else None,
-                    metadata=saved_metadata, 
-                    extratags=imagej_tags
-                )
+    if imagej_tags:
+        checkImageJTagsByteorder(imagej_tags, byteorder)
+    return {'byteorder': byteorder,
+            'imagej': True,
+            'resolution': (1 / metadata['X_microns_per_pixel'], 1 / metadata['Y_microns_per_pixel']) if metadata else None,
+            'metadata': saved_metadata,
+            'extratags': imagej_tags}
+
+def createImageJHyperstackFile(image_output_name: str,
+                               shape: tuple,
+                               dtype,
+                               axes: str,
+                               metadata: dict,
+                               imagej_tags: list = None,
+                               byteorder: str = NATIVE_BYTEORDER
+                               ) -> np.memmap:
+    """
+    Create an ImageJ hyperstack TIFF file with its full, uncompressed page layout and return its image data
+    memory-mapped, so planes can be written straight to their final place in the file.
+    
+    The file has the same metadata and LUT extratags as saveImageJHyperstack writes. Other threads or processes
+    can write into the same file with tifffile.memmap(image_output_name), each filling its own frames.
+    
+    Parameters
+    image_output_name : str
+        The name of the output TIFF file.
+    shape : tuple
+        Shape of the hyperstack, matching axes.
+    dtype : np.dtype
+        Data type of the hyperstack.
+    axes : str
+        The axes of the hyperstack (e.g., 'TCYX').
+    metadata : dict
+        Metadata to be included in the TIFF file.
+    imagej_tags : list, optional
+        Additional ImageJ metadata tags to be included in the TIFF file, created with the same byteorder.
+    byteorder : str, optional
+        Byte order of the file, '<' or '>'. With the non-native order the planes are byteswapped as they are copied in.
     
+    Returns
+    np.memmap
+        The image data of the new file, zero-filled.
+    """
+    return tifffile.memmap(image_output_name,
+                           shape=tuple(shape),
+                           dtype=dtype,
+                           **getImageJWriteOptions(axes, metadata, imagej_tags, byteorder))
+
+def writePlanesInParallel(hyperstack: np.array,
+                          output_hyperstack: np.array,
+                          write_workers: int
+                          ) -> None:
+    """
+    Copy a hyperstack into an array of the same shape (e.g. a memory-mapped output file) with several threads,
+    each writing its own contiguous run of planes.
+    
+    Parameters
+    hyperstack : np.array
+        The hyperstack to copy, in memory or disk-backed.
+    output_hyperstack : np.array
+        The destination array.
+    write_workers : int
+        Number of writer threads.
+    """
+    # Index planes by position rather than reshaping, so transposed hyperstacks are not copied
+    leading_shape = hyperstack.shape[:-2]
+    num_planes = int(np.prod(leading_shape))
+    bounds = np.linspace(0, num_planes, min(write_workers, num_planes) + 1).astype(int)
+    
+    def writePlanes(start, stop):
+        for index in range(start, stop):
+            position = np.unravel_index(index, leading_shape)
+            output_hyperstack[position] = hyperstack[position]
+    
+    with ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix='writer') as executor:
+        # result() re-raises any error from the writer threads
+        for future in [executor.submit(writePlanes, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]:
+            future.result()
+    
+
+def checkImageJTagsByteorder(imagej_tags: tuple, byteorder: str) -> None:
+    """
+    Raise a ValueError if ImageJ metadata tags from createImageJMetadataTags were made for a different byte order
+    than the file they are about to be written to, which would make ImageJ misread the LUTs.
+    """
+    for code, _, _, value, _ in imagej_tags:
+        if code == 50839 and value[:4] in (b'IJIJ', b'JIJI'):
+            tags_byteorder = '>' if value[:4] == b'IJIJ' else '<'
+            if tags_byteorder != byteorder:
+                raise ValueError(f"ImageJ metadata tags were created for byteorder '{tags_byteorder}' "
+                                 f"but the file is written with byteorder '{byteorder}'")
 
 def createImageJMetadataTags(LUTs: dict, 
-                             byteorder: str = '>'
+                             byteorder: str = NATIVE_BYTEORDER
                              ) -> tuple:
     """
     Return IJMetadata and IJMetadataByteCounts tags from metadata dict.
 
-    The tags can be passed to the TiffWriter.save function as extratags.
+    The tags can be passed to the TiffWriter.save function as extratags. The tags are binary data in
+    the given byte order, which must be the byte order of the file they are written to.
     """
     header = [{'>': b'IJIJ', '<': b'JIJI'}[byteorder]]
     bytecounts = [0]
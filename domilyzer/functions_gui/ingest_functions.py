@@ -0,0 +1,257 @@
+import tifffile
+import numpy as np
+from domilyzer.functions_gui.selection_functions import checkSelection, selectIndices
+from domilyzer.functions_gui.transform_functions import UserTransforms
+
+INGEST_BINNINGS = ('sum', 'mean', 'max')
+CROP_UNITS = ('pixels', 'microns')
+
+def binImage(image: np.ndarray, factor: int, binning: str = 'mean') -> np.ndarray:
+    """
+    Downsample the last two (Y, X) axes of an image by combining factor x factor blocks of pixels.
+    Rows and columns left over at the bottom and right edges are dropped.
+
+    Parameters:
+    image (np.ndarray): The plane or stack to downsample.
+    factor (int): Binning factor, 1 returns the image unchanged.
+    binning (str): 'sum' (saturating at the maximum of integer dtypes, like ImageJ's Bin), 'mean' (rounded to
+        the nearest integer for integer data) or 'max' of each block.
+
+    Returns:
+    np.ndarray: The downsampled image, with the same dtype.
+    """
+    if binning not in INGEST_BINNINGS:
+        raise ValueError(f"Invalid binning '{binning}'. Choose one of {INGEST_BINNINGS}.")
+    if factor == 1:
+        return image
+    rows, columns = image.shape[-2] // factor, image.shape[-1] // factor
+    blocks = image[..., :rows * factor, :columns * factor].reshape(*image.shape[:-2], rows, factor, columns, factor)
+    if binning == 'max':
+        return blocks.max(axis=(-3, -1))
+    if not np.issubdtype(image.dtype, np.integer):
+        return (blocks.sum(axis=(-3, -1)) if binning == 'sum' else blocks.mean(axis=(-3, -1))).astype(image.dtype)
+
+    # Integer sums, no float copy of the image
+    block_sums = blocks.sum(axis=(-3, -1), dtype=np.int64)
+    if binning == 'sum':
+        return np.minimum(block_sums, np.iinfo(image.dtype).max).astype(image.dtype)
+    block_size = factor * factor
+    return ((block_sums + block_size // 2) // block_size).astype(image.dtype)
+
+def getPixelCrop(crop: tuple, crop_unit: str = 'pixels', metadata: dict = None) -> tuple:
+    """
+    Convert a crop rectangle to whole pixels.
+
+    Parameters:
+    crop (tuple): (x, y, width, height) of the rectangle, like an ImageJ rectangle ROI.
+    crop_unit (str): 'pixels', or 'microns' to convert with the pixel size in metadata.
+    metadata (dict): Metadata with X_microns_per_pixel and Y_microns_per_pixel, needed for 'microns'.
+
+    Returns:
+    tuple: (x, y, width, height) in pixels.
+    """
+    if crop_unit not in CROP_UNITS:
+        raise ValueError(f"Invalid crop unit '{crop_unit}'. Choose one of {CROP_UNITS}.")
+    x, y, width, height = crop
+    if crop_unit == 'microns':
+        if not metadata or not metadata.get('X_microns_per_pixel') or not metadata.get('Y_microns_per_pixel'):
+            raise ValueError("A crop in microns needs the pixel size from the metadata.")
+        x_size, y_size = metadata['X_microns_per_pixel'], metadata['Y_microns_per_pixel']
+        # Round both edges to the nearest pixel boundary
+        x_start, x_stop = round(x / x_size), round((x + width) / x_size)
+        y_start, y_stop = round(y / y_size), round((y + height) / y_size)
+        return x_start, y_start, x_stop - x_start, y_stop - y_start
+
+    return tuple(int(value) for value in crop)
+
+class IngestTransform:
+    """
+    Select pages, crop and bin each image right after it is read, so the rest of the pipeline only ever holds
+    the smaller images.
+
+    Uncompressed TIFF pages are read through a memory map of the file, so only the selected pages and the rows
+    inside the crop are read from disk. Compressed files are decoded page by page, only the selected pages.
+
+    Parameters:
+    crop (tuple): (x, y, width, height) of the region to keep, in pixels of the raw files. None keeps the whole plane.
+    binning (int): Binning factor applied after the crop. 1 for no binning.
+    binning_mode (str): 'sum', 'mean' or 'max', see binImage.
+    pages (slice): Pages to keep of multi-page files, i.e. the first axis of (pages, Y, X) stacks, such as the
+        Z planes of a Bruker or Flamingo stack. Single-page files are kept whole. None keeps every page.
+    user_transforms (UserTransforms): If given, applied to the cropped planes before they are binned.
+    """
+    def __init__(self,
+                 crop: tuple = None,
+                 binning: int = 1,
+                 binning_mode: str = 'mean',
+                 pages: slice = None,
+                 user_transforms: UserTransforms = None):
+        if binning_mode not in INGEST_BINNINGS:
+            raise ValueError(f"Invalid binning '{binning_mode}'. Choose one of {INGEST_BINNINGS}.")
+        if int(binning) < 1:
+            raise ValueError(f"Invalid binning factor {binning}, it must be at least 1.")
+        if crop is not None and (crop[0] < 0 or crop[1] < 0 or crop[2] <= 0 or crop[3] <= 0):
+            raise ValueError(f"Invalid crop {crop}, expected (x, y, width, height) with a positive width and height.")
+        self.crop = tuple(int(value) for value in crop) if crop is not None else None
+        self.binning = int(binning)
+        self.binning_mode = binning_mode
+        self.pages = checkSelection(pages)
+        self.user_transforms = user_transforms
+
+    def getRegion(self, plane_shape: tuple) -> tuple:
+        """
+        Return the row and column slices of the crop, clipped to a (Y, X) plane shape.
+        """
+        if self.crop is None:
+            return slice(0, plane_shape[0]), slice(0, plane_shape[1])
+        x, y, width, height = self.crop
+        rows, columns = slice(y, min(y + height, plane_shape[0])), slice(x, min(x + width, plane_shape[1]))
+        if rows.start >= rows.stop or columns.start >= columns.stop:
+            raise ValueError(f"Crop {self.crop} is outside the {plane_shape[1]} x {plane_shape[0]} pixel images.")
+
+        return rows, columns
+
+    def getOutputShape(self, shape: tuple) -> tuple:
+        """
+        Return the shape of an image of the given shape once its pages are selected and it is cropped and binned.
+        """
+        rows, columns = self.getRegion(shape[-2:])
+        leading_shape = tuple(shape[:-2])
+        if self.pages is not None and leading_shape:
+            leading_shape = (len(selectIndices(leading_shape[0], self.pages)), *leading_shape[1:])
+        return (*leading_shape,
+                (rows.stop - rows.start) // self.binning,
+                (columns.stop - columns.start) // self.binning)
+
+    def apply(self, image: np.ndarray) -> np.ndarray:
+        """
+        Select the pages of an image already in memory, and crop and bin its last two (Y, X) axes.
+        """
+        if self.pages is not None and image.ndim > 2:
+            image = image[self.pages]
+
+        return self.cropAndBin(image)
+
+    def cropAndBin(self, image: np.ndarray) -> np.ndarray:
+        """
+        Crop and bin the last two (Y, X) axes of an image, keeping all of its pages.
+        """
+        rows, columns = self.getRegion(image.shape[-2:])
+        image = image[..., rows, columns]
+        if self.user_transforms is not None:
+            image = self.user_transforms.apply(image, rows, columns)
+        image = binImage(image, self.binning, self.binning_mode)
+        # A view of the full image is copied, so the full image can be released
+        return image.copy() if image.base is not None else image
+
+    def read(self, file_path: str, **tifffile_kwargs) -> np.ndarray:
+        """
+        Read the cropped and binned image of a TIFF file, with the same leading axes as tifffile.imread.
+
+        Parameters:
+        file_path (str): Path to the TIFF file.
+        **tifffile_kwargs: Additional keyword arguments passed to tifffile.TiffFile (e.g. is_ome=False).
+
+        Returns:
+        np.ndarray: The cropped and binned image.
+        """
+        with tifffile.TiffFile(file_path, **tifffile_kwargs) as tif:
+            series = tif.series[0]
+            pages = list(series.pages)
+            keyframe = series.keyframe
+            leading_shape = tuple(series.shape[:-2])
+            if len(keyframe.shape) != 2 or len(pages) != int(np.prod(leading_shape)) or any(page is None for page in pages):
+                return self.apply(series.asarray())
+            if self.pages is not None and len(leading_shape) == 1:
+                # Pages outside the selection are never read
+                pages = pages[self.pages]
+                if not pages:
+                    raise ValueError(f"Page selection {self.pages} keeps none of the {leading_shape[0]} pages of {file_path}.")
+                leading_shape = (len(pages),)
+            elif self.pages is not None and leading_shape:
+                return self.apply(series.asarray())
+            if not all(page.is_memmappable for page in pages):
+                image = np.stack([page.asarray() for page in pages])
+                return self.cropAndBin(image.reshape(*leading_shape, *keyframe.shape))
+
+            rows, columns = self.getRegion(keyframe.shape)
+            file_map = np.memmap(file_path, dtype=np.uint8, mode='r')
+            file_dtype = keyframe.dtype.newbyteorder(tif.byteorder)
+            region = np.empty((len(pages), rows.stop - rows.start, columns.stop - columns.start), dtype=keyframe.dtype)
+            for index, page in enumerate(pages):
+                # A view of the page in the mapped file, only the cropped rows are read from disk
+                plane = np.ndarray(keyframe.shape, dtype=file_dtype, buffer=file_map, offset=page.dataoffsets[0])
+                region[index] = plane[rows, columns]
+            del file_map
+
+        region = region.reshape(*leading_shape, *region.shape[-2:])
+        if self.user_transforms is not None:
+            region = self.user_transforms.apply(region, rows, columns)
+        return binImage(region, self.binning, self.binning_mode)
+
+    def updateMetadata(self, metadata: dict) -> dict:
+        """
+        Return a copy of the metadata with the pixel size scaled by the binning factor, so the resolution written
+        by saveImageJHyperstack matches the binned images. None is returned unchanged.
+        """
+        if metadata is None:
+            return None
+        metadata = dict(metadata)
+        for key in ('X_microns_per_pixel', 'Y_microns_per_pixel'):
+            if metadata.get(key):
+                metadata[key] = metadata[key] * self.binning
+
+        return metadata
+
+def createIngestTransform(crop: tuple = None,
+                          crop_unit: str = 'pixels',
+                          binning: int = 1,
+                          binning_mode: str = 'mean',
+                          metadata: dict = None,
+                          pages: slice = None,
+                          user_transforms: UserTransforms = None
+                          ) -> IngestTransform:
+    """
+    Create the IngestTransform of a folder, converting a crop in microns with the folder's pixel size.
+
+    Parameters:
+    crop (tuple): (x, y, width, height) of the region to keep, or None to keep the whole plane.
+    crop_unit (str): 'pixels' or 'microns'.
+    binning (int): Binning factor, 1 for no binning.
+    binning_mode (str): 'sum', 'mean' or 'max'.
+    metadata (dict): Metadata with the pixel size, needed for a crop in microns.
+    pages (slice): Pages to keep of multi-page files, None keeps every page.
+    user_transforms (UserTransforms): Corrections applied to every plane as it is read.
+
+    Returns:
+    IngestTransform: The transform, or None if there is nothing to select, crop, correct or bin.
+    """
+    if crop is None and int(binning) == 1 and pages is None and not user_transforms:
+        return None
+    pixel_crop = getPixelCrop(crop, crop_unit, metadata) if crop is not None else None
+
+    return IngestTransform(crop=pixel_crop, binning=binning, binning_mode=binning_mode, pages=pages,
+                           user_transforms=user_transforms or None)
+
+def readTiffHeader(file_path: str) -> tuple:
+    """
+    Read the number of pages, the page shape and the dtype of a TIFF file from its IFDs, without reading pixels.
+
+    Parameters:
+    file_path (str): Path to the TIFF file.
+
+    Returns:
+    tuple: The number of pages, the (Y, X) shape of the first page and its numpy dtype.
+    """
+    with tifffile.TiffFile(file_path, is_ome=False) as tif:
+        first_page = tif.pages[0]
+        return len(tif.pages), tuple(first_page.shape), np.dtype(first_page.dtype)
+
+def readTiffImage(file_path: str, ingest_transform: IngestTransform = None, **tifffile_kwargs) -> np.ndarray:
+    """
+    Read a TIFF file with tifffile.imread, or through the ingest transform if one is given.
+    """
+    if ingest_transform is None:
+        return tifffile.imread(file_path, **tifffile_kwargs)
+
+    return ingest_transform.read(file_path, **tifffile_kwargs)
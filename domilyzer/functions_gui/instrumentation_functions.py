@@ -0,0 +1,270 @@
+import os
+import sys
+import csv
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from domilyzer.functions_gui.tracing_functions import PipelineTracer, traceSpan
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Order the pipeline stages are reported in
+STAGE_ORDER = ['staging', 'metadata', 'listing', 'read', 'read_project', 'projection', 'write']
+
+# Memory fields recorded per stage when memory tracking is on, and how repeated calls are combined
+MEMORY_FIELDS = {'peak_traced_bytes': max, 'stage_peak_bytes': max, 'peak_rss_bytes': max, 'rss_growth_bytes': lambda a, b: a + b}
+
+def getPeakRSS() -> int:
+    """
+    Return the peak resident set size of this process in bytes, or 0 where it is not available.
+    """
+    if resource is None:
+        return 0
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+class StageTimer:
+    """
+    Record wall time and bytes in/out of each pipeline stage, per folder.
+
+    Repeated calls for the same folder and stage (e.g. one read per file) are summed into a single record.
+    A disabled timer hands out the same counters but records nothing.
+
+    With track_memory, each stage also records:
+    peak_traced_bytes: high-water mark of Python and NumPy allocations (tracemalloc) while the stage ran.
+    stage_peak_bytes: that high-water mark minus the memory already allocated when the stage started,
+        i.e. the largest working copy the stage made.
+    peak_rss_bytes: peak resident set size of the process when the stage ended.
+    rss_growth_bytes: how much the stage raised the process peak RSS.
+    tracemalloc traces the whole process, so when folders run in parallel a peak is attributed to every
+    stage running at the time.
+
+    Parameters:
+    enabled (bool): Whether to record anything.
+    track_memory (bool): Whether to record memory high-water marks. Slows allocation-heavy code down.
+    tracer (PipelineTracer): If given, every stage is also recorded as a span on the trace timeline.
+    """
+    def __init__(self, enabled: bool = True, track_memory: bool = False, tracer: PipelineTracer = None):
+        self.enabled = enabled
+        self.track_memory = enabled and track_memory
+        self.tracer = tracer if enabled else None
+        self.folder_stages = {}
+        self._lock = threading.Lock()
+        self._active_memory = []
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def trace(self, name: str, category: str, args: dict = None):
+        """
+        Return a trace span for activity that is not a stage (e.g. a whole folder), or a no-op without a tracer.
+        """
+        return traceSpan(self.tracer, name, category, args)
+
+    def stopMemoryTracking(self) -> None:
+        """
+        Stop tracemalloc once the run is over.
+        """
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _foldTracedPeak(self) -> int:
+        """
+        Attribute the tracemalloc peak since the last call to every running stage and start a new
+        peak window. Returns the currently traced bytes. Must be called with the lock held.
+        """
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        for memory in self._active_memory:
+            memory['peak_traced_bytes'] = max(memory['peak_traced_bytes'], peak_bytes)
+        # reset_peak is Python 3.9+, older versions keep the peak since tracing started
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        return current_bytes
+
+    @contextmanager
+    def stage(self, folder_name: str, stage_name: str, bytes_in: int = 0):
+        """
+        Time a block of code as one call of a stage. The yielded counters dict can be updated inside the
+        block with 'bytes_in' and 'bytes_out' once they are known.
+
+        Parameters:
+        folder_name (str): Name of the folder being processed.
+        stage_name (str): Name of the stage (e.g. 'read', 'projection', 'write').
+        bytes_in (int): Bytes consumed by the stage, if known up front.
+        """
+        counters = {'bytes_in': bytes_in, 'bytes_out': 0}
+        memory = None
+        if self.track_memory:
+            with self._lock:
+                memory = {'start_traced_bytes': self._foldTracedPeak(), 'peak_traced_bytes': 0, 'start_rss_bytes': getPeakRSS()}
+                self._active_memory.append(memory)
+        start_time = time.perf_counter()
+        try:
+            with traceSpan(self.tracer, stage_name, 'stage', {'folder': folder_name}):
+                yield counters
+        finally:
+            seconds = time.perf_counter() - start_time
+            memory_record = None
+            if memory is not None:
+                with self._lock:
+                    self._foldTracedPeak()
+                    self._active_memory.remove(memory)
+                peak_rss_bytes = getPeakRSS()
+                memory_record = {'peak_traced_bytes': memory['peak_traced_bytes'],
+                                 'stage_peak_bytes': max(memory['peak_traced_bytes'] - memory['start_traced_bytes'], 0),
+                                 'peak_rss_bytes': peak_rss_bytes,
+                                 'rss_growth_bytes': peak_rss_bytes - memory['start_rss_bytes']}
+            if self.enabled:
+                self.addStage(folder_name, stage_name, seconds, counters['bytes_in'], counters['bytes_out'], memory_record)
+
+    def addStage(self,
+                 folder_name: str,
+                 stage_name: str,
+                 seconds: float,
+                 bytes_in: int = 0,
+                 bytes_out: int = 0,
+                 memory_record: dict = None
+                 ) -> None:
+        """
+        Add one timed call of a stage to the folder's record.
+        """
+        with self._lock:
+            record = self.folder_stages.setdefault((folder_name, stage_name), {'calls': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['bytes_in'] += bytes_in
+            record['bytes_out'] += bytes_out
+            if memory_record is not None:
+                for field, combine in MEMORY_FIELDS.items():
+                    record[field] = combine(record[field], memory_record[field]) if field in record else memory_record[field]
+
+    def getRecords(self) -> list:
+        """
+        Return one dict per folder and stage, with calls, seconds, bytes in/out and MB/s.
+        MB/s is computed from the larger of bytes in and bytes out.
+        """
+        records = []
+        with self._lock:
+            for (folder_name, stage_name), record in self.folder_stages.items():
+                stage_bytes = max(record['bytes_in'], record['bytes_out'])
+                records.append({'folder': folder_name,
+                                'stage': stage_name,
+                                'calls': record['calls'],
+                                'seconds': round(record['seconds'], 6),
+                                'bytes_in': record['bytes_in'],
+                                'bytes_out': record['bytes_out'],
+                                'mb_per_second': round(stage_bytes / 1024 ** 2 / record['seconds'], 3) if record['seconds'] > 0 else None,
+                                **{field: record[field] for field in MEMORY_FIELDS if field in record}})
+
+        return records
+
+    def getStageTotals(self) -> dict:
+        """
+        Return the records summed over all folders, keyed by stage name in pipeline order.
+        """
+        totals = {}
+        for record in self.getRecords():
+            total = totals.setdefault(record['stage'], {'calls': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0})
+            for key in ['calls', 'seconds', 'bytes_in', 'bytes_out']:
+                total[key] += record[key]
+        return dict(sorted(totals.items(), key=lambda item: STAGE_ORDER.index(item[0]) if item[0] in STAGE_ORDER else len(STAGE_ORDER)))
+
+    def formatSummaryTable(self) -> str:
+        """
+        Return a table of the stage totals over all folders, with each stage's share of the total time.
+        """
+        totals = self.getStageTotals()
+        total_seconds = sum(total['seconds'] for total in totals.values())
+        lines = [f"{'Stage':<14} {'Calls':>8} {'Seconds':>10} {'Share':>7} {'MB in':>10} {'MB out':>10} {'MB/s':>9}"]
+        for stage_name, total in totals.items():
+            stage_mb = max(total['bytes_in'], total['bytes_out']) / 1024 ** 2
+            mb_per_second = f"{stage_mb / total['seconds']:>9.1f}" if total['seconds'] > 0 else f"{'-':>9}"
+            share = total['seconds'] / total_seconds * 100 if total_seconds > 0 else 0
+            lines.append(f"{stage_name:<14} {total['calls']:>8} {total['seconds']:>10.3f} {share:>6.1f}% "
+                         f"{total['bytes_in'] / 1024 ** 2:>10.1f} {total['bytes_out'] / 1024 ** 2:>10.1f} {mb_per_second}")
+
+        return '\n'.join(lines)
+
+    def getFolderMemory(self) -> dict:
+        """
+        Return the memory high-water marks of each folder, the stage that reached the largest working copy,
+        and the ratio of peak traced memory to output bytes. Output bytes are the bytes written, or the
+        bytes of the final array when nothing was written.
+
+        Returns:
+        dict: A dictionary keyed by folder name. Empty unless memory tracking is on.
+        """
+        folder_memory = {}
+        for record in self.getRecords():
+            if 'peak_traced_bytes' not in record:
+                continue
+            memory = folder_memory.setdefault(record['folder'], {'peak_traced_bytes': 0, 'peak_rss_bytes': 0, 'largest_stage': None,
+                                                                 'stage_peak_bytes': -1, 'output_bytes': 0, 'stage_outputs': {}})
+            memory['peak_traced_bytes'] = max(memory['peak_traced_bytes'], record['peak_traced_bytes'])
+            memory['peak_rss_bytes'] = max(memory['peak_rss_bytes'], record['peak_rss_bytes'])
+            if record['stage_peak_bytes'] > memory['stage_peak_bytes']:
+                memory['largest_stage'], memory['stage_peak_bytes'] = record['stage'], record['stage_peak_bytes']
+            memory['stage_outputs'][record['stage']] = record['bytes_out']
+
+        for memory in folder_memory.values():
+            stage_outputs = memory.pop('stage_outputs')
+            for stage_name in ['write', 'projection']:
+                if stage_outputs.get(stage_name):
+                    memory['output_bytes'] = stage_outputs[stage_name]
+                    break
+            memory['peak_to_output_ratio'] = round(memory['peak_traced_bytes'] / memory['output_bytes'], 2) if memory['output_bytes'] else None
+
+        return folder_memory
+
+    def formatMemoryTable(self) -> str:
+        """
+        Return a table of the memory high-water marks of each folder.
+        """
+        lines = [f"{'Folder':<30} {'Peak MB':>10} {'Peak RSS MB':>12} {'Output MB':>10} {'Peak/Output':>12}  Largest copy"]
+        for folder_name, memory in self.getFolderMemory().items():
+            ratio = f"{memory['peak_to_output_ratio']:>12.2f}" if memory['peak_to_output_ratio'] is not None else f"{'-':>12}"
+            lines.append(f"{folder_name:<30} {memory['peak_traced_bytes'] / 1024 ** 2:>10.1f} {memory['peak_rss_bytes'] / 1024 ** 2:>12.1f} "
+                         f"{memory['output_bytes'] / 1024 ** 2:>10.1f} {ratio}  {memory['largest_stage']} ({memory['stage_peak_bytes'] / 1024 ** 2:.1f} MB)")
+
+        return '\n'.join(lines)
+
+    def writeReport(self, output_directory: str, report_name: str = '!conversion_timings') -> tuple:
+        """
+        Write the per-folder, per-stage records as JSON and CSV files.
+
+        Parameters:
+        output_directory (str): Directory to write the reports to, usually next to the conversion log.
+        report_name (str): File name of the reports, without extension.
+
+        Returns:
+        tuple: The paths of the JSON and CSV reports.
+        """
+        records = self.getRecords()
+        json_path = os.path.join(output_directory, f'{report_name}.json')
+        with open(json_path, 'w') as file:
+            report = {'folders': records, 'stage_totals': self.getStageTotals()}
+            if self.track_memory:
+                report['folder_memory'] = self.getFolderMemory()
+            json.dump(report, file, indent=1)
+
+        csv_path = os.path.join(output_directory, f'{report_name}.csv')
+        fieldnames = ['folder', 'stage', 'calls', 'seconds', 'bytes_in', 'bytes_out', 'mb_per_second']
+        if self.track_memory:
+            fieldnames += list(MEMORY_FIELDS)
+        with open(csv_path, 'w', newline='') as file:
+            csv_writer = csv.DictWriter(file, fieldnames=fieldnames)
+            csv_writer.writeheader()
+            csv_writer.writerows(records)
+
+        return json_path, csv_path
+
+def getStageTimer(stage_timer: StageTimer = None) -> StageTimer:
+    """
+    Return the given stage timer, or a disabled one so callers can time stages unconditionally.
+    """
+    return stage_timer if stage_timer is not None else StageTimer(enabled=False)
@@ -0,0 +1,159 @@
+import numpy as np
+from domilyzer.functions_gui.reduction_functions import reduceAxis
+
+try:
+    import numba
+except ImportError:  # Optional, the NumPy kernels give the same results
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+KERNEL_PROJECTIONS = ('max', 'avg')
+
+if NUMBA_AVAILABLE:
+    # Compiled on first use and cached next to this file. Each kernel makes one pass over its input, the parallel
+    # loops run over output rows so the threads never write the same pixel.
+
+    @numba.njit(parallel=True, cache=True)
+    def _projectMaxKernel(stack, output):
+        num_planes, rows, columns = stack.shape
+        for row in numba.prange(rows):
+            maximum = stack[0, row].copy()
+            for plane in range(1, num_planes):
+                for column in range(columns):
+                    value = stack[plane, row, column]
+                    # NaN propagates like np.max
+                    if value > maximum[column] or value != value:
+                        maximum[column] = value
+            for column in range(columns):
+                output[row, column] = maximum[column]
+
+    @numba.njit(parallel=True, cache=True)
+    def _projectMeanKernel(stack, output, round_values):
+        num_planes, rows, columns = stack.shape
+        for row in numba.prange(rows):
+            # Summed plane by plane in float64, in the same order as np.mean
+            total = stack[0, row].astype(np.float64)
+            for plane in range(1, num_planes):
+                for column in range(columns):
+                    total[column] += stack[plane, row, column]
+            for column in range(columns):
+                mean = total[column] / num_planes
+                output[row, column] = np.rint(mean) if round_values else mean
+
+    @numba.njit(parallel=True, cache=True)
+    def _maxRotateKernel(plane, output, initialize):
+        rows, columns = plane.shape
+        for index in numba.prange(columns):
+            # Row index of the output is column (columns - 1 - index) of the input, like np.rot90
+            column = columns - 1 - index
+            for row in range(rows):
+                value = plane[row, column]
+                if initialize or value > output[index, row] or value != value:
+                    output[index, row] = value
+
+    @numba.njit(parallel=True, cache=True)
+    def _maxRotateStackKernel(stack, output, initialize):
+        num_planes, rows, columns = stack.shape
+        for index in numba.prange(rows):
+            # np.rot90 over the first two axes: output[index, plane] is row (rows - 1 - index) of the plane
+            row = rows - 1 - index
+            for plane in range(num_planes):
+                for column in range(columns):
+                    value = stack[plane, row, column]
+                    if initialize or value > output[index, plane, column] or value != value:
+                        output[index, plane, column] = value
+
+def useNumba(use_numba: bool = False) -> bool:
+    """
+    Return whether to run the Numba kernels. They are only run when asked for, e.g. with ConversionOptions.use_numba,
+    since their first call compiles them and installing Numba should not change which code runs.
+    """
+    if use_numba and not NUMBA_AVAILABLE:
+        raise ImportError("use_numba=True needs the numba package, install it or leave use_numba off.")
+
+    return bool(use_numba)
+
+def projectStackInto(stack: np.ndarray,
+                     output: np.ndarray,
+                     projection_type: str = 'max',
+                     reduce_workers: int = 0,
+                     use_numba: bool = False
+                     ) -> np.ndarray:
+    """
+    Z-project a stack straight into an output plane, converting to the output's dtype in the same pass.
+
+    Gives the same values as np.max(stack, axis=0), or np.mean(stack, axis=0) rounded to the nearest integer (half to
+    even, like np.round) when the output has an integer dtype, e.g. the uint16 planes of a Bruker average projection.
+
+    Parameters:
+    stack (np.ndarray): The (Z, Y, X) stack, or a single (Y, X) plane.
+    output (np.ndarray): The (Y, X) plane to write, e.g. one plane of a preallocated hyperstack.
+    projection_type (str): 'max' or 'avg'.
+    reduce_workers (int): Number of threads of the NumPy kernel, see reduceAxis. The Numba kernel uses Numba's threads.
+    use_numba (bool): Run the compiled kernel instead of the NumPy one, see useNumba. Averages of float stacks always
+        use NumPy, which sums them in their own precision.
+
+    Returns:
+    np.ndarray: The output plane.
+    """
+    if projection_type not in KERNEL_PROJECTIONS:
+        raise ValueError(f"Invalid projection type '{projection_type}'. Choose one of {KERNEL_PROJECTIONS}.")
+    stack = np.asarray(stack)
+    if stack.ndim == 2:
+        stack = stack[np.newaxis]
+    round_values = np.issubdtype(output.dtype, np.integer)
+
+    if useNumba(use_numba) and (projection_type == 'max' or not np.issubdtype(stack.dtype, np.inexact)):
+        # np.asarray, Numba does not take np.memmap
+        if projection_type == 'max':
+            _projectMaxKernel(stack, np.asarray(output))
+        else:
+            _projectMeanKernel(stack, np.asarray(output), round_values)
+        return output
+
+    if projection_type == 'max':
+        output[...] = reduceAxis(stack, 0, 'max', workers=reduce_workers)
+    else:
+        mean = reduceAxis(stack, 0, 'mean', workers=reduce_workers)
+        output[...] = np.round(mean) if round_values else mean
+
+    return output
+
+def fuseSidesInto(side_images: list, output: np.ndarray, use_numba: bool = False) -> np.ndarray:
+    """
+    Combine the illumination sides of a Flamingo channel by their maximum and rotate the result 90 degrees
+    counterclockwise over its first two axes, straight into the output, in one pass per side.
+
+    Gives the same values as np.rot90(np.max(side_images, axis=0)) without the stacked sides or the combined image.
+
+    Parameters:
+    side_images (list): The (Y, X) planes or (Z, Y, X) stacks of each illumination side, all of the same shape.
+    output (np.ndarray): Where to write the result, of the rotated shape, (X, Y) or (Y, Z, X). Any view works, e.g. a
+        channel of a preallocated frame. Same dtype as the images, other dtypes are cast.
+    use_numba (bool): Run the compiled kernels instead of the NumPy ones, see useNumba.
+
+    Returns:
+    np.ndarray: The output.
+    """
+    if not side_images:
+        raise ValueError("No illumination side images to fuse.")
+    compiled = useNumba(use_numba)
+    for index, image in enumerate(side_images):
+        image = np.asarray(image)
+        if image.ndim not in (2, 3):
+            raise ValueError(f"Expected (Y, X) planes or (Z, Y, X) stacks, got shape {image.shape}.")
+        rotated_shape = (image.shape[1], image.shape[0], *image.shape[2:])
+        if output.shape != rotated_shape:
+            raise ValueError(f"Output shape {output.shape} does not match the rotated shape {rotated_shape}.")
+
+        if compiled:
+            kernel = _maxRotateKernel if image.ndim == 2 else _maxRotateStackKernel
+            kernel(image, np.asarray(output), index == 0)
+            continue
+        # np.rot90 is a view, the rotation is applied as the values are read
+        if index == 0:
+            np.copyto(output, np.rot90(image), casting='unsafe')
+        else:
+            np.maximum(output, np.rot90(image), out=output, casting='unsafe')
+
+    return output
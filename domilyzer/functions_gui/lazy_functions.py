@@ -0,0 +1,230 @@
+import itertools
+import threading
+import collections
+import tifffile
+import numpy as np
+from domilyzer.functions_gui.ingest_functions import IngestTransform
+
+# Decoded pages kept by a LazyHyperstack, enough for a few full Z-stacks of 2048 x 2048 uint16 planes
+DEFAULT_PLANE_CACHE_BYTES = 512 * 1024 ** 2
+
+class LazyHyperstack:
+    """
+    A TZCYX hyperstack that reads its planes from the raw TIFF files only when they are indexed, so a notebook or
+    a writer can pull a few planes, a timepoint or a channel of a folder without loading all of it.
+
+    Indexing works like a NumPy array with integers, slices, lists of indices and Ellipsis, e.g. hs[t, :, c] for
+    the Z-stack of one channel at one timepoint, and returns an in-memory np.ndarray. Only the pages of the
+    selected planes are read, each file is opened once per indexing, and the decoded pages are kept in a
+    least-recently-used cache of at most cache_bytes.
+
+    Parameters:
+    plane_sources (dict): (t, z, c) plane indices mapped to the (file path, page index) of the TIFF pages of the
+        plane. Several pages are combined by their maximum, e.g. the illumination sides of a Flamingo plane.
+        Planes without sources are zeros, like the unfilled planes of a scratch array.
+    stack_shape (tuple): Number of (T, Z, C) planes.
+    ingest_transform (IngestTransform): If given, each page is cropped and binned right after it is read. Its page
+        selection is applied when building plane_sources, not here. With frame-level user transforms, all the pages
+        of a file in plane_sources are read and corrected together, so the transforms get the same (pages, Y, X)
+        stack as when the engine reads the whole file.
+    plane_function (callable): If given, applied to each combined plane, e.g. np.flipud to orient Flamingo planes.
+        It must keep the shape of the plane.
+    cache_bytes (int): Maximum bytes of decoded pages kept in the cache. 0 disables the cache.
+    **tifffile_kwargs: Additional keyword arguments passed to tifffile.TiffFile (e.g. is_ome=False).
+    """
+    axes = 'TZCYX'
+
+    def __init__(self,
+                 plane_sources: dict,
+                 stack_shape: tuple,
+                 ingest_transform: IngestTransform = None,
+                 plane_function=None,
+                 cache_bytes: int = DEFAULT_PLANE_CACHE_BYTES,
+                 **tifffile_kwargs):
+        if len(stack_shape) != 3:
+            raise ValueError(f"Expected the number of (T, Z, C) planes, got {stack_shape}.")
+        if not any(plane_sources.values()):
+            raise ValueError("No TIFF pages to build the hyperstack from.")
+        self.plane_sources = {tuple(index): list(sources) for index, sources in plane_sources.items()}
+        self.ingest_transform = ingest_transform
+        self.plane_function = plane_function
+        self.cache_bytes = int(cache_bytes)
+        self.tifffile_kwargs = tifffile_kwargs
+        self.pages_read = 0
+        self._cache = collections.OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        # The pages of each file, read as one stack when frame-level transforms need the whole file
+        self._file_pages = None
+        if ingest_transform is not None and ingest_transform.user_transforms is not None and ingest_transform.user_transforms.has_frame_transforms:
+            self._file_pages = collections.defaultdict(set)
+            for sources in self.plane_sources.values():
+                for file_path, page_index in sources:
+                    self._file_pages[file_path].add(page_index)
+
+        # Shape and dtype from the TIFF header of the first page, without reading pixels
+        first_path, first_page = next(sources for sources in self.plane_sources.values() if sources)[0]
+        with tifffile.TiffFile(first_path, **tifffile_kwargs) as tif:
+            plane_shape, self.dtype = tif.pages[first_page].shape, tif.pages[first_page].dtype
+        if ingest_transform is not None:
+            plane_shape = ingest_transform.getOutputShape(plane_shape)
+        self.shape = (*(int(size) for size in stack_shape), *plane_shape)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def nbytes(self) -> int:
+        return self.size * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __repr__(self) -> str:
+        return f"LazyHyperstack(shape={self.shape}, dtype={self.dtype}, axes='{self.axes}')"
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[...]
+        return array if dtype is None else array.astype(dtype, copy=False)
+
+    def __getitem__(self, key) -> np.ndarray:
+        key = key if isinstance(key, tuple) else (key,)
+        if any(index is None for index in key):
+            raise IndexError("New axes are not supported, index the returned array instead.")
+        if sum(index is Ellipsis for index in key) > 1:
+            raise IndexError("An index can only have a single ellipsis.")
+        if any(index is Ellipsis for index in key):
+            position = next(position for position, index in enumerate(key) if index is Ellipsis)
+            key = key[:position] + (slice(None),) * (self.ndim - len(key) + 1) + key[position + 1:]
+        if len(key) > self.ndim:
+            raise IndexError(f"Too many indices for a {self.ndim}-dimensional hyperstack.")
+        key = key + (slice(None),) * (self.ndim - len(key))
+
+        # T, Z and C select planes, Y and X are applied to each of them
+        plane_indices = [self._getIndices(index, size, axis) for index, size, axis in zip(key[:3], self.shape[:3], self.axes)]
+        plane_key = key[3:]
+        plane_shape = np.broadcast_to(np.zeros((), dtype=self.dtype), self.shape[3:])[plane_key].shape
+
+        # (position in the output, plane index) of every selected plane
+        planes = [tuple(zip(*plane)) for plane in itertools.product(*(list(enumerate(indices)) for indices in plane_indices))]
+        pages = self._getPages({source for _, plane in planes for source in self.plane_sources.get(plane, [])})
+        output = np.zeros((*(len(indices) for indices in plane_indices), *plane_shape), dtype=self.dtype)
+        for position, plane in planes:
+            sources = self.plane_sources.get(plane)
+            if sources:
+                output[position] = self.combinePages([pages[source] for source in sources])[plane_key]
+
+        # Integer indices drop their axis, like NumPy
+        return output[tuple(0 if isinstance(index, (int, np.integer)) else slice(None) for index in key[:3])]
+
+    def _getIndices(self, index, size: int, axis: str) -> list:
+        """
+        Return the plane indices of one T, Z or C index, an integer, a slice or a sequence of integers.
+        """
+        planes = range(size)
+        try:
+            if isinstance(index, (int, np.integer)):
+                return [planes[index]]
+            if isinstance(index, slice):
+                return list(planes[index])
+            return [planes[int(position)] for position in np.asarray(index).ravel()]
+        except IndexError:
+            raise IndexError(f"Index {index} is out of bounds for axis {axis} with size {size}.") from None
+
+    def readPages(self, sources: list) -> list:
+        """
+        Return the decoded pages of a list of (file path, page index) sources, cropped and binned but not combined or
+        passed through the plane function, e.g. the Z-stack of one illumination side to project it on its own.
+        """
+        pages = self._getPages(set(sources))
+        return [pages[source] for source in sources]
+
+    def combinePages(self, pages: list) -> np.ndarray:
+        """
+        Combine the decoded pages of one plane by their maximum and apply the plane function.
+        """
+        plane = pages[0] if len(pages) == 1 else np.max(pages, axis=0)
+        return self.plane_function(plane) if self.plane_function is not None else plane
+
+    def _getPages(self, sources: set) -> dict:
+        """
+        Return the decoded pages of a set of (file path, page index) sources, reading those not in the cache with
+        each file opened once.
+        """
+        pages = {}
+        files = collections.defaultdict(list)
+        with self._lock:
+            for source in sources:
+                if source in self._cache:
+                    self._cache.move_to_end(source)
+                    pages[source] = self._cache[source]
+                else:
+                    files[source[0]].append(source[1])
+
+        for file_path, page_indices in files.items():
+            with tifffile.TiffFile(file_path, **self.tifffile_kwargs) as tif:
+                if self._file_pages is not None:
+                    pages.update(self._readFilePages(tif, file_path))
+                    continue
+                for page_index in sorted(page_indices):
+                    page = tif.pages[page_index].asarray()
+                    if self.ingest_transform is not None:
+                        page = self.ingest_transform.cropAndBin(page)
+                    pages[(file_path, page_index)] = page
+                    self._cachePage((file_path, page_index), page)
+
+        return pages
+
+    def _readFilePages(self, tif: tifffile.TiffFile, file_path: str) -> dict:
+        """
+        Read all the pages of an open file in plane_sources as one stack, so frame-level transforms correct the same
+        image as when the file is read whole, and return them by (file path, page index) source.
+        """
+        page_indices = sorted(self._file_pages[file_path])
+        stack = np.stack([tif.pages[page_index].asarray() for page_index in page_indices])
+        # Single-page files are read as a (Y, X) plane
+        if len(tif.series[0].shape) == 2:
+            stack = stack[0]
+        stack = self.ingest_transform.cropAndBin(stack)
+        pages = {}
+        for page_index, page in zip(page_indices, stack.reshape(-1, *stack.shape[-2:])):
+            pages[(file_path, page_index)] = page
+            self._cachePage((file_path, page_index), page)
+
+        return pages
+
+    def _cachePage(self, source: tuple, page: np.ndarray):
+        """
+        Add a decoded page to the cache, evicting the least recently used pages beyond cache_bytes.
+        """
+        with self._lock:
+            self.pages_read += 1
+            if page.nbytes > self.cache_bytes or source in self._cache:
+                return
+            self._cache[source] = page
+            self._cached_bytes += page.nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, evicted_page = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted_page.nbytes
+
+    def clearCache(self):
+        """
+        Release all the decoded pages.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._cached_bytes = 0
+
+    def iteratePlanes(self):
+        """
+        Yield the (Y, X) planes in storage order (T, then Z, then C), one Z-stack of channels read at a time, so the
+        hyperstack can be written to a TIFF file incrementally, like iterateHyperstackPlanes.
+        """
+        for t in range(self.shape[0]):
+            for z in range(self.shape[1]):
+                yield from self[t, z]
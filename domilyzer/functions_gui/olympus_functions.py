@@ -1,62 +1,43 @@
 import os
 import re
+import warnings
 import numpy as np
-import tifffile
 from oiffile import OifFile
+from domilyzer.functions_gui.ingest_functions import IngestTransform
+from domilyzer.functions_gui.prefetch_functions import readTiffFiles
+from domilyzer.functions_gui.kernel_functions import projectStackInto
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack, DEFAULT_PLANE_CACHE_BYTES
 
-def generateChannelProjectionsOlympus(channel_filenames: dict, 
-                                      projection_type: str ='max'
-                                      ) -> tuple:
+def planStackGroupsOlympus(channel_filenames: dict,
+                           z_selection: slice = None,
+                           t_selection: slice = None
+                           ) -> list:
     """
-    Generate channel projections for Olympus images based on the provided filenames.
+    Group the files of each channel into stacks, one per frame, each sorted by Z number.
+    Files outside the Z and frame selections are left out of the plan, so they are never opened.
     
     Parameters:
-    channel_filenames (dict): Dictionary where keys are channel names and values are lists of file paths.
-    projection_type (str): Type of projection to apply ('max', 'avg', or 'raw').
+    channel_filenames (dict): Dictionary where keys are channel names and values are lists of file paths, sorted by T number.
+    z_selection (slice): Z planes to keep of each stack, by position in Z order. None keeps every plane.
+    t_selection (slice): Frames to keep of each channel, by position in T order. None keeps every frame.
     
     Returns:
-    dict: A dictionary where keys are channel names and values are lists of numpy arrays.
-    str: The type of image generated based on the projection.
-    """    
-    final_channel_image_arrays = {}
+    list: (channel name, matching files, image type) tuples, in channel and frame order.
+    """
+    stack_groups = []
     for channel_name, filenames in channel_filenames.items():
         # create a set to keep track of processed files to avoid duplicates
         # and to ensure we only process each file once
         processed_files = set()
+        channel_stack_groups = []
         # Find the highest Z number in the whole list of filenames
-        all_z_numbers = [
-            extractZNumber(f) for f in filenames if extractZNumber(f) != float('inf')
-        ]
-        z_planes_per_frame = max(all_z_numbers) if all_z_numbers else 0
+        z_planes_per_frame = getMaxZPlanes(filenames)
         for filename in filenames:
             if filename in processed_files:
                 continue  # Skip files we've already processed
-            # Extract identifiers
-            basename = os.path.basename(filename).replace('.tif',"")
-            frame_number = os.path.basename(filename).split('T')[1][:3] if 'T' in basename else None
-            z_plane_number = os.path.basename(filename).split('Z')[1][:3] if 'Z' in basename else None 
-            channel_number = os.path.basename(filename).split('C')[1][:3] if 'C' in basename else None
-            # Find the matching files based on whether identifiers are present
-            if frame_number and channel_number and z_plane_number:
-                matching_files = [
-                    f for f in filenames if f"T{frame_number}" in f and f"C{channel_number}" in f
-                ]
-                image_type = 'multiplane_multiframe' 
-            elif frame_number and channel_number and not z_plane_number:
-                matching_files = [
-                    f for f in filenames if f"T{frame_number}" in f and f"C{channel_number}" in f
-                ]
-                image_type = 'singleplane_multiframe'
-            elif not frame_number and channel_number and z_plane_number:
-                matching_files = [
-                    f for f in filenames if f"C{channel_number}" in f
-                ]
-                image_type = 'multiplane_singleframe'
-            elif not frame_number and channel_number and not z_plane_number:
-                matching_files = [
-                    f for f in filenames if f"C{channel_number}" in f
-                ]
-                image_type = 'singleplane_singleframe'
+            # Extract identifiers and find the matching files based on whether identifiers are present
+            frame_number, z_plane_number, channel_number = extractIdentifiers(filename)
+            matching_files, image_type = getMatchingFiles(filenames, frame_number, z_plane_number, channel_number)
                         
             # Mark files as processed
             processed_files.update(matching_files)
@@ -65,31 +46,125 @@ def generateChannelProjectionsOlympus(channel_filenames: dict,
             matching_files = sorted(matching_files, key=extractZNumber)
             if len(matching_files) != z_planes_per_frame and z_planes_per_frame != 0:
                 continue  # Skip if the number of matching files is not consistent
-            
-            # Read the images from the matching files
-            images = [tifffile.imread(file, is_ome=False) for file in matching_files]
-            # Stack the images along the Z axis
-            images = np.stack(images, axis=0)
-            # Perform the projection if requested
-            if 'single_plane' not in image_type:
-                if projection_type == 'max':
-                    images = np.max(images, axis=0)
-                    image_type = image_type + '_maxproject'
-                elif projection_type == 'avg':
-                    images = np.mean(images, axis=0)
-                    images = np.round(images).astype(np.uint16) 
-                    image_type = image_type + '_avgproject'
-                else:
-                    image_type = image_type + '_raw'
-            
-            # Check if the channel name already exists in the dictionary
-            # and append the images to the list
-            if channel_name not in final_channel_image_arrays:
-                final_channel_image_arrays[channel_name] = []
-            final_channel_image_arrays[channel_name].append(images)
+            if z_selection is not None:
+                matching_files = matching_files[z_selection]
+            channel_stack_groups.append((channel_name, matching_files, image_type))
+        
+        if t_selection is not None:
+            channel_stack_groups = channel_stack_groups[t_selection]
+        stack_groups.extend(channel_stack_groups)
+
+    return stack_groups
+
+def generateChannelProjectionsOlympus(channel_filenames: dict, 
+                                      projection_type: str ='max'
+                                      ) -> tuple:
+    """
+    Generate channel projections for Olympus images based on the provided filenames.
+    
+    Deprecated, convertFolder(folder_path, 'Olympus') reads and projects the stacks of planStackGroupsOlympus.
+    
+    Parameters:
+    channel_filenames (dict): Dictionary where keys are channel names and values are lists of file paths.
+    projection_type (str): Type of projection to apply ('max', 'avg', or 'raw').
+    
+    Returns:
+    dict: A dictionary where keys are channel names and values are lists of numpy arrays.
+    str: The type of image generated based on the projection.
+    """
+    warnings.warn("generateChannelProjectionsOlympus is deprecated, use convertFolder(folder_path, 'Olympus').",
+                  DeprecationWarning, stacklevel=2)
+    final_channel_image_arrays = {}
+    for channel_name, matching_files, image_type in planStackGroupsOlympus(channel_filenames):
+        # Read the images from the matching files and stack them along the Z axis
+        images = np.stack(list(readTiffFiles(matching_files, is_ome=False)), axis=0)
+        # Perform the projection if requested
+        if projection_type == 'max':
+            images = projectStackInto(images, np.empty(images.shape[1:], dtype=images.dtype), 'max')
+            image_type = image_type + '_maxproject'
+        elif projection_type == 'avg':
+            images = projectStackInto(images, np.empty(images.shape[1:], dtype=np.uint16), 'avg')
+            image_type = image_type + '_avgproject'
+        else:
+            image_type = image_type + '_raw'
+        
+        final_channel_image_arrays.setdefault(channel_name, []).append(images)
             
     return final_channel_image_arrays, image_type
 
+def stackChannelsGenHyperstackOlympus(channel_image_arrays: dict) -> np.ndarray:
+    """
+    Stack the channel images into a hyperstack format.
+    
+    Deprecated, convertFolder(folder_path, 'Olympus') keeps the frames every channel has, see countFramesOlympus.
+    
+    Parameters:
+    channel_image_arrays (dict): Dictionary where keys are channel names and values are lists of numpy arrays.
+    
+    Returns:
+    np.ndarray: A numpy array representing the stacked hyperstack.
+    """
+    warnings.warn("stackChannelsGenHyperstackOlympus is deprecated, use convertFolder(folder_path, 'Olympus').",
+                  DeprecationWarning, stacklevel=2)
+    # Ensure all channel image lists have the same length
+    num_frames = min(len(image_arrays) for image_arrays in channel_image_arrays.values())
+    
+    for channel_name, image_arrays in channel_image_arrays.items():
+        channel_image_arrays[channel_name] = image_arrays[:num_frames]
+        
+    return np.stack(list(channel_image_arrays.values()), axis=1)
+
+def createLazyHyperstackOlympus(channel_filenames: dict,
+                                ingest_transform: IngestTransform = None,
+                                z_selection: slice = None,
+                                t_selection: slice = None,
+                                cache_bytes: int = DEFAULT_PLANE_CACHE_BYTES
+                                ) -> tuple:
+    """
+    Index a folder as a LazyHyperstack, a TZCYX array with the stacks of planStackGroupsOlympus, reading each
+    plane from its file only when it is indexed.
+    
+    Parameters:
+    channel_filenames (dict): Dictionary where keys are channel names and values are lists of file paths, sorted by T number.
+    ingest_transform (IngestTransform): If given, each plane is cropped and binned when read.
+    z_selection (slice), t_selection (slice): Z planes and frames to keep, see planStackGroupsOlympus.
+    cache_bytes (int): Maximum bytes of decoded planes kept in memory.
+    
+    Returns:
+    LazyHyperstack: The TZCYX hyperstack.
+    str: The type of image generated.
+    """
+    stack_groups = planStackGroupsOlympus(channel_filenames, z_selection, t_selection)
+    channel_names = list(dict.fromkeys(channel_name for channel_name, _, _ in stack_groups))
+    num_frames = countFramesOlympus(stack_groups)
+    
+    plane_sources = {}
+    frame_counts = dict.fromkeys(channel_names, 0)
+    for channel_name, matching_files, image_type in stack_groups:
+        frame_number = frame_counts[channel_name]
+        frame_counts[channel_name] += 1
+        if frame_number < num_frames:
+            plane_sources.update(((frame_number, z_index, channel_names.index(channel_name)), [(file, 0)])
+                                 for z_index, file in enumerate(matching_files))
+    num_z_planes = len(stack_groups[0][1])
+    
+    hyperstack = LazyHyperstack(plane_sources, (num_frames, num_z_planes, len(channel_names)), ingest_transform,
+                                cache_bytes=cache_bytes, is_ome=False)
+    return hyperstack, image_type + '_raw'
+
+def countFramesOlympus(stack_groups: list) -> int:
+    """
+    Count the frames of a folder from its stack groups: the number of frames every channel has.
+    
+    Parameters:
+    stack_groups (list): The (channel name, matching files, image type) tuples from planStackGroupsOlympus.
+    
+    Returns:
+    int: The number of frames.
+    """
+    channel_names = list(dict.fromkeys(channel_name for channel_name, _, _ in stack_groups))
+    return min(sum(1 for channel_name, _, _ in stack_groups if channel_name == name) for name in channel_names)
+
 def getMaxZPlanes(filenames: list) -> int:
     """
     Get the maximum number of Z planes from a list of filenames.
@@ -159,40 +234,6 @@ def getMatchingFiles(filenames: list,
         
     return matching_files, image_type
             
-def loadAndProjectImages(matching_files: list, 
-                         image_type: str, 
-                         projection_type: str) -> tuple:
-    """
-    Load and project images based on the matching files and projection type.
-    
-    Parameters:
-    matching_files (list): List of matching file paths.
-    image_type (str): Type of image to generate.
-    projection_type (str): Type of projection to apply ('max', 'avg', or 'raw').
-    
-    Returns:
-    np.ndarray: The projected image.
-    str: The type of image generated based on the projection.
-    """
-    # Read the images from the matching files
-    images = [tifffile.imread(file, is_ome=False) for file in matching_files]
-    # Stack the images along the Z axis
-    images = np.stack(images, axis=0)
-    # Perform the projection if requested
-    if 'single_plane' not in image_type:
-        if projection_type == 'max':
-            images = np.max(images, axis=0)
-            image_type = image_type + '_maxproject'
-        elif projection_type == 'avg':
-            images = np.mean(images, axis=0)
-            images = np.round(images).astype(np.uint16) 
-            image_type = image_type + '_avgproject'
-        else:
-            image_type = image_type + '_raw'
-    
-    return images, image_type
-        
-               
 def extractTNumber(filename: str) -> int:
     """
     Extract the T number from the filename.
@@ -219,30 +260,6 @@ def extractZNumber(filename: str) -> int:
     match = re.search(r'Z(\d+)', filename)
     return int(match.group(1)) if match else float('inf')
     
-def stackChannelsGenHyperstackOlympus(channel_image_arrays: dict) -> np.ndarray:
-    """
-    Stack the channel images into a hyperstack format.
-    
-    Parameters:
-    channel_image_arrays (dict): Dictionary where keys are channel names and values are lists of numpy arrays.
-    
-    Returns:
-    np.ndarray: A numpy array representing the stacked hyperstack.
-    """
-    # Ensure all channel image lists have the same length
-    num_frames = 10000000 # Arbitrarily large number
-    for channel_name, image_arrays in channel_image_arrays.items():
-        channel_frames = len(image_arrays)
-        if channel_frames < num_frames:
-            num_frames = channel_frames
-    
-    for channel_name, image_arrays in channel_image_arrays.items():
-        channel_image_arrays[channel_name] = image_arrays[:num_frames]
-        
-    merged_images = np.stack(list(channel_image_arrays.values()), axis=1)
-    
-    return merged_images
-
 def extractMetadataFromOIFOlympus(file_path: str) -> float:
     """
     Extract the total time from an Olympus OIF file.
@@ -0,0 +1,245 @@
+import os
+import json
+import uuid
+import zlib
+import itertools
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# OME-NGFF axis order, the hyperstack axes are reordered to it
+OME_ZARR_AXES = 'TCZYX'
+OME_ZARR_AXIS_TYPES = {'T': ('time', 'second'), 'C': ('channel', None), 'Z': ('space', 'micrometer'),
+                       'Y': ('space', 'micrometer'), 'X': ('space', 'micrometer')}
+
+# One chunk per plane of at most 1024 x 1024 pixels, so viewers can load a sub-region of a single plane
+DEFAULT_OME_ZARR_CHUNKS = {'T': 1, 'C': 1, 'Z': 1, 'Y': 1024, 'X': 1024}
+
+class OmeZarrArray:
+    """
+    A chunked array in a Zarr v2 directory store, written one chunk per file.
+
+    Every chunk is an independent file, so threads or processes can write different chunks at the same time.
+    A worker process opens the same array with OmeZarrArray(array_path) and writes its own chunks.
+    """
+    def __init__(self, array_path: str):
+        self.array_path = array_path
+        with open(os.path.join(array_path, '.zarray'), 'r') as file:
+            zarray = json.load(file)
+        self.shape = tuple(zarray['shape'])
+        self.chunks = tuple(zarray['chunks'])
+        self.dtype = np.dtype(zarray['dtype'])
+        self.compressor = zarray['compressor']
+        self.fill_value = zarray['fill_value']
+
+    @classmethod
+    def create(cls, array_path: str, shape: tuple, dtype, chunks: tuple, compression: str = 'zlib'):
+        """
+        Create an empty array: only the .zarray metadata is written, chunks that are never written read as zeros.
+
+        Parameters:
+        array_path (str): Directory of the array.
+        shape (tuple): Shape of the array.
+        dtype: NumPy dtype of the array.
+        chunks (tuple): Chunk shape, one size per dimension.
+        compression (str): 'zlib' to compress each chunk, or None to store raw chunks.
+
+        Returns:
+        OmeZarrArray: The new array.
+        """
+        if compression not in ('zlib', None):
+            raise ValueError(f"Invalid OME-Zarr compression '{compression}'. Choose 'zlib' or None.")
+        os.makedirs(array_path, exist_ok=True)
+        zarray = {'zarr_format': 2,
+                  'shape': [int(size) for size in shape],
+                  'chunks': [int(size) for size in chunks],
+                  # Little-endian like most readers expect, native on x86 so chunks are written without a byteswap
+                  'dtype': np.dtype(dtype).newbyteorder('<').str,
+                  'compressor': {'id': 'zlib', 'level': 1} if compression == 'zlib' else None,
+                  'fill_value': 0,
+                  'order': 'C',
+                  'filters': None,
+                  'dimension_separator': '/'}
+        with open(os.path.join(array_path, '.zarray'), 'w') as file:
+            json.dump(zarray, file, indent=4)
+
+        return cls(array_path)
+
+    def getChunkGrid(self) -> tuple:
+        """
+        Return the number of chunks along each dimension.
+        """
+        return tuple(-(-size // chunk) for size, chunk in zip(self.shape, self.chunks))
+
+    def getChunkSlices(self, chunk_index: tuple) -> tuple:
+        """
+        Return the region of the array covered by a chunk, clipped to the array edges.
+        """
+        return tuple(slice(index * chunk, min((index + 1) * chunk, size))
+                     for index, chunk, size in zip(chunk_index, self.chunks, self.shape))
+
+    def writeChunk(self, chunk_index: tuple, data: np.ndarray) -> int:
+        """
+        Encode and write one chunk. Edge chunks can be smaller than the chunk shape, they are padded.
+        The chunk file is replaced atomically, so a reader never sees a partly written chunk.
+
+        Parameters:
+        chunk_index (tuple): Position of the chunk in the chunk grid.
+        data (np.ndarray): Data of the chunk, shaped like the region from getChunkSlices.
+
+        Returns:
+        int: Number of bytes written.
+        """
+        chunk = np.full(self.chunks, self.fill_value, dtype=self.dtype)
+        chunk[tuple(slice(0, size) for size in data.shape)] = data
+        chunk_bytes = chunk.tobytes()
+        if self.compressor is not None:
+            chunk_bytes = zlib.compress(chunk_bytes, self.compressor['level'])
+
+        chunk_path = os.path.join(self.array_path, *[str(index) for index in chunk_index])
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        partial_path = f'{chunk_path}.{uuid.uuid4().hex}.partial'
+        with open(partial_path, 'wb') as file:
+            file.write(chunk_bytes)
+        os.replace(partial_path, chunk_path)
+
+        return len(chunk_bytes)
+
+    def readChunk(self, chunk_index: tuple) -> np.ndarray:
+        """
+        Read and decode one chunk, clipped to the array edges.
+        """
+        chunk_path = os.path.join(self.array_path, *[str(index) for index in chunk_index])
+        if not os.path.exists(chunk_path):
+            chunk = np.full(self.chunks, self.fill_value, dtype=self.dtype)
+        else:
+            with open(chunk_path, 'rb') as file:
+                chunk_bytes = file.read()
+            if self.compressor is not None:
+                chunk_bytes = zlib.decompress(chunk_bytes)
+            chunk = np.frombuffer(chunk_bytes, dtype=self.dtype).reshape(self.chunks)
+
+        return chunk[tuple(slice(0, region.stop - region.start) for region in self.getChunkSlices(chunk_index))]
+
+    def read(self) -> np.ndarray:
+        """
+        Read the whole array into memory.
+        """
+        array = np.empty(self.shape, dtype=self.dtype.newbyteorder('='))
+        for chunk_index in itertools.product(*[range(count) for count in self.getChunkGrid()]):
+            array[self.getChunkSlices(chunk_index)] = self.readChunk(chunk_index)
+
+        return array
+
+def getChannelColor(lut: np.ndarray) -> str:
+    """
+    Return the color of a (3, 256) LUT, the RGB value of its brightest entry, as an OME hex string like 'FF00FF'.
+    """
+    return ''.join(f'{int(value):02X}' for value in np.asarray(lut)[:, -1])
+
+def createOmeZarrAttributes(name: str,
+                            axes: str,
+                            shape: tuple,
+                            dtype,
+                            metadata: dict = None,
+                            luts: list = None
+                            ) -> dict:
+    """
+    Return the OME-NGFF 0.4 group attributes: axes with units, the pixel size and frame interval as scales,
+    and the channel colors from the LUTs.
+
+    Parameters:
+    name (str): Name of the image.
+    axes (str): Axes of the array, in OME-NGFF order (e.g. 'TCZYX').
+    shape (tuple): Shape of the array.
+    dtype: NumPy dtype of the array.
+    metadata (dict): Metadata with X_microns_per_pixel, Y_microns_per_pixel, optional Z_microns_per_pixel
+        and framerate (the frame interval in seconds), as used for the ImageJ hyperstacks. None for no scales.
+    luts (list): (3, 256) LUT of each channel, as passed to createImageJMetadataTags.
+
+    Returns:
+    dict: The .zattrs content.
+    """
+    metadata = metadata or {}
+    axis_scales = {'T': metadata.get('framerate') or 1.0,
+                   'C': 1.0,
+                   'Z': metadata.get('Z_microns_per_pixel', 1.0),
+                   'Y': metadata.get('Y_microns_per_pixel', 1.0),
+                   'X': metadata.get('X_microns_per_pixel', 1.0)}
+    ome_axes = []
+    for axis in axes:
+        axis_type, unit = OME_ZARR_AXIS_TYPES[axis]
+        ome_axes.append({'name': axis.lower(), 'type': axis_type, **({'unit': unit} if unit else {})})
+
+    attributes = {'multiscales': [{'version': '0.4',
+                                   'name': name,
+                                   'axes': ome_axes,
+                                   'datasets': [{'path': '0',
+                                                 'coordinateTransformations': [{'type': 'scale',
+                                                                                'scale': [float(axis_scales[axis]) for axis in axes]}]}]}]}
+
+    num_channels = shape[axes.index('C')] if 'C' in axes else 1
+    luts = luts or []
+    dtype_max = int(np.iinfo(dtype).max) if np.issubdtype(dtype, np.integer) else 1.0
+    attributes['omero'] = {'channels': [{'label': f'Channel {channel + 1}',
+                                         'color': getChannelColor(luts[channel]) if channel < len(luts) else 'FFFFFF',
+                                         'active': True,
+                                         'window': {'min': 0, 'max': dtype_max, 'start': 0, 'end': dtype_max}}
+                                        for channel in range(num_channels)],
+                           'rdefs': {'model': 'color'}}
+
+    return attributes
+
+def saveOmeZarrHyperstack(hyperstack: np.ndarray,
+                          axes: str,
+                          metadata: dict,
+                          output_name: str,
+                          luts: list = None,
+                          chunks: dict = None,
+                          write_workers: int = 0,
+                          compression: str = 'zlib'
+                          ) -> int:
+    """
+    Save a hyperstack as an OME-Zarr (OME-NGFF 0.4) image in a local directory store, as an alternative to
+    saveImageJHyperstack for hyperstacks too large for one TIFF file.
+
+    Parameters:
+    hyperstack (np.ndarray): The hyperstack to be saved, in memory or disk-backed.
+    axes (str): ImageJ axes of the hyperstack (e.g. 'TZCYX'), reordered to OME-NGFF 'TCZYX' order.
+    metadata (dict): Pixel size and frame interval, see createOmeZarrAttributes. None for no scales.
+    output_name (str): Directory of the OME-Zarr image, usually ending in .ome.zarr.
+    luts (list): (3, 256) LUT of each channel, used for the channel colors.
+    chunks (dict): Chunk size per axis, e.g. {'T': 1, 'Z': 8}. Axes left out use DEFAULT_OME_ZARR_CHUNKS.
+    write_workers (int): Number of threads encoding and writing chunks. 0 writes them sequentially.
+    compression (str): 'zlib' to compress each chunk, or None to store raw chunks.
+
+    Returns:
+    int: Number of bytes written.
+    """
+    ome_axes = ''.join(axis for axis in OME_ZARR_AXES if axis in axes)
+    if sorted(ome_axes) != sorted(axes):
+        raise ValueError(f"Invalid axes '{axes}' for OME-Zarr, expected a subset of '{OME_ZARR_AXES}'.")
+    # Transposed view, the chunks are copied out of it one at a time
+    ome_hyperstack = hyperstack.transpose([axes.index(axis) for axis in ome_axes])
+    chunk_sizes = {**DEFAULT_OME_ZARR_CHUNKS, **(chunks or {})}
+    chunk_shape = tuple(min(chunk_sizes[axis], size) for axis, size in zip(ome_axes, ome_hyperstack.shape))
+
+    os.makedirs(output_name, exist_ok=True)
+    with open(os.path.join(output_name, '.zgroup'), 'w') as file:
+        json.dump({'zarr_format': 2}, file, indent=4)
+    attributes = createOmeZarrAttributes(os.path.basename(output_name.rstrip(os.sep)).replace('.ome.zarr', ''),
+                                         ome_axes, ome_hyperstack.shape, hyperstack.dtype, metadata, luts)
+    with open(os.path.join(output_name, '.zattrs'), 'w') as file:
+        json.dump(attributes, file, indent=4)
+
+    ome_zarr_array = OmeZarrArray.create(os.path.join(output_name, '0'), ome_hyperstack.shape, hyperstack.dtype,
+                                         chunk_shape, compression)
+
+    def writeChunk(chunk_index):
+        return ome_zarr_array.writeChunk(chunk_index, ome_hyperstack[ome_zarr_array.getChunkSlices(chunk_index)])
+
+    chunk_indices = itertools.product(*[range(count) for count in ome_zarr_array.getChunkGrid()])
+    if write_workers > 0:
+        with ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix='zarr_writer') as executor:
+            return sum(executor.map(writeChunk, chunk_indices))
+
+    return sum(writeChunk(chunk_index) for chunk_index in chunk_indices)
@@ -0,0 +1,158 @@
+import copy
+from domilyzer.functions_gui.staging_functions import StagingCache
+from domilyzer.functions_gui.transform_functions import UserTransforms
+from domilyzer.functions_gui.instrumentation_functions import StageTimer
+
+class ConversionOptions:
+    """
+    The options of a conversion run, built once (by __main__ from the GUI and the DOMILYZER_* environment variables)
+    and passed unchanged through the workflows to every folder they convert.
+
+    Parameters:
+    projection_type (str): 'max', 'avg', or None to save full hyperstacks.
+    single_plane (bool): Whether the Bruker folders are single plane.
+    auto_metadata_extract (bool): Whether to extract the Bruker metadata from the XML files.
+    test (bool): If True, nothing is written or logged to the metadata CSV.
+    imagej_tags (list): ImageJ metadata tags written with every TIFF output, e.g. the LUTs of the channels.
+    luts (list): LUT of each channel, for the OME-Zarr channel colors.
+    read_ahead (int): Number of TIFF files read ahead in background threads. 0 reads sequentially.
+    staging_cache (StagingCache): If given, each folder is copied to local scratch storage before conversion.
+    ram_budget_bytes (int): If given, folders are converted in parallel while their estimated peak memory fits in this budget.
+    max_workers (int): Maximum number of folders converted at once when ram_budget_bytes is given.
+    scheduling_policy (str): Order to process the folders in ('name', 'smallest_first' or 'newest_first').
+        None keeps the order of the folders given.
+    stage_timer (StageTimer): If given, the wall time and bytes of each stage of each folder are recorded.
+    process_workers (int): If > 0, projected stacks are read and projected in this many worker processes, which
+        write the planes into shared memory. Only projections of folders with each Z-stack in its own file use the
+        processes: full hyperstacks (no projection) are always read in the main process, and Z-stacks spread over
+        several files are streamed there, so process_workers does not speed them up.
+    projection_workers (int): Number of threads projecting (timepoint, channel) stacks at once in convertFolder.
+        0 projects them in turn.
+    reduce_workers (int): If > 0, Z-projections are split into tiles of rows projected by this many threads.
+        The result is identical to the single-threaded projection.
+    use_numba (bool): If True, Z-projections and Flamingo side fusion run the compiled Numba kernels, which need the
+        numba package. The result is identical to the NumPy kernels.
+    scratch_directory (str): If given, full hyperstacks are assembled in a disk-backed array in this directory and
+        written plane by plane, for hyperstacks larger than RAM.
+    write_workers (int): If > 0, each output file is created up front with its full page layout and this many
+        threads write the planes straight into it.
+    compression (str): Lossless codec for the TIFF output ('zlib', 'lzw', 'zstd', optionally with a level such as
+        'zlib:1', or 'auto'). None writes uncompressed files.
+    pyramid_levels (int): Number of downsampled levels (2x, 4x, ...) written as SubIFDs of each output plane.
+    pyramid_binning (str): 'mean' or 'max' binning for the pyramid levels.
+    output_format (str): 'tiff' for ImageJ hyperstacks, or 'ome-zarr' for chunked OME-Zarr directories.
+    zarr_chunks (dict): OME-Zarr chunk size per axis, e.g. {'Z': 8, 'Y': 512, 'X': 512}.
+    crop (tuple): (x, y, width, height) region of the raw images to keep, applied to every plane right after it is read.
+    crop_unit (str): 'pixels' or 'microns' (converted with the pixel size of each folder) for the crop.
+    binning (int): Binning factor applied to every plane after the crop, the pixel size written is scaled to match.
+    binning_mode (str): 'sum', 'mean' or 'max' binning.
+    z_selection (slice): Z planes to keep (0-based, e.g. slice(10, 40) or slice(None, None, 2)). The others are never read.
+    t_selection (slice): Timepoints to keep. The frame interval written is multiplied by its step.
+    user_transforms (UserTransforms): Corrections such as dark-frame subtraction, flat-field correction or clipping,
+        applied to every plane as it is read, after the crop and before the binning and projection.
+    """
+    def __init__(self,
+                 projection_type: str = None,
+                 single_plane: bool = False,
+                 auto_metadata_extract: bool = True,
+                 test: bool = False,
+                 imagej_tags: list = None,
+                 luts: list = None,
+                 read_ahead: int = 0,
+                 staging_cache: StagingCache = None,
+                 ram_budget_bytes: int = None,
+                 max_workers: int = None,
+                 scheduling_policy: str = None,
+                 stage_timer: StageTimer = None,
+                 process_workers: int = 0,
+                 projection_workers: int = 0,
+                 reduce_workers: int = 0,
+                 use_numba: bool = False,
+                 scratch_directory: str = None,
+                 write_workers: int = 0,
+                 compression: str = None,
+                 pyramid_levels: int = 0,
+                 pyramid_binning: str = 'mean',
+                 output_format: str = 'tiff',
+                 zarr_chunks: dict = None,
+                 crop: tuple = None,
+                 crop_unit: str = 'pixels',
+                 binning: int = 1,
+                 binning_mode: str = 'mean',
+                 z_selection: slice = None,
+                 t_selection: slice = None,
+                 user_transforms: UserTransforms = None):
+        self.projection_type = projection_type
+        self.single_plane = single_plane
+        self.auto_metadata_extract = auto_metadata_extract
+        self.test = test
+        self.imagej_tags = imagej_tags
+        self.luts = luts
+        self.read_ahead = read_ahead
+        self.staging_cache = staging_cache
+        self.ram_budget_bytes = ram_budget_bytes
+        self.max_workers = max_workers
+        self.scheduling_policy = scheduling_policy
+        self.stage_timer = stage_timer
+        self.process_workers = process_workers
+        self.projection_workers = projection_workers
+        self.reduce_workers = reduce_workers
+        self.use_numba = use_numba
+        self.scratch_directory = scratch_directory
+        self.write_workers = write_workers
+        self.compression = compression
+        self.pyramid_levels = pyramid_levels
+        self.pyramid_binning = pyramid_binning
+        self.output_format = output_format
+        self.zarr_chunks = zarr_chunks
+        self.crop = crop
+        self.crop_unit = crop_unit
+        self.binning = binning
+        self.binning_mode = binning_mode
+        self.z_selection = z_selection
+        self.t_selection = t_selection
+        self.user_transforms = user_transforms
+
+    def __repr__(self) -> str:
+        # Only the options that differ from the defaults
+        defaults = vars(ConversionOptions())
+        changed = ', '.join(f'{name}={value!r}' for name, value in vars(self).items() if value is not defaults[name])
+        return f"ConversionOptions({changed})"
+
+    def replace(self, **options) -> 'ConversionOptions':
+        """
+        Return a copy with some options changed, e.g. options.replace(projection_type='max'). The other options,
+        such as the stage timer or the staging cache, are shared with this one.
+        """
+        unknown_options = set(options) - set(vars(self))
+        if unknown_options:
+            raise TypeError(f"Unknown conversion options: {sorted(unknown_options)}.")
+        replaced = copy.copy(self)
+        vars(replaced).update(options)
+        return replaced
+
+    def getTiffWriterOptions(self) -> dict:
+        """
+        Return the keyword arguments of saveImageJHyperstack for the TIFF output.
+        """
+        return {'imagej_tags': self.imagej_tags,
+                'write_workers': self.write_workers,
+                'compression': self.compression,
+                'pyramid_levels': self.pyramid_levels,
+                'pyramid_binning': self.pyramid_binning}
+
+    def getWriterOptions(self) -> dict:
+        """
+        Return the keyword arguments of the writer of the output format, see OUTPUT_WRITERS in engine_functions.
+        """
+        if self.output_format == 'ome-zarr':
+            return {'luts': self.luts,
+                    'zarr_chunks': self.zarr_chunks,
+                    'write_workers': self.write_workers}
+        return self.getTiffWriterOptions()
+
+def getConversionOptions(options: ConversionOptions = None) -> ConversionOptions:
+    """
+    Return the options given, or the default ConversionOptions if None.
+    """
+    return options if options is not None else ConversionOptions()
@@ -0,0 +1,29 @@
+import tempfile
+import numpy as np
+
+def createScratchArray(scratch_directory: str, shape: tuple, dtype) -> np.memmap:
+    """
+    Allocate a disk-backed array in a scratch directory, for hyperstacks larger than RAM.
+
+    The backing file is an anonymous temporary file: it is removed by the operating system once the array
+    is garbage collected, or if the process dies, so no cleanup is needed.
+
+    Parameters:
+    scratch_directory (str): Directory on a disk with room for the whole array.
+    shape (tuple): Shape of the array.
+    dtype: NumPy dtype of the array.
+
+    Returns:
+    np.memmap: The zero-filled array.
+    """
+    with tempfile.TemporaryFile(dir=scratch_directory, prefix='domilyzer_', suffix='.raw') as scratch_file:
+        # The memmap keeps its own mapping of the file, it stays valid after the file object is closed
+        return np.memmap(scratch_file, dtype=dtype, mode='w+', shape=tuple(shape))
+
+def iterateHyperstackPlanes(hyperstack: np.ndarray):
+    """
+    Yield the (Y, X) planes of a hyperstack in storage order, so a disk-backed hyperstack can be written
+    to a TIFF file one plane at a time.
+    """
+    for plane in hyperstack.reshape(-1, *hyperstack.shape[-2:]):
+        yield plane
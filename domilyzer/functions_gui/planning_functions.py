@@ -0,0 +1,177 @@
+import os
+import json
+import numpy as np
+from domilyzer.functions_gui.scheduling_functions import estimateFolderPeakMemory
+from domilyzer.functions_gui.ingest_functions import createIngestTransform
+from domilyzer.functions_gui.engine_functions import getReaderBackend
+from domilyzer.functions_gui.options_functions import ConversionOptions, getConversionOptions
+
+# Throughput used for time estimates when no calibration file exists, in MB/s of raw input (read, process)
+# or of output (write). Overwrite them by saving measured values to the calibration file.
+DEFAULT_THROUGHPUT_MB_PER_SECOND = {'read': 150.0, 'process': 400.0, 'write': 250.0}
+DEFAULT_CALIBRATION_PATH = os.path.join(os.path.expanduser('~'), '.domilyzer_throughput.json')
+
+# Classic (non-BigTIFF) TIFF offsets are 32 bit, and ImageJ stores plane sizes as signed 32 bit integers
+IMAGEJ_MAX_FILE_BYTES = 2 ** 32
+IMAGEJ_MAX_PLANE_PIXELS = 2 ** 31 - 1
+
+def loadThroughputCalibration(calibration_path: str = DEFAULT_CALIBRATION_PATH) -> dict:
+    """
+    Load the per-MB throughput used for time estimates, falling back to the defaults for missing values.
+
+    Parameters:
+    calibration_path (str): Path to a JSON file with 'read', 'process' and/or 'write' MB/s values.
+
+    Returns:
+    dict: Throughput in MB/s for 'read', 'process' and 'write'.
+    """
+    throughput = dict(DEFAULT_THROUGHPUT_MB_PER_SECOND)
+    if calibration_path and os.path.exists(calibration_path):
+        with open(calibration_path, 'r') as file:
+            throughput.update({key: float(value) for key, value in json.load(file).items() if key in throughput})
+
+    return throughput
+
+def planFolder(folder_path: str,
+               microscope_type: str,
+               options: ConversionOptions = None
+               ) -> dict:
+    """
+    Plan the conversion of a folder from its file listing and TIFF headers: the reader backend of the microscope
+    indexes it like convertFolder does, with the crop, binning and selections of the options, without reading pixels.
+
+    Parameters:
+    folder_path (str): Path to the image folder.
+    microscope_type (str): Name of a registered reader backend, 'Bruker', 'Olympus' or 'Flamingo'.
+    options (ConversionOptions): Options of the run, see ConversionOptions. A crop in microns reads the pixel size
+        from the metadata of the folder.
+
+    Returns:
+    dict: The folder plan, with the image type, output shape and axes, input and output bytes and the peak memory estimate.
+    """
+    options = getConversionOptions(options)
+    backend = getReaderBackend(microscope_type)
+    # Only a crop in microns needs the metadata, the other options are planned from the file listing
+    metadata = None
+    if options.crop is not None and options.crop_unit == 'microns':
+        metadata = backend.read_metadata(folder_path, options, None)
+    ingest_transform = createIngestTransform(options.crop, options.crop_unit, options.binning, options.binning_mode,
+                                             metadata, pages=backend.page_selection(options))
+    plan = backend.index_folder(folder_path, ingest_transform, options)
+    hyperstack = plan.hyperstack
+
+    if plan.projection_type is None:
+        shape, dtype = hyperstack.shape, hyperstack.dtype
+    else:
+        # One projected plane per timepoint and channel, of the dtype and orientation of the backend's projections
+        shape = (hyperstack.shape[0], hyperstack.shape[2], *backend.getProjectedShape(hyperstack.shape[3:]))
+        dtype = hyperstack.dtype if plan.projection_type == 'max' else backend.average_dtype
+    if len(plan.axes) < len(shape):
+        # A single timepoint, saved without its T axis
+        shape = shape[1:]
+    input_files = {file_path for sources in hyperstack.plane_sources.values() for file_path, _ in sources}
+
+    return {'image_type': plan.image_type,
+            'axes': plan.axes,
+            'shape': tuple(shape),
+            'dtype': np.dtype(dtype),
+            'input_bytes': sum(os.path.getsize(file_path) for file_path in input_files),
+            'output_bytes': int(np.prod(shape)) * np.dtype(dtype).itemsize,
+            'peak_memory_bytes': estimateFolderPeakMemory(folder_path, plan.projection_type, microscope_type,
+                                                          streaming=options.process_workers > 0)}
+
+def checkImageJLimits(folder_plan: dict) -> list:
+    """
+    Return warnings for outputs that exceed what ImageJ can open as a regular TIFF.
+
+    Parameters:
+    folder_plan (dict): A folder plan with 'shape' and 'output_bytes'.
+
+    Returns:
+    list: Warning messages, empty if the output is within limits.
+    """
+    warnings = []
+    if folder_plan['output_bytes'] >= IMAGEJ_MAX_FILE_BYTES:
+        warnings.append('output exceeds the 4 GB classic TIFF limit')
+    if folder_plan['shape'][-1] * folder_plan['shape'][-2] > IMAGEJ_MAX_PLANE_PIXELS:
+        warnings.append('planes exceed the ImageJ 2^31 pixel limit')
+
+    return warnings
+
+def planConversion(parent_folder_path: str,
+                   microscope_type: str,
+                   projection_type: str,
+                   single_plane: bool = False,
+                   image_folders: list = None,
+                   throughput: dict = None,
+                   options: ConversionOptions = None
+                   ) -> list:
+    """
+    Plan a conversion run without reading any pixels: for each folder, report the detected image type,
+    output dimensions and bytes, estimated peak RAM and time, and any ImageJ TIFF limits it exceeds.
+
+    Parameters:
+    parent_folder_path (str): Path to the parent folder, or the acquisition folder for Flamingo data.
+    microscope_type (str): Type of microscope ('Bruker', 'Olympus' or 'Flamingo').
+    projection_type (str): Type of projection ('max', 'avg', or None).
+    single_plane (bool): Whether Bruker images are single plane.
+    image_folders (list): Folders to plan. Defaults to every folder in parent_folder_path.
+    throughput (dict): Throughput in MB/s for 'read', 'process' and 'write'. Defaults to loadThroughputCalibration().
+    options (ConversionOptions): If given, the output shapes follow its crop, binning and Z and T selections, like
+        convertFolder, see planFolder. Its projection type and single plane are replaced by those given here.
+
+    Returns:
+    list: One plan dict per folder.
+    """
+    throughput = throughput if throughput is not None else loadThroughputCalibration()
+    options = getConversionOptions(options).replace(projection_type=projection_type, single_plane=single_plane)
+    if microscope_type == 'Flamingo':
+        folder_paths = {os.path.basename(os.path.normpath(parent_folder_path)): parent_folder_path}
+    else:
+        if image_folders is None:
+            image_folders = sorted([folder for folder in os.listdir(parent_folder_path) if os.path.isdir(os.path.join(parent_folder_path, folder))])
+        folder_paths = {folder: os.path.join(parent_folder_path, folder) for folder in image_folders}
+
+    conversion_plan = []
+    for folder_name, folder_path in folder_paths.items():
+        try:
+            folder_plan = planFolder(folder_path, microscope_type, options)
+        except Exception as e:
+            conversion_plan.append({'folder_name': folder_name, 'error': str(e)})
+            continue
+
+        input_mb = folder_plan['input_bytes'] / 1024 ** 2
+        output_mb = folder_plan['output_bytes'] / 1024 ** 2
+        folder_plan['folder_name'] = folder_name
+        folder_plan['estimated_seconds'] = input_mb / throughput['read'] + input_mb / throughput['process'] + output_mb / throughput['write']
+        folder_plan['warnings'] = checkImageJLimits(folder_plan)
+        conversion_plan.append(folder_plan)
+
+    return conversion_plan
+
+def printConversionPlan(conversion_plan: list) -> None:
+    """
+    Print a conversion plan as a table, followed by the totals.
+
+    Parameters:
+    conversion_plan (list): The plan returned by planConversion.
+    """
+    header = f"{'Folder':<40} {'Image type':<42} {'Axes':<6} {'Shape':<28} {'Input MB':>10} {'Output MB':>10} {'Peak RAM MB':>12} {'Est. s':>8}"
+    print(header)
+    print('-' * len(header))
+    for folder_plan in conversion_plan:
+        if 'error' in folder_plan:
+            print(f"{folder_plan['folder_name']:<40} cannot be planned: {folder_plan['error']}")
+            continue
+        print(f"{folder_plan['folder_name']:<40} {folder_plan['image_type']:<42} {folder_plan['axes']:<6} {str(folder_plan['shape']):<28} "
+              f"{folder_plan['input_bytes'] / 1024 ** 2:>10.1f} {folder_plan['output_bytes'] / 1024 ** 2:>10.1f} "
+              f"{folder_plan['peak_memory_bytes'] / 1024 ** 2:>12.1f} {folder_plan['estimated_seconds']:>8.1f}")
+        for warning in folder_plan['warnings']:
+            print(f"    WARNING: {warning}")
+
+    planned_folders = [folder_plan for folder_plan in conversion_plan if 'error' not in folder_plan]
+    print('-' * len(header))
+    print(f"{len(planned_folders)} folders, "
+          f"{sum(folder_plan['output_bytes'] for folder_plan in planned_folders) / 1024 ** 3:.2f} GB output, "
+          f"largest peak RAM {max([folder_plan['peak_memory_bytes'] for folder_plan in planned_folders], default=0) / 1024 ** 3:.2f} GB, "
+          f"~{sum(folder_plan['estimated_seconds'] for folder_plan in planned_folders) / 60:.1f} min")
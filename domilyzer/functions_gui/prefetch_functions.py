@@ -0,0 +1,161 @@
+import io
+import os
+import tifffile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from domilyzer.functions_gui.tracing_functions import PipelineTracer, traceSpan
+from domilyzer.functions_gui.ingest_functions import IngestTransform, readTiffImage
+
+# Default number of bytes that may sit in the read-ahead buffer before the consumer catches up
+DEFAULT_READ_BUFFER_BYTES = 512 * 1024 ** 2
+
+def readFileBytes(file_path: str) -> bytes:
+    """
+    Read the full contents of a file into memory.
+
+    Parameters:
+    file_path (str): Path to the file.
+
+    Returns:
+    bytes: The raw file contents.
+    """
+    with open(file_path, 'rb') as file:
+        return file.read()
+
+class ReadAheadPrefetcher:
+    """
+    Read an ordered list of files in background threads, a fixed number of files ahead of the consumer.
+
+    Network shares (SMB/NFS) are bound by per-file latency rather than bandwidth, so keeping several
+    reads in flight hides most of that latency. Reads are returned strictly in the order of the file plan,
+    and the total size of files read but not yet consumed is kept under max_buffer_bytes (a single file
+    larger than the budget is still read, on its own).
+
+    Parameters:
+    file_paths (list): Ordered list of file paths to read.
+    read_ahead (int): Maximum number of files read ahead of the consumer. 0 reads sequentially in the calling thread.
+    max_buffer_bytes (int): Byte budget for files read but not yet consumed.
+    read_function (callable): Function taking a file path and returning its bytes. Defaults to readFileBytes.
+    size_function (callable): Function taking a file path and returning its size in bytes. Defaults to os.path.getsize.
+    """
+    def __init__(self,
+                 file_paths: list,
+                 read_ahead: int = 4,
+                 max_buffer_bytes: int = DEFAULT_READ_BUFFER_BYTES,
+                 read_function=None,
+                 size_function=None
+                 ):
+        self.file_paths = list(file_paths)
+        self.read_ahead = max(0, int(read_ahead))
+        self.max_buffer_bytes = max_buffer_bytes
+        self.read_function = read_function if read_function is not None else readFileBytes
+        self.size_function = size_function if size_function is not None else os.path.getsize
+        self.buffered_bytes = 0
+        self.peak_buffered_bytes = 0
+        self._executor = None
+        self._pending = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop the background reader threads, discarding any reads that have not been consumed.
+        """
+        for _, _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.buffered_bytes = 0
+
+    def __iter__(self):
+        """
+        Yield (file_path, data) tuples in the order of the file plan.
+        """
+        if self.read_ahead == 0:
+            for file_path in self.file_paths:
+                yield file_path, self.read_function(file_path)
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=self.read_ahead, thread_name_prefix='read_ahead')
+        pending = self._pending
+        next_index = 0
+        try:
+            while True:
+                # Issue reads until the read-ahead depth or the byte budget is reached
+                while next_index < len(self.file_paths) and len(pending) < self.read_ahead:
+                    file_path = self.file_paths[next_index]
+                    file_size = self.size_function(file_path)
+                    if pending and self.buffered_bytes + file_size > self.max_buffer_bytes:
+                        break
+                    pending.append((file_path, file_size, self._executor.submit(self.read_function, file_path)))
+                    self.buffered_bytes += file_size
+                    self.peak_buffered_bytes = max(self.peak_buffered_bytes, self.buffered_bytes)
+                    next_index += 1
+
+                if not pending:
+                    break
+
+                file_path, file_size, future = pending.popleft()
+                data = future.result()
+                self.buffered_bytes -= file_size
+                yield file_path, data
+        finally:
+            self.close()
+
+def readTiffFiles(file_paths: list,
+                  read_ahead: int = 0,
+                  max_buffer_bytes: int = DEFAULT_READ_BUFFER_BYTES,
+                  read_function=None,
+                  tracer: PipelineTracer = None,
+                  ingest_transform: IngestTransform = None,
+                  **imread_kwargs
+                  ):
+    """
+    Yield the image arrays of a list of TIFF files in order, decoding from memory buffers filled by a ReadAheadPrefetcher.
+
+    Parameters:
+    file_paths (list): Ordered list of TIFF file paths.
+    read_ahead (int): Number of files to read ahead in background threads. 0 reads sequentially.
+    max_buffer_bytes (int): Byte budget for files read but not yet decoded.
+    read_function (callable): Function taking a file path and returning its bytes.
+    tracer (PipelineTracer): If given, every file read and decode is recorded on the trace timeline.
+    ingest_transform (IngestTransform): If given, each image is cropped and binned right after it is read. When reading
+        sequentially, uncompressed files are memory-mapped so only the cropped rows are read.
+    **imread_kwargs: Additional keyword arguments passed to tifffile.imread (e.g. is_ome=False).
+
+    Yields:
+    np.ndarray: The image array of each file.
+    """
+    if read_ahead == 0 and read_function is None:
+        # Nothing to overlap with, so let tifffile read straight from disk
+        for file_path in file_paths:
+            with traceSpan(tracer, os.path.basename(file_path), 'read'):
+                image = readTiffImage(file_path, ingest_transform, **imread_kwargs)
+            yield image
+        return
+
+    read_function = read_function if read_function is not None else readFileBytes
+    if tracer is not None:
+        untraced_read_function = read_function
+        def read_function(file_path):
+            # Runs on the reader threads, so each read shows up on its own thread's track
+            with tracer.span(os.path.basename(file_path), 'read'):
+                return untraced_read_function(file_path)
+
+    with ReadAheadPrefetcher(file_paths=file_paths,
+                             read_ahead=read_ahead,
+                             max_buffer_bytes=max_buffer_bytes,
+                             read_function=read_function
+                             ) as prefetcher:
+        for file_path, data in prefetcher:
+            with traceSpan(tracer, os.path.basename(file_path), 'decode'):
+                image = tifffile.imread(io.BytesIO(data), **imread_kwargs)
+                if ingest_transform is not None:
+                    image = ingest_transform.apply(image)
+            yield image
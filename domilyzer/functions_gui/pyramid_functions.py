@@ -0,0 +1,53 @@
+import numpy as np
+from domilyzer.functions_gui.ingest_functions import binImage
+
+PYRAMID_BINNINGS = ('mean', 'max')
+
+def binPlane(plane: np.ndarray, binning: str = 'mean') -> np.ndarray:
+    """
+    Downsample a (Y, X) plane 2x by combining 2 x 2 blocks of pixels. An odd last row or column is dropped.
+
+    Parameters:
+    plane (np.ndarray): The plane to downsample.
+    binning (str): 'mean' (rounded to the nearest integer for integer data) or 'max' of each block.
+
+    Returns:
+    np.ndarray: The downsampled plane, with the same dtype.
+    """
+    if binning not in PYRAMID_BINNINGS:
+        raise ValueError(f"Invalid pyramid binning '{binning}'. Choose one of {PYRAMID_BINNINGS}.")
+
+    return binImage(plane, 2, binning)
+
+def getPyramidLevelShapes(plane_shape: tuple, pyramid_levels: int) -> list:
+    """
+    Return the (Y, X) shape of each downsampled level (2x, 4x, 8x, ...), stopping before a level would be empty.
+    """
+    level_shapes = []
+    rows, columns = plane_shape
+    for _ in range(pyramid_levels):
+        rows, columns = rows // 2, columns // 2
+        if rows == 0 or columns == 0:
+            break
+        level_shapes.append((rows, columns))
+
+    return level_shapes
+
+def iteratePlanesBuildingPyramid(planes, pyramid: list, binning: str = 'mean'):
+    """
+    Yield the planes unchanged, while filling the downsampled levels of each plane into the pyramid arrays,
+    so the pyramid is built in the same pass that writes the full-resolution planes.
+
+    Parameters:
+    planes (iterable): The full-resolution (Y, X) planes.
+    pyramid (list): One (planes, Y, X) array per level, from the largest to the smallest.
+    binning (str): 'mean' or 'max', see binPlane.
+    """
+    for index, plane in enumerate(planes):
+        level_plane = plane
+        for level_array in pyramid:
+            # Each level is binned from the one before, so every pixel is only read once per level
+            level_plane = binPlane(level_plane, binning)
+            level_array[index] = level_plane
+        # Binned before yielding, a writer may stop iterating right after the last plane
+        yield plane
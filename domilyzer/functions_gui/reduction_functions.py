@@ -0,0 +1,100 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+REDUCTIONS = ('max', 'min', 'sum', 'mean', 'std')
+REDUCTION_FUNCTIONS = {'max': np.max, 'min': np.min, 'sum': np.sum, 'mean': np.mean, 'std': np.std}
+
+# Reductions whose result does not depend on the order the values are combined in
+ORDER_INDEPENDENT_REDUCTIONS = ('max', 'min')
+
+# Bytes of input per tile, sized so a tile and its output stay in a core's L2 cache while it is reduced
+DEFAULT_TILE_BYTES = 2 * 1024 ** 2
+
+def getTileBounds(shape: tuple, itemsize: int, tile_bytes: int = DEFAULT_TILE_BYTES) -> list:
+    """
+    Split the Y axis (the second to last axis) of an array into (start, stop) ranges of about tile_bytes of input each.
+
+    Parameters:
+    shape (tuple): Shape of the array to reduce.
+    itemsize (int): Bytes per element.
+    tile_bytes (int): Target bytes of input per tile, at least one row is always taken.
+
+    Returns:
+    list: (start, stop) of each tile along the Y axis.
+    """
+    rows = shape[-2]
+    row_bytes = int(np.prod(shape, dtype=np.int64)) // max(rows, 1) * itemsize
+    tile_rows = max(1, tile_bytes // max(row_bytes, 1))
+
+    return [(start, min(start + tile_rows, rows)) for start in range(0, rows, tile_rows)]
+
+def isRowMajor(array: np.ndarray) -> bool:
+    """
+    Return True if the axes of an array are laid out in memory in order, the last one varying fastest, like every
+    stack read from a TIFF file, even when some axes are sliced with a step.
+    """
+    strides = [abs(stride) for size, stride in zip(array.shape, array.strides) if size > 1]
+    return all(outer >= inner for outer, inner in zip(strides, strides[1:]))
+
+def reduceAxis(array: np.ndarray,
+               axis: int,
+               reduction: str = 'max',
+               workers: int = 0,
+               tile_bytes: int = DEFAULT_TILE_BYTES
+               ) -> np.ndarray:
+    """
+    Reduce one axis of an array (e.g. Z-project a stack) in tiles of rows, with the tiles spread over a thread pool.
+
+    Every output pixel only depends on the input pixels at the same Y, X position, so each tile is reduced by the
+    same NumPy function over the same values in the same order and the result is bit-identical to calling it on
+    the whole array. NumPy releases the GIL inside reductions, so the tiles run in parallel, and each tile's output
+    stays in cache while the planes stream through it instead of being written back after every plane.
+    Reductions over Y itself, and sums, means and standard deviations of transposed arrays (whose summation order
+    NumPy picks from the memory layout) are left to NumPy in one call.
+
+    Parameters:
+    array (np.ndarray): The array to reduce, with Y and X as its last two axes. Memory-mapped arrays work too.
+    axis (int): The axis to reduce, e.g. 0 for a (Z, Y, X) stack.
+    reduction (str): 'max', 'min', 'sum', 'mean' or 'std', same dtypes as np.max, np.min, np.sum, np.mean and np.std.
+    workers (int): Number of threads. 0 calls the NumPy function on the whole array, 1 reduces the tiles in the
+        calling thread.
+    tile_bytes (int): Target bytes of input per tile.
+
+    Returns:
+    np.ndarray: The reduced array.
+    """
+    if reduction not in REDUCTIONS:
+        raise ValueError(f"Invalid reduction '{reduction}'. Choose one of {REDUCTIONS}.")
+    function = REDUCTION_FUNCTIONS[reduction]
+    if workers <= 0 or array.ndim < 2 or axis % array.ndim == array.ndim - 2 or array.size == 0:
+        return function(array, axis=axis)
+    if reduction not in ORDER_INDEPENDENT_REDUCTIONS and (not isRowMajor(array) or array.shape[-1] == 1):
+        # NumPy picks the summation order from the memory layout, which the tiles of a transposed array, or of an
+        # array whose rows are its innermost axis, do not share
+        return function(array, axis=axis)
+
+    axis = axis % array.ndim
+    tile_axis = array.ndim - 2
+    output_tile_axis = tile_axis - 1 if axis < tile_axis else tile_axis
+    tile_bounds = getTileBounds(array.shape, array.itemsize, tile_bytes)
+    # Output dtype of the NumPy function, from a single element
+    output_dtype = function(array[(slice(0, 1),) * array.ndim], axis=axis).dtype
+    output = np.empty(array.shape[:axis] + array.shape[axis + 1:], dtype=output_dtype)
+
+    def reduceTile(bounds: tuple):
+        tile = [slice(None)] * array.ndim
+        tile[tile_axis] = slice(*bounds)
+        output_tile = [slice(None)] * output.ndim
+        output_tile[output_tile_axis] = slice(*bounds)
+        # Not out=, NumPy may accumulate in a wider dtype than the output when given none
+        output[tuple(output_tile)] = function(array[tuple(tile)], axis=axis)
+
+    if workers == 1 or len(tile_bounds) == 1:
+        for bounds in tile_bounds:
+            reduceTile(bounds)
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tile_bounds)), thread_name_prefix='reducer') as executor:
+            # list() re-raises the first exception of a tile
+            list(executor.map(reduceTile, tile_bounds))
+
+    return output
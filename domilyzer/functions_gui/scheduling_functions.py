@@ -0,0 +1,174 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED, ALL_COMPLETED
+
+def getFolderTiffBytes(folder_path: str) -> int:
+    """
+    Return the total size of the TIFF files at the top level of a folder.
+
+    Parameters:
+    folder_path (str): Path to the folder.
+
+    Returns:
+    int: The total size in bytes.
+    """
+    total_bytes = 0
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.endswith('.tif') and entry.is_file():
+                total_bytes += entry.stat().st_size
+
+    return total_bytes
+
+def orderImageFolders(parent_folder_path: str,
+                      image_folders: list,
+                      scheduling_policy: str = 'name'
+                      ) -> list:
+    """
+    Order image folders for processing.
+
+    Parameters:
+    parent_folder_path (str): Path to the parent folder containing the image folders.
+    image_folders (list): Names of the image folders.
+    scheduling_policy (str): 'name' for name order, 'smallest_first' to process the folders with the fewest
+        input bytes first (shortest job first), or 'newest_first' to process the most recently modified folders first.
+
+    Returns:
+    list: The folder names in processing order.
+    """
+    if scheduling_policy == 'name':
+        return sorted(image_folders)
+    elif scheduling_policy == 'smallest_first':
+        folder_bytes = {folder: getFolderTiffBytes(os.path.join(parent_folder_path, folder)) for folder in image_folders}
+        return sorted(image_folders, key=lambda folder: (folder_bytes[folder], folder))
+    elif scheduling_policy == 'newest_first':
+        folder_mtimes = {folder: os.stat(os.path.join(parent_folder_path, folder)).st_mtime for folder in image_folders}
+        return sorted(image_folders, key=lambda folder: (-folder_mtimes[folder], folder))
+    else:
+        raise ValueError(f"Invalid scheduling policy {scheduling_policy}. Choose 'name', 'smallest_first' or 'newest_first'.")
+
+def estimateFolderPeakMemory(folder_path: str,
+                             projection_type: str,
+                             microscope_type: str,
+                             streaming: bool = False
+                             ) -> int:
+    """
+    Estimate the peak memory needed to convert a folder from its file manifest, without reading pixels.
+
+    Parameters:
+    folder_path (str): Path to the image folder.
+    projection_type (str): Type of projection ('max', 'avg', or None).
+    microscope_type (str): Name of a registered reader backend, e.g. 'Bruker', whose peak memory factors are used.
+    streaming (bool): Whether the folder is projected one Z-stack at a time, see convertFolder.
+
+    Returns:
+    int: The estimated peak working set in bytes.
+    """
+    # Imported here, the engine imports FolderResult from this module
+    from domilyzer.functions_gui.engine_functions import getReaderBackend
+    factor = getReaderBackend(microscope_type).getPeakMemoryFactor(projection_type, streaming)
+    return int(getFolderTiffBytes(folder_path) * factor)
+
+class FolderResult:
+    """
+    The outcome of converting one image folder, yielded by the workflow generators as each folder completes.
+
+    Parameters:
+    name (str): Name of the image folder.
+    output_path (str): Path of the file written, None if nothing was written (test mode, or the folder was not processed).
+    metadata (dict): Metadata written with the hyperstack, None if there was none.
+    image_type (str): Image type of the hyperstack, e.g. 'multi_plane_max_project'.
+    hyperstack (np.ndarray): The converted hyperstack, only set when the caller asks for it.
+    error (str): Why the folder was not processed, None if it was.
+    """
+    def __init__(self,
+                 name: str,
+                 output_path: str = None,
+                 metadata: dict = None,
+                 image_type: str = None,
+                 hyperstack=None,
+                 error: str = None):
+        self.name = name
+        self.output_path = output_path
+        self.metadata = metadata
+        self.image_type = image_type
+        self.hyperstack = hyperstack
+        self.error = error
+
+    @property
+    def processed(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        status = f"error={self.error!r}" if self.error is not None else f"output_path={self.output_path!r}"
+        return f"FolderResult(name={self.name!r}, image_type={self.image_type!r}, {status})"
+
+def iterateFoldersWithinMemoryBudget(folder_names: list,
+                                     folder_estimates: dict,
+                                     process_folder,
+                                     ram_budget_bytes: int,
+                                     max_workers: int = None):
+    """
+    Process folders in a thread pool, admitting a folder only while the summed peak memory estimates of
+    the running folders stay under the RAM budget, and yield each result as its folder completes.
+
+    Folders are admitted in order. A folder whose estimate alone exceeds the budget waits for the pool to
+    drain and is then run on its own with streaming=True. No result is kept once it is yielded.
+
+    Parameters:
+    folder_names (list): Folders to process, in order of admission.
+    folder_estimates (dict): Estimated peak memory in bytes for each folder name.
+    process_folder (callable): Function called as process_folder(folder_name, streaming).
+    ram_budget_bytes (int): Total memory the running folders may use.
+    max_workers (int): Maximum number of folders processed at once. Defaults to the number of CPUs.
+
+    Yields:
+    tuple: (folder name, return value of process_folder), in order of completion.
+    """
+    max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    running = {}
+    running_bytes = 0
+
+    def waitForCompletion(return_when):
+        nonlocal running_bytes
+        # One at a time as they complete, so folders finishing while others wait are still yielded in order
+        done = as_completed(running) if return_when == ALL_COMPLETED else wait(running, return_when=return_when)[0]
+        for future in done:
+            folder_name = running.pop(future)
+            running_bytes -= folder_estimates[folder_name]
+            yield folder_name, future.result()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='folder') as executor:
+        for folder_name in folder_names:
+            estimate = folder_estimates[folder_name]
+            if estimate > ram_budget_bytes:
+                # Too big to share the machine, run it alone on the streaming path
+                if running:
+                    yield from waitForCompletion(return_when=ALL_COMPLETED)
+                print(f"{folder_name} needs ~{estimate / 1024 ** 3:.2f} GB, over the RAM budget. Processing it on its own.")
+                yield folder_name, process_folder(folder_name, True)
+                continue
+
+            while running and (running_bytes + estimate > ram_budget_bytes or len(running) >= max_workers):
+                yield from waitForCompletion(return_when=FIRST_COMPLETED)
+
+            running[executor.submit(process_folder, folder_name, False)] = folder_name
+            running_bytes += estimate
+
+        if running:
+            yield from waitForCompletion(return_when=ALL_COMPLETED)
+
+def runFoldersWithinMemoryBudget(folder_names: list,
+                                 folder_estimates: dict,
+                                 process_folder,
+                                 ram_budget_bytes: int,
+                                 max_workers: int = None
+                                 ) -> list:
+    """
+    Process folders like iterateFoldersWithinMemoryBudget and return all the results at once.
+
+    Returns:
+    list: The return values of process_folder, in the order of folder_names.
+    """
+    results = dict(iterateFoldersWithinMemoryBudget(folder_names, folder_estimates, process_folder, ram_budget_bytes, max_workers))
+
+    return [results[folder_name] for folder_name in folder_names]
@@ -0,0 +1,66 @@
+def parseSelection(text: str) -> slice:
+    """
+    Parse a range of planes or timepoints written like a Python slice, e.g. '10:40', '::5', '10:40:2' or '7'.
+    Indices are 0-based positions in the acquisition order, the stop is excluded.
+
+    Parameters:
+    text (str): The selection, or None / an empty string to select everything.
+
+    Returns:
+    slice: The selection, or None to select everything.
+    """
+    if not text:
+        return None
+    parts = [part.strip() for part in text.split(':')]
+    if len(parts) == 1:
+        index = int(parts[0])
+        return checkSelection(slice(index, index + 1))
+    if len(parts) > 3:
+        raise ValueError(f"Invalid selection '{text}', expected start:stop or start:stop:step.")
+
+    return checkSelection(slice(*[int(part) if part else None for part in parts]))
+
+def checkSelection(selection: slice) -> slice:
+    """
+    Check that a selection keeps the acquisition order: a positive step, and no negative start or stop.
+    """
+    if selection is None:
+        return None
+    if (selection.step is not None and selection.step < 1) or any(index is not None and index < 0 for index in (selection.start, selection.stop)):
+        raise ValueError(f"Invalid selection {selection}, expected non-negative start and stop and a positive step.")
+
+    return selection
+
+def getSelectionStep(selection: slice) -> int:
+    """
+    Return the stride of a selection, 1 for None, used to scale the frame interval.
+    """
+    return 1 if selection is None or selection.step is None else selection.step
+
+def selectIndices(count: int, selection: slice) -> list:
+    """
+    Return the indices of range(count) in a selection, all of them for None.
+    """
+    return list(range(count)[checkSelection(selection) or slice(None)])
+
+def selectFilesByNumber(filenames: list, extract_number, selection: slice) -> list:
+    """
+    Keep the files whose number (e.g. the T number of the filename) is selected, out of the sorted unique numbers
+    of all the files. Files without a number (extract_number returns None or inf) are kept.
+
+    Parameters:
+    filenames (list): The filenames.
+    extract_number (callable): Function returning the number of a filename.
+    selection (slice): Positions to keep in the sorted unique numbers, None keeps every file.
+
+    Returns:
+    list: The selected filenames, in their original order.
+    """
+    if selection is None:
+        return list(filenames)
+    numbers = [extract_number(file) for file in filenames]
+    unique_numbers = sorted({number for number in numbers if number is not None and number != float('inf')})
+    selected_numbers = {unique_numbers[index] for index in selectIndices(len(unique_numbers), selection)}
+
+    return [file for file, number in zip(filenames, numbers)
+            if number is None or number == float('inf') or number in selected_numbers]
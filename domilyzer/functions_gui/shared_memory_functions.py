@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from domilyzer.functions_gui.ingest_functions import IngestTransform, readTiffImage
+from domilyzer.functions_gui.tracing_functions import PipelineTracer, traceSpan
+
+class SharedArrayBuffer:
+    """
+    Keep a shared memory segment mapped for as long as any NumPy view of it exists.
+
+    Arrays made with np.asarray(buffer) have this object as their base, so the segment is closed by garbage
+    collection once the last view is gone, never while a view is still in use.
+    """
+    def __init__(self, shared_memory: SharedMemory, shape: tuple, dtype: np.dtype):
+        self.shared_memory = shared_memory
+        address = np.frombuffer(shared_memory.buf, dtype=np.uint8).ctypes.data
+        self.__array_interface__ = {'data': (address, False), 'shape': tuple(shape), 'typestr': dtype.str, 'version': 3}
+
+class SharedArrayManager:
+    """
+    Create NumPy arrays in shared memory that worker processes can write into, so only a small descriptor
+    (segment name, shape, dtype) is pickled to and from the workers, not the pixel data.
+
+    The manager owns every segment it creates and unlinks them all on close, including when a worker
+    crashed part way through. Arrays handed out stay readable after close: the segment names are removed,
+    and the memory is released once the last NumPy view of it is gone.
+    """
+    def __init__(self):
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def createArray(self, shape: tuple, dtype) -> tuple:
+        """
+        Allocate a shared array.
+
+        Parameters:
+        shape (tuple): Shape of the array.
+        dtype: NumPy dtype of the array.
+
+        Returns:
+        tuple: The array (a view of the shared segment) and its descriptor for attachSharedArray.
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        shared_memory = SharedMemory(create=True, size=max(nbytes, 1))
+        self._segments.append(shared_memory)
+        array = np.asarray(SharedArrayBuffer(shared_memory, shape, dtype))
+        descriptor = {'name': shared_memory.name, 'shape': tuple(shape), 'dtype': dtype.str}
+
+        return array, descriptor
+
+    def close(self) -> None:
+        """
+        Unlink every segment created by the manager.
+        """
+        for shared_memory in self._segments:
+            try:
+                shared_memory.unlink()
+            except FileNotFoundError:
+                pass
+        # The mappings are closed by SharedArrayBuffer once the arrays handed out are garbage collected
+        self._segments = []
+
+def attachSharedArray(descriptor: dict) -> tuple:
+    """
+    Attach to a shared array created by a SharedArrayManager, e.g. in a worker process.
+
+    Parameters:
+    descriptor (dict): The descriptor returned by SharedArrayManager.createArray.
+
+    Returns:
+    tuple: The SharedMemory segment (close it when done writing) and the array view of it.
+    """
+    shared_memory = SharedMemory(name=descriptor['name'])
+    array = np.ndarray(descriptor['shape'], dtype=np.dtype(descriptor['dtype']), buffer=shared_memory.buf)
+
+    return shared_memory, array
+
+def readProjectIntoSharedArray(descriptor: dict,
+                               index: int,
+                               file_path: str,
+                               project_function,
+                               projection_type: str,
+                               imread_kwargs: dict,
+                               ingest_transform: IngestTransform = None,
+                               trace_start_time: float = None
+                               ) -> tuple:
+    """
+    Worker: read a TIFF stack, project it and write the plane into slot index of a shared array.
+
+    Parameters:
+    descriptor (dict): Descriptor of the shared output array.
+    index (int): Slot of the output array to write.
+    file_path (str): TIFF file to read.
+    project_function (callable): Module-level function called as project_function(image, projection_type).
+    projection_type (str): Type of projection ('max' or 'avg').
+    imread_kwargs (dict): Keyword arguments for tifffile.imread.
+    ingest_transform (IngestTransform): If given, the stack is cropped and binned as it is read.
+    trace_start_time (float): start_time of the parent's PipelineTracer. If given, the read and the projection are
+        recorded on the timeline of this worker process.
+
+    Returns:
+    tuple: The slot index, the number of bytes read and the trace events (empty without a trace), the only data sent
+        back to the parent.
+    """
+    tracer = PipelineTracer(start_time=trace_start_time) if trace_start_time is not None else None
+    with traceSpan(tracer, os.path.basename(file_path), 'read'):
+        image = readTiffImage(file_path, ingest_transform, **imread_kwargs)
+    shared_memory, output_array = attachSharedArray(descriptor)
+    try:
+        with traceSpan(tracer, os.path.basename(file_path), 'projection'):
+            output_array[index] = project_function(image, projection_type)
+    finally:
+        del output_array
+        shared_memory.close()
+
+    return index, image.nbytes, tracer.events if tracer is not None else []
+
+def projectFilesInProcesses(file_paths: list,
+                            project_function,
+                            projection_type: str,
+                            process_workers: int,
+                            imread_kwargs: dict = None,
+                            ingest_transform: IngestTransform = None,
+                            tracer: PipelineTracer = None
+                            ) -> tuple:
+    """
+    Read and Z-project each file in a pool of worker processes, writing the planes straight into a shared array.
+    The first file is projected in the calling process to find the shape and dtype of the planes.
+
+    Parameters:
+    file_paths (list): TIFF stacks to project, one output plane per file.
+    project_function (callable): Module-level projection function, called as project_function(image, projection_type).
+    projection_type (str): Type of projection ('max' or 'avg').
+    process_workers (int): Number of worker processes.
+    imread_kwargs (dict): Keyword arguments for tifffile.imread.
+    ingest_transform (IngestTransform): If given, each stack is cropped and binned as it is read, in the workers.
+    tracer (PipelineTracer): If given, every read and projection is recorded on the trace timeline, on the track of
+        the worker process that ran it.
+
+    Returns:
+    tuple: The projected planes as an array of shape (len(file_paths), Y, X), and the number of bytes read.
+    """
+    imread_kwargs = imread_kwargs or {}
+    with traceSpan(tracer, os.path.basename(file_paths[0]), 'read'):
+        first_image = readTiffImage(file_paths[0], ingest_transform, **imread_kwargs)
+    with traceSpan(tracer, os.path.basename(file_paths[0]), 'projection'):
+        first_plane = project_function(first_image, projection_type)
+    bytes_read = first_image.nbytes
+    del first_image
+
+    with SharedArrayManager() as shared_arrays:
+        planes, descriptor = shared_arrays.createArray((len(file_paths), *first_plane.shape), first_plane.dtype)
+        planes[0] = first_plane
+        # spawn: forking a process that runs reader threads is unsafe, and it matches Windows and macOS
+        with ProcessPoolExecutor(max_workers=process_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            trace_start_time = tracer.start_time if tracer is not None else None
+            futures = [executor.submit(readProjectIntoSharedArray, descriptor, index, file_path, project_function, projection_type, imread_kwargs,
+                                       ingest_transform, trace_start_time)
+                       for index, file_path in enumerate(file_paths) if index > 0]
+            try:
+                for future in as_completed(futures):
+                    # Re-raises worker errors, and BrokenProcessPool if a worker died
+                    _, file_bytes, events = future.result()
+                    bytes_read += file_bytes
+                    if tracer is not None:
+                        tracer.addEvents(events)
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    return planes, bytes_read
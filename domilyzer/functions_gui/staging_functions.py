@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+def getFolderManifest(folder_path: str) -> dict:
+    """
+    List every file below a folder with its size and modification time.
+
+    Parameters:
+    folder_path (str): Path to the folder.
+
+    Returns:
+    dict: A dictionary where keys are paths relative to the folder and values are [size in bytes, mtime in ns].
+    """
+    manifest = {}
+    for root, dirs, files in os.walk(folder_path):
+        for file in files:
+            file_path = os.path.join(root, file)
+            file_stat = os.stat(file_path)
+            manifest[os.path.relpath(file_path, folder_path)] = [file_stat.st_size, file_stat.st_mtime_ns]
+
+    return manifest
+
+class StagingCache:
+    """
+    Stage acquisition folders from an instrument share to a local scratch directory before conversion.
+
+    Each folder is copied with several files in flight at once, and later runs reuse the staged copy as long
+    as the file names, sizes and modification times on the share are unchanged. When the staged folders
+    exceed max_bytes, the least recently used ones are evicted. A folder larger than max_bytes is not staged
+    and is read directly from the share.
+
+    A staged folder is in use from stage() until release() is called with its staging name, the name of the
+    staged path, and is never evicted while in use, e.g. while another folder is staged during its conversion.
+
+    Parameters:
+    cache_dir (str): Local scratch directory holding the staged folders.
+    max_bytes (int): Maximum total size of the staged folders.
+    max_workers (int): Number of files copied in parallel.
+    """
+    index_filename = '!staging_index.json'
+
+    def __init__(self,
+                 cache_dir: str,
+                 max_bytes: int,
+                 max_workers: int = 8
+                 ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # Number of conversions using each staging name
+        self._in_use = collections.Counter()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.cache_dir, self.index_filename)
+
+    def loadIndex(self) -> dict:
+        """
+        Return the index of staged folders, keyed by staging name.
+        """
+        try:
+            with open(self.index_path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def saveIndex(self, index: dict) -> None:
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(index, file, indent=1)
+        os.replace(temporary_path, self.index_path)
+
+    def totalBytes(self) -> int:
+        """
+        Return the total size of all staged folders.
+        """
+        return sum(entry['bytes'] for entry in self.loadIndex().values())
+
+    def stage(self, folder_path: str) -> str:
+        """
+        Return a local copy of a folder, copying it into the cache if no up-to-date copy exists.
+
+        Parameters:
+        folder_path (str): Path to the acquisition folder on the share.
+
+        Returns:
+        str: Path to the staged copy, or folder_path if the folder does not fit in the cache. The copy is in use
+            until release(os.path.basename(staged_path)) is called.
+        """
+        manifest = getFolderManifest(folder_path)
+        folder_bytes = sum(size for size, _ in manifest.values())
+        if folder_bytes > self.max_bytes:
+            print(f"{os.path.basename(folder_path)} is larger than the staging cache, reading it from the source.")
+            return folder_path
+
+        # Key on the folder contents, so a folder moved on the share still hits its staged copy
+        manifest_hash = hashlib.sha1(json.dumps(sorted(manifest.items())).encode()).hexdigest()[:12]
+        staging_name = f"{os.path.basename(os.path.normpath(folder_path))}_{manifest_hash}"
+        staged_path = os.path.join(self.cache_dir, staging_name)
+
+        with self._lock:
+            self._in_use[staging_name] += 1
+            index = self.loadIndex()
+            if staging_name in index and os.path.isdir(staged_path):
+                index[staging_name]['last_used'] = time.time()
+                # Folders kept while they were in use may have been released since
+                self.evict(index, keep=staging_name)
+                self.saveIndex(index)
+                print(f"Using staged copy of {os.path.basename(folder_path)}.")
+                return staged_path
+
+        try:
+            self.copyFolder(folder_path, staged_path, list(manifest))
+        except BaseException:
+            self.release(staging_name)
+            raise
+
+        with self._lock:
+            index = self.loadIndex()
+            index[staging_name] = {'source': os.path.abspath(folder_path),
+                                   'bytes': folder_bytes,
+                                   'last_used': time.time()}
+            self.evict(index, keep=staging_name)
+            self.saveIndex(index)
+
+        return staged_path
+
+    def release(self, staging_name: str) -> None:
+        """
+        Mark one use of a staged folder as done, e.g. once it is converted, so the next stage() can evict it.
+
+        Parameters:
+        staging_name (str): Name of the staged folder, os.path.basename of the path returned by stage().
+        """
+        with self._lock:
+            if self._in_use[staging_name] <= 0:
+                raise ValueError(f"{staging_name} is not in use in the staging cache.")
+            self._in_use[staging_name] -= 1
+            if self._in_use[staging_name] == 0:
+                del self._in_use[staging_name]
+
+    def isInUse(self, staging_name: str) -> bool:
+        """
+        Return whether a staged folder is in use, between stage() and release().
+        """
+        return self._in_use[staging_name] > 0
+
+    def copyFolder(self, folder_path: str, staged_path: str, relative_paths: list) -> None:
+        """
+        Copy the listed files of a folder with several copies in flight, then move the copy into place.
+        """
+        partial_path = staged_path + '.partial'
+        shutil.rmtree(partial_path, ignore_errors=True)
+
+        def copyFile(relative_path):
+            destination_path = os.path.join(partial_path, relative_path)
+            os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+            shutil.copy2(os.path.join(folder_path, relative_path), destination_path)
+
+        os.makedirs(partial_path, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # list() re-raises the first copy error, if any
+            list(executor.map(copyFile, relative_paths))
+
+        shutil.rmtree(staged_path, ignore_errors=True)
+        os.replace(partial_path, staged_path)
+
+    def evict(self, index: dict, keep: str = None) -> None:
+        """
+        Remove least recently used folders from the cache until it fits in max_bytes. Folders in use are skipped,
+        so the cache can stay above max_bytes until they are released.
+
+        Parameters:
+        index (dict): The index of staged folders, updated in place.
+        keep (str): Staging name that must not be evicted.
+        """
+        total_bytes = sum(entry['bytes'] for entry in index.values())
+        for staging_name in sorted(index, key=lambda name: index[name]['last_used']):
+            if total_bytes <= self.max_bytes:
+                break
+            if staging_name == keep or self._in_use[staging_name] > 0:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, staging_name), ignore_errors=True)
+            total_bytes -= index.pop(staging_name)['bytes']
+            print(f"Evicted {staging_name} from the staging cache.")
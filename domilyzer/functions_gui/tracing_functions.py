@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+class PipelineTracer:
+    """
+    Record begin and end events of pipeline activity (folders, file reads, stages) on a shared timeline,
+    tagged with process and thread IDs, and export them in the Chrome trace event format.
+
+    The exported file opens in chrome://tracing or https://ui.perfetto.dev, with one track per thread,
+    so reader threads waiting on each other or folder workers sitting idle show up as gaps.
+
+    Parameters:
+    start_time (float): time.perf_counter() value of time 0 on the timeline. A tracer in a worker process is given
+        the start_time of the parent's tracer, so its events line up with the parent's once added with addEvents.
+    """
+    def __init__(self, start_time: float = None):
+        self.events = []
+        self._lock = threading.Lock()
+        self._named_threads = set()
+        self.start_time = start_time if start_time is not None else time.perf_counter()
+
+    def timestamp(self) -> float:
+        """
+        Return the time since the tracer was created, in microseconds.
+        """
+        return (time.perf_counter() - self.start_time) * 1e6
+
+    def addEvent(self, name: str, phase: str, category: str, args: dict = None) -> None:
+        """
+        Record one trace event on the calling thread.
+
+        Parameters:
+        name (str): Name of the event, e.g. the stage or file name.
+        phase (str): Chrome trace phase, 'B' for begin or 'E' for end.
+        category (str): Category of the event ('folder', 'read', 'stage', ...).
+        args (dict): Extra values shown with the event.
+        """
+        process_id, thread_id = os.getpid(), threading.get_ident()
+        event = {'name': name, 'cat': category, 'ph': phase, 'ts': self.timestamp(), 'pid': process_id, 'tid': thread_id}
+        if args:
+            event['args'] = args
+        with self._lock:
+            if (process_id, thread_id) not in self._named_threads:
+                # Label the thread's track with its name (e.g. read_ahead_0, folder_1)
+                self._named_threads.add((process_id, thread_id))
+                self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': process_id, 'tid': thread_id,
+                                    'args': {'name': threading.current_thread().name}})
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str = 'stage', args: dict = None):
+        """
+        Record a begin event, run the block, then record the matching end event, even if the block raises.
+        """
+        self.addEvent(name, 'B', category, args)
+        try:
+            yield
+        finally:
+            self.addEvent(name, 'E', category)
+
+    def addEvents(self, events: list) -> None:
+        """
+        Add events recorded elsewhere, e.g. by a tracer in a worker process. Each thread's track is labelled once.
+        """
+        with self._lock:
+            for event in events:
+                if event['ph'] == 'M':
+                    if (event['pid'], event['tid']) in self._named_threads:
+                        continue
+                    self._named_threads.add((event['pid'], event['tid']))
+                self.events.append(event)
+
+    def writeTrace(self, output_directory: str, trace_name: str = '!conversion_trace') -> str:
+        """
+        Write the recorded events as a Chrome trace / Perfetto JSON file.
+
+        Parameters:
+        output_directory (str): Directory to write the trace to, usually the processed images folder.
+        trace_name (str): File name of the trace, without extension.
+
+        Returns:
+        str: The path of the trace file.
+        """
+        trace_path = os.path.join(output_directory, f'{trace_name}.json')
+        with self._lock:
+            events = list(self.events)
+        with open(trace_path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+        return trace_path
+
+def traceSpan(tracer: PipelineTracer, name: str, category: str = 'stage', args: dict = None):
+    """
+    Return a span of the given tracer, or a context that does nothing if there is no tracer.
+    """
+    return tracer.span(name, category, args) if tracer is not None else nullcontext()
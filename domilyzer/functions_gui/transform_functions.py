@@ -0,0 +1,221 @@
+import json
+import tifffile
+import numpy as np
+
+TRANSFORM_LEVELS = ('plane', 'frame')
+
+def castToDtype(image: np.ndarray, dtype) -> np.ndarray:
+    """
+    Convert a corrected image back to the dtype of the raw image, rounding and clipping to the range of integer dtypes.
+    """
+    dtype = np.dtype(dtype)
+    if image.dtype == dtype:
+        return image
+    if np.issubdtype(dtype, np.integer):
+        if not np.issubdtype(image.dtype, np.integer):
+            image = np.round(image)
+        limits = np.iinfo(dtype)
+        image = np.clip(image, limits.min, limits.max)
+
+    return image.astype(dtype)
+
+def readReferenceImage(reference) -> np.ndarray:
+    """
+    Return a reference image (e.g. a dark frame) from an array or a TIFF file path. A stack of references, such as a
+    series of dark frames, is averaged into one (Y, X) plane.
+    """
+    image = tifffile.imread(reference) if isinstance(reference, str) else np.asarray(reference)
+    if image.ndim > 2:
+        image = image.reshape(-1, *image.shape[-2:]).mean(axis=0)
+
+    return image
+
+def getReferenceRegion(reference: np.ndarray, image: np.ndarray, rows: slice, columns: slice) -> np.ndarray:
+    """
+    Return the region of a reference image matching a plane cropped to rows and columns of the raw plane.
+    """
+    region = reference[rows, columns]
+    if region.shape != image.shape[-2:]:
+        raise ValueError(f"Reference image of shape {reference.shape} does not match the {image.shape[-1]} x "
+                         f"{image.shape[-2]} pixel images, it must have the shape of the raw camera planes.")
+    return region
+
+class DarkFrameSubtraction:
+    """
+    Subtract a dark frame, the camera offset and dark current recorded with the shutter closed. Integer images are
+    clipped at 0.
+
+    Parameters:
+    dark_frame (np.ndarray or str): The (Y, X) dark frame in the raw camera geometry, or the path of its TIFF file.
+    """
+    # Called with the rows and columns of the raw plane the image was cropped to
+    uses_region = True
+
+    def __init__(self, dark_frame):
+        self.dark_frame = readReferenceImage(dark_frame)
+
+    def __call__(self, image: np.ndarray, rows: slice = slice(None), columns: slice = slice(None)) -> np.ndarray:
+        dark_frame = getReferenceRegion(self.dark_frame, image, rows, columns)
+        return image.astype(np.result_type(image.dtype, np.float32)) - dark_frame
+
+class FlatFieldCorrection:
+    """
+    Divide by a flat field normalized to a mean of 1, to even out the illumination across the field of view. Pixels
+    where the flat field is 0 are left unchanged.
+
+    Parameters:
+    flat_field (np.ndarray or str): The (Y, X) flat field in the raw camera geometry, already dark-frame subtracted,
+        or the path of its TIFF file.
+    """
+    uses_region = True
+
+    def __init__(self, flat_field):
+        flat_field = readReferenceImage(flat_field).astype(np.float32)
+        # Normalized over the whole field of view, so a crop keeps the same correction
+        gain = flat_field / flat_field[flat_field > 0].mean()
+        self.gain = np.where(gain > 0, gain, 1).astype(np.float32)
+
+    def __call__(self, image: np.ndarray, rows: slice = slice(None), columns: slice = slice(None)) -> np.ndarray:
+        gain = getReferenceRegion(self.gain, image, rows, columns)
+        return image.astype(np.result_type(image.dtype, np.float32)) / gain
+
+class ClipValues:
+    """
+    Clip the values of an image to a range, e.g. to remove hot pixels above the camera's dynamic range.
+
+    Parameters:
+    minimum (float): Lowest value kept, None for no lower bound.
+    maximum (float): Highest value kept, None for no upper bound.
+    """
+    def __init__(self, minimum: float = None, maximum: float = None):
+        if minimum is None and maximum is None:
+            raise ValueError("Clipping needs a minimum, a maximum or both.")
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def __call__(self, image: np.ndarray) -> np.ndarray:
+        return np.clip(image, self.minimum, self.maximum)
+
+# Built-in transforms by name, for a config of transforms
+USER_TRANSFORMS = {'dark_frame': DarkFrameSubtraction,
+                   'flat_field': FlatFieldCorrection,
+                   'clip': ClipValues}
+
+def registerUserTransform(name: str, factory):
+    """
+    Register a transform by name, so configs can use it like the built-ins.
+
+    Parameters:
+    name (str): Name used in configs.
+    factory (callable): Called with the other keys of a config entry as keyword arguments, returns the transform.
+    """
+    USER_TRANSFORMS[name] = factory
+    return factory
+
+class UserTransforms:
+    """
+    Corrections applied to every image as it is read, like the crop and binning of an IngestTransform, so dark-frame
+    subtraction, flat-field correction or clipping come with the conversion's single pass over the raw files instead
+    of a second pass over the output.
+
+    Each transform is applied to the planes after they are cropped and before they are binned, stacked or projected,
+    and its result is converted back to the dtype of the raw images.
+
+    Parameters:
+    transforms (list): Callables applied in order, or (callable, level) pairs, see register.
+    """
+    def __init__(self, transforms: list = None):
+        self.transforms = []
+        for transform in transforms or []:
+            function, level = transform if isinstance(transform, tuple) else (transform, 'plane')
+            self.register(function, level)
+
+    def __len__(self) -> int:
+        return len(self.transforms)
+
+    def __repr__(self) -> str:
+        return f"UserTransforms({[getattr(function, '__name__', type(function).__name__) for function, _ in self.transforms]})"
+
+    @property
+    def has_frame_transforms(self) -> bool:
+        """
+        Whether any transform is called with the image of each file rather than each plane, see register.
+        """
+        return any(level == 'frame' for _, level in self.transforms)
+
+    def register(self, function, level: str = 'plane'):
+        """
+        Add a transform after the ones already registered.
+
+        Parameters:
+        function (callable): Takes an image and returns the corrected image of the same shape. Transforms with a
+            uses_region attribute are also given the rows and columns of the raw plane the image was cropped to.
+        level (str): 'plane' to call it with each (Y, X) plane, or 'frame' with the image of each file as read, a (Y, X)
+            plane or a (pages, Y, X) stack, e.g. to correct a whole Z-stack at once. The stack holds the pages kept by
+            the page selection, the same whether the engine reads the file or a LazyHyperstack indexes part of it.
+
+        Returns:
+        callable: The function, so register can be used as a decorator.
+        """
+        if not callable(function):
+            raise TypeError(f"Transform {function!r} is not callable.")
+        if level not in TRANSFORM_LEVELS:
+            raise ValueError(f"Invalid transform level '{level}'. Choose one of {TRANSFORM_LEVELS}.")
+        self.transforms.append((function, level))
+        return function
+
+    def apply(self, image: np.ndarray, rows: slice = slice(None), columns: slice = slice(None)) -> np.ndarray:
+        """
+        Apply the transforms in order to an image, keeping its shape and dtype.
+
+        Parameters:
+        image (np.ndarray): A (Y, X) plane or a (..., Y, X) stack.
+        rows (slice), columns (slice): Region of the raw plane the image was cropped to.
+
+        Returns:
+        np.ndarray: The corrected image.
+        """
+        dtype = image.dtype
+        for function, level in self.transforms:
+            kwargs = {'rows': rows, 'columns': columns} if getattr(function, 'uses_region', False) else {}
+            if level == 'frame' or image.ndim == 2:
+                corrected = np.asarray(function(image, **kwargs))
+            else:
+                corrected = np.stack([np.asarray(function(plane, **kwargs)) for plane in image.reshape(-1, *image.shape[-2:])])
+                corrected = corrected.reshape(image.shape[:-2] + corrected.shape[-2:])
+            if corrected.shape != image.shape:
+                raise ValueError(f"Transform {function!r} changed the image shape from {image.shape} to {corrected.shape}.")
+            image = castToDtype(corrected, dtype)
+
+        return image
+
+def createUserTransforms(config) -> UserTransforms:
+    """
+    Create the user transforms of a config, a list of entries such as
+    [{"transform": "dark_frame", "dark_frame": "dark.tif"}, {"transform": "clip", "maximum": 4095}].
+
+    Each entry names a built-in or registered transform, its other keys are passed to it, and an optional "level" key
+    gives its level ('plane' by default).
+
+    Parameters:
+    config (list or str): The entries, or the path of a JSON file holding them.
+
+    Returns:
+    UserTransforms: The transforms, or None for an empty config.
+    """
+    if isinstance(config, str):
+        with open(config) as file:
+            config = json.load(file)
+    if not config:
+        return None
+
+    user_transforms = UserTransforms()
+    for entry in config:
+        entry = dict(entry)
+        name = entry.pop('transform', None)
+        if name not in USER_TRANSFORMS:
+            raise ValueError(f"Invalid transform '{name}'. Choose one of {tuple(USER_TRANSFORMS)}.")
+        level = entry.pop('level', 'plane')
+        user_transforms.register(USER_TRANSFORMS[name](**entry), level)
+
+    return user_transforms
@@ -1,7 +1,11 @@
-from domilyzer.workflows.bruker_workflow import processBrukerImages
+from domilyzer.workflows.bruker_workflow import processBrukerImages, iterateBrukerImages, processBrukerFolder
 from domilyzer.workflows.flamingo_workflow import processFlamingoImages
-from domilyzer.workflows.olympus_workflow import processOlympusImages
+from domilyzer.workflows.olympus_workflow import processOlympusImages, iterateOlympusImages, processOlympusFolder
 
 __all__ = ["processBrukerImages",
+           "iterateBrukerImages",
+           "processBrukerFolder",
            "processFlamingoImages",
-           "processOlympusImages"]
\ No newline at end of file
+           "processOlympusImages",
+           "iterateOlympusImages",
+           "processOlympusFolder"]
\ No newline at end of file
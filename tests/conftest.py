@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from domilyzer.functions_gui.general_functions import createImageJMetadataTags
+
+@pytest.fixture
+def make_array():
+    def makeArray(shape, dtype=np.uint16, seed=0):
+        rng = np.random.default_rng(seed)
+        return (rng.random(shape) * 4000).astype(dtype)
+    return makeArray
+
+@pytest.fixture
+def hyperstack():
+    # Mostly dark fluorescence-like data: low background noise and a few bright regions
+    rng = np.random.default_rng(0)
+    hyperstack = rng.poisson(3, size=(2, 2, 2, 256, 1024)).astype(np.uint16)
+    hyperstack[..., 40:80, 100:300] += 2000
+    return hyperstack
+
+@pytest.fixture
+def hyperstack_parameters(hyperstack):
+    # Test modules override the hyperstack fixture for other shapes and layouts
+    lut = np.tile(np.arange(256, dtype='uint8'), (3, 1))
+    imagej_tags = createImageJMetadataTags(LUTs={'LUTs': [lut, lut]})
+    metadata = {'X_microns_per_pixel': 0.5, 'Y_microns_per_pixel': 0.5, 'framerate': 2.0}
+    return hyperstack, imagej_tags, metadata
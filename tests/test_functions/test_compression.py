@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import tifffile
+from domilyzer.functions_gui.general_functions import saveImageJHyperstack
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+from domilyzer.functions_gui.compression_functions import (
+    getAvailableCodecs,
+    getCompressionOptions,
+    chooseCompression
+)
+
+def test_zlib_is_always_available():
+    assert 'zlib' in getAvailableCodecs()
+
+@pytest.mark.parametrize('compression', ['zlib', 'zlib:1', 'lzw', 'zstd'])
+def test_compressed_output_round_trips(tmp_path, hyperstack_parameters, compression):
+    if compression.partition(':')[0] not in getAvailableCodecs():
+        pytest.skip(f'{compression} needs imagecodecs')
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    uncompressed_path, compressed_path = str(tmp_path / 'uncompressed.tif'), str(tmp_path / 'compressed.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), uncompressed_path, imagej_tags)
+    if compression == 'zstd':
+        # Only opens with Bio-Formats
+        with pytest.warns(UserWarning, match='stock Fiji'):
+            saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), compressed_path, imagej_tags, write_workers=2, compression=compression)
+    else:
+        saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), compressed_path, imagej_tags, write_workers=2, compression=compression)
+    
+    with tifffile.TiffFile(compressed_path) as compressed, tifffile.TiffFile(uncompressed_path) as uncompressed:
+        assert np.array_equal(compressed.asarray(), hyperstack)
+        assert compressed.series[0].axes == 'TZCYX'
+        assert compressed.imagej_metadata['finterval'] == metadata['framerate']
+        assert np.array_equal(compressed.imagej_metadata['LUTs'], uncompressed.imagej_metadata['LUTs'])
+        page = compressed.pages[0]
+        assert page.predictor == 2
+        # Pages are split into strips, which are compressed in parallel
+        assert len(page.dataoffsets) > 1
+        assert compressed.filehandle.size < uncompressed.filehandle.size / 2
+
+def test_compressed_output_from_scratch_array(tmp_path, hyperstack_parameters):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    scratch_hyperstack = createScratchArray(str(tmp_path), hyperstack.shape, hyperstack.dtype)
+    scratch_hyperstack[:] = hyperstack
+    output_path = str(tmp_path / 'compressed.tif')
+    
+    saveImageJHyperstack(scratch_hyperstack, 'TZCYX', dict(metadata), output_path, imagej_tags, compression='zlib')
+    
+    assert np.array_equal(tifffile.imread(output_path), hyperstack)
+
+def test_auto_compression_follows_storage_bandwidth(hyperstack_parameters):
+    hyperstack, _, _ = hyperstack_parameters
+    
+    # Very slow storage: the best ratio wins. Infinitely fast storage: compressing only costs time
+    assert chooseCompression(hyperstack, storage_bytes_per_second=1024) is not None
+    assert chooseCompression(hyperstack, storage_bytes_per_second=float('inf')) is None
+
+def test_auto_compression_output_opens(tmp_path, hyperstack_parameters):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    output_path = str(tmp_path / 'auto.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), output_path, imagej_tags, compression='auto')
+    
+    assert np.array_equal(tifffile.imread(output_path), hyperstack)
+
+def test_invalid_compression_raises():
+    with pytest.raises(ValueError):
+        getCompressionOptions('jpeg', np.uint16, (128, 128))
+    # Auto compression only picks codecs stock Fiji opens
+    with pytest.raises(ValueError):
+        chooseCompression(np.zeros((2, 8, 8), dtype=np.uint16), candidates=('zlib', 'zstd'))
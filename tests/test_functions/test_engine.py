@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pytest
+import tifffile
+from benchmarks.synthetic_data import generateBrukerFolder, generateOlympusFolder, generateFlamingoFolder
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack
+from domilyzer.functions_gui.flamingo_functions import FlamingoFileIndex
+from domilyzer.functions_gui.instrumentation_functions import StageTimer
+from domilyzer.functions_gui.kernel_functions import NUMBA_AVAILABLE
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.engine_functions import (READER_BACKENDS, FolderPlan, ReaderBackend, registerReaderBackend, getReaderBackend,
+                                                      projectPlan, convertFolder)
+
+def generateFolder(tmp_path, microscope_type):
+    if microscope_type == 'Bruker':
+        return generateBrukerFolder(str(tmp_path), 'bruker', T=3, Z=4, C=2, Y=24, X=32)
+    if microscope_type == 'Olympus':
+        return generateOlympusFolder(str(tmp_path), 'olympus', T=3, Z=4, C=2, Y=24, X=32)
+    return generateFlamingoFolder(str(tmp_path), 'flamingo', T=3, Z=4, C=2, Y=24, X=32)
+
+@pytest.mark.parametrize('microscope_type', ['Bruker', 'Olympus', 'Flamingo'])
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+def test_projection_paths_match(tmp_path, microscope_type, projection_type):
+    folder_path = generateFolder(tmp_path, microscope_type)
+    options = ConversionOptions(projection_type=projection_type, binning=2, z_selection=slice(1, None), test=True)
+    expected = convertFolder(folder_path, microscope_type, options=options, return_hyperstack=True).hyperstack
+
+    # Streamed stack by stack, projected in threads, and read and projected in worker processes where each stack is a file
+    for path_options, streaming in [(options, True), (options.replace(projection_workers=2), False),
+                                    (options.replace(process_workers=2, read_ahead=2), False)]:
+        result = convertFolder(folder_path, microscope_type, options=path_options, return_hyperstack=True, streaming=streaming)
+        assert result.hyperstack.dtype == expected.dtype
+        assert np.array_equal(result.hyperstack, expected)
+
+@pytest.mark.parametrize('microscope_type', ['Bruker', 'Flamingo'])
+def test_numba_kernels_are_opted_into(tmp_path, microscope_type):
+    folder_path = generateFolder(tmp_path, microscope_type)
+    options = ConversionOptions(projection_type='avg', test=True)
+    expected = convertFolder(folder_path, microscope_type, options=options, return_hyperstack=True).hyperstack
+
+    # The kernels only run when the options ask for them, which then needs Numba
+    for path_options in [options.replace(use_numba=True), options.replace(use_numba=True, process_workers=2)]:
+        if not NUMBA_AVAILABLE:
+            with pytest.raises(ImportError):
+                convertFolder(folder_path, microscope_type, options=path_options)
+            continue
+        assert np.array_equal(convertFolder(folder_path, microscope_type, options=path_options, return_hyperstack=True).hyperstack, expected)
+
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+def test_flamingo_projection_matches_sides(tmp_path, projection_type):
+    folder_path = generateFlamingoFolder(str(tmp_path), 'flamingo', T=3, Z=4, C=2, Y=16, X=24)
+    options = ConversionOptions(projection_type=projection_type, z_selection=slice(1, None), t_selection=slice(0, None, 2))
+    # Flamingo averages are float64, which ImageJ TIFF files cannot hold
+    output_directory = str(tmp_path) if projection_type == 'max' else None
+    result = convertFolder(folder_path, 'Flamingo', output_directory, options, return_hyperstack=True)
+
+    # Each side projected on its own, then the sides fused by their maximum and rotated
+    file_index = FlamingoFileIndex.fromFolder(folder_path)
+    reduction = np.max if projection_type == 'max' else np.mean
+    expected = np.stack([np.stack([np.rot90(np.max([reduction(tifffile.imread(os.path.join(folder_path, file))[1:], axis=0) for file in side_files], axis=0))
+                                   for side_files in file_index.getFrameChannelFiles(frame, file_index.channel_names)])
+                         for frame in [0, 2]])
+    assert result.hyperstack.dtype == (np.uint16 if projection_type == 'max' else np.float64)
+    assert result.hyperstack.tobytes() == expected.tobytes()
+    assert result.image_type == projection_type and result.metadata is None
+    if output_directory is None:
+        return
+
+    assert os.path.basename(result.output_path) == 'flamingo_MAX.tif'
+    with tifffile.TiffFile(result.output_path) as written:
+        assert written.series[0].axes == 'TCYX'
+        assert np.array_equal(written.asarray(), expected)
+
+def test_unprojected_hyperstack_in_memory_or_staged(tmp_path):
+    folder_path = generateBrukerFolder(str(tmp_path), 'bruker', T=3, Z=4, C=2, Y=24, X=32)
+    output_directory = tmp_path / 'output'
+    output_directory.mkdir()
+    scratch_directory = tmp_path / 'scratch'
+    scratch_directory.mkdir()
+
+    stage_timer = StageTimer()
+    in_memory = convertFolder(folder_path, 'Bruker', str(output_directory), ConversionOptions(binning=2, stage_timer=stage_timer),
+                              return_hyperstack=True)
+    assert type(in_memory.hyperstack) is np.ndarray
+    assert os.path.basename(in_memory.output_path) == 'bruker_raw.tif'
+    assert in_memory.image_type == 'multi_plane_multi_timepoint'
+    assert [stage for folder, stage in stage_timer.folder_stages if folder == 'bruker'] == ['metadata', 'listing', 'read', 'write']
+    written = tifffile.imread(in_memory.output_path)
+
+    staged = convertFolder(folder_path, 'Bruker', options=ConversionOptions(binning=2, scratch_directory=str(scratch_directory)),
+                           return_hyperstack=True)
+    assert isinstance(staged.hyperstack, np.memmap)
+    assert np.array_equal(written, staged.hyperstack)
+    assert np.array_equal(written, in_memory.hyperstack)
+
+def test_existing_output_is_kept_or_overwritten(tmp_path, capsys):
+    folder_path = generateBrukerFolder(str(tmp_path), 'bruker', T=2, Z=2, C=1, Y=8, X=8)
+    options = ConversionOptions(projection_type='max')
+    first = convertFolder(folder_path, 'Bruker', str(tmp_path), options)
+    assert first.processed and os.path.basename(first.output_path) == 'MAX_bruker_raw.tif'
+
+    kept = convertFolder(folder_path, 'Bruker', str(tmp_path), options, overwrite=False)
+    assert not kept.processed and kept.error == 'Already exists!' and kept.output_path is None
+    assert convertFolder(folder_path, 'Bruker', str(tmp_path), options).processed
+    assert 'Overwriting' in capsys.readouterr().out
+
+def test_registered_backend(tmp_path):
+    rng = np.random.default_rng(0)
+    stacks = [rng.integers(0, 4096, size=(3, 8, 10), dtype=np.uint16) for _ in range(4)]
+    paths = [str(tmp_path / f'side_{index}.tif') for index in range(4)]
+    for path, stack in zip(paths, stacks):
+        tifffile.imwrite(path, stack, photometric='minisblack')
+
+    # One timepoint of two channels, each plane fused from two illumination sides
+    def indexFolder(folder_path, ingest_transform, options):
+        plane_sources = {(0, z, c): [(paths[2 * c], z), (paths[2 * c + 1], z)] for z in range(3) for c in range(2)}
+        hyperstack = LazyHyperstack(plane_sources, (1, 3, 2), ingest_transform, cache_bytes=0)
+        return FolderPlan(hyperstack, 'synthetic', 'TCYX', options.projection_type)
+
+    backend = registerReaderBackend(ReaderBackend('Synthetic', indexFolder, lambda folder_path, options, log_details: None,
+                                                  average_dtype=np.float32, projection_function=np.fliplr))
+    try:
+        assert getReaderBackend('Synthetic') is backend
+        hyperstack = indexFolder(str(tmp_path), None, ConversionOptions()).hyperstack
+        for projection_type, reduction in [('max', np.max), ('avg', np.mean)]:
+            expected = np.stack([np.fliplr(np.maximum(reduction(stacks[2 * c], axis=0), reduction(stacks[2 * c + 1], axis=0)))
+                                 for c in range(2)])[np.newaxis]
+            projected = projectPlan(hyperstack, projection_type, backend, workers=2)
+            assert projected.dtype == (np.uint16 if projection_type == 'max' else np.float32)
+            assert np.array_equal(projected, expected.astype(projected.dtype))
+
+        result = convertFolder(str(tmp_path / 'synthetic'), 'Synthetic', str(tmp_path),
+                               ConversionOptions(projection_type='max', output_format='ome-zarr'))
+        assert result.output_path == str(tmp_path / 'MAX_synthetic_raw.ome.zarr') and os.path.isdir(result.output_path)
+        assert result.image_type == 'synthetic'
+    finally:
+        del READER_BACKENDS['Synthetic']
+
+    with pytest.raises(ValueError):
+        getReaderBackend('Synthetic')
+    with pytest.raises(ValueError):
+        convertFolder(str(tmp_path), 'Bruker', options=ConversionOptions(output_format='png'))
+    with pytest.raises(ValueError):
+        projectPlan(hyperstack, 'median', backend)
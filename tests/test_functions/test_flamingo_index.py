@@ -0,0 +1,66 @@
+import os
+import numpy as np
+from benchmarks.synthetic_data import generateFlamingoFolder
+from domilyzer.functions_gui.selection_functions import selectFilesByNumber
+from domilyzer.functions_gui.flamingo_functions import (FLAMINGO_FILENAME_FIELDS, FlamingoFileIndex, parseFilenamesFlamingo,
+                                                        getNumChannelsFlamingo, getNumFramesFlamingo, getNumZPlanesFlamingo,
+                                                        getNumIlluminationSidesFlamingo, getFrameNumberFlamingo,
+                                                        getFrameChannelFilesFlamingo)
+
+def flamingoFilename(t, c, side, p=366):
+    return f'S000_t{t:06d}_V000_R0000_X000_Y000_C{c:02d}_I{side}_D0_P{p:05d}.tif'
+
+def test_parse_filenames():
+    filenames = [flamingoFilename(t, c, side) for t in [3, 1] for c in [1, 0] for side in [0, 1]]
+    table = parseFilenamesFlamingo(filenames)
+    assert table.shape == (8, len(FLAMINGO_FILENAME_FIELDS))
+    assert table[0].tolist() == [0, 3, 0, 0, 0, 0, 1, 0, 0, 366]
+
+    # Filenames of different layouts are parsed one by one, missing fields are -1
+    irregular = filenames[:2] + ['S1_t12_V0_R0_X0_Y0_C2_I1_D0_P4.tif', 'S000_t000007_C03_notes.tif']
+    table = parseFilenamesFlamingo(irregular)
+    assert table[:2].tolist() == parseFilenamesFlamingo(filenames[:2]).tolist()
+    assert table[2].tolist() == [1, 12, 0, 0, 0, 0, 2, 1, 0, 4]
+    assert table[3].tolist() == [0, 7, -1, -1, -1, -1, 3, -1, -1, -1]
+    assert parseFilenamesFlamingo([]).shape == (0, len(FLAMINGO_FILENAME_FIELDS))
+
+    # The same table with the characters parsed at once as with one filename at a time (a shorter name forces it)
+    filenames = [flamingoFilename(t, c, side, 10) for t in range(2500) for c in range(2) for side in range(2)]
+    table = parseFilenamesFlamingo(filenames)
+    assert np.array_equal(table, parseFilenamesFlamingo(filenames + ['S1.tif'])[:-1])
+    assert table[-1].tolist() == [0, 2499, 0, 0, 0, 0, 1, 1, 0, 10]
+
+def test_file_index_queries():
+    filenames = [flamingoFilename(t, c, side) for t in [4, 0, 2] for c in [1, 0] for side in [1, 0]] + ['S000_notes.tif']
+    file_index = FlamingoFileIndex(filenames)
+    assert list(file_index) == filenames and len(file_index) == 13 and file_index[0] == filenames[0]
+    # Channels in order of first appearance, as written in the filenames
+    assert file_index.channel_names == ['01', '00']
+    assert (file_index.num_channels, file_index.num_frames, file_index.num_illumination_sides, file_index.num_z_planes) == (2, 3, 2, 366)
+    assert file_index.frames == [0, 2, 4]
+    assert getNumChannelsFlamingo(filenames) == (2, ['01', '00'])
+    assert getNumFramesFlamingo(file_index) == 3
+    assert getNumZPlanesFlamingo(filenames) == 366
+    assert getNumIlluminationSidesFlamingo(filenames) == 2
+
+    # Files of a frame by channel, sides in listing order
+    assert file_index.getFrameChannelFiles(2, ['00', '01']) == [[flamingoFilename(2, 0, 1), flamingoFilename(2, 0, 0)],
+                                                                [flamingoFilename(2, 1, 1), flamingoFilename(2, 1, 0)]]
+    assert file_index.getFrameChannelRows(0, ['01']) == [[4, 5]]
+    assert getFrameChannelFilesFlamingo(filenames, 4, 1, ['00']) == [[flamingoFilename(4, 0, 1), flamingoFilename(4, 0, 0)]]
+    assert file_index.getFrameChannelFiles(6, ['00']) == [[]]
+
+    # Same files as selectFilesByNumber, with the ones without a frame number kept
+    for selection in [None, slice(1, None), slice(None, None, 2), slice(5, None)]:
+        selected = file_index.selectFrames(selection)
+        assert list(selected) == selectFilesByNumber(filenames, getFrameNumberFlamingo, selection)
+        assert np.array_equal(selected.table, parseFilenamesFlamingo(list(selected)))
+    assert file_index.selectFrames(slice(1, 2)).getFrameChannelFiles(2, ['01']) == [[flamingoFilename(2, 1, 1), flamingoFilename(2, 1, 0)]]
+
+def test_file_index_from_folder(tmp_path):
+    folder_path = generateFlamingoFolder(str(tmp_path), 'flamingo', T=3, Z=4, C=2, Y=8, X=8)
+    open(os.path.join(folder_path, 'notes.txt'), 'w').close()
+    file_index = FlamingoFileIndex.fromFolder(folder_path)
+    # In listing order, like os.listdir
+    assert list(file_index) == [file for file in os.listdir(folder_path) if file.endswith('.tif') and file.startswith('S')]
+    assert (file_index.num_frames, file_index.num_channels, file_index.num_illumination_sides, file_index.num_z_planes) == (3, 2, 2, 4)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import tifffile
+from domilyzer.functions_gui.general_functions import saveImageJHyperstack
+from domilyzer.functions_gui.ingest_functions import binImage, getPixelCrop, IngestTransform, createIngestTransform
+from domilyzer.functions_gui.prefetch_functions import readTiffFiles
+
+@pytest.fixture
+def stack():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4096, size=(4, 65, 97), dtype=np.uint16)
+
+def test_bin_image():
+    plane = np.array([[1, 2, 10, 30, 7],
+                      [3, 5, 20, 40, 7],
+                      [9, 9, 9, 9, 9]], dtype=np.uint16)
+
+    # Leftover rows and columns are dropped, the mean is rounded half up
+    assert np.array_equal(binImage(plane, 2, 'sum'), np.array([[11, 100]], dtype=np.uint16))
+    assert np.array_equal(binImage(plane, 2, 'mean'), np.array([[3, 25]], dtype=np.uint16))
+    assert np.array_equal(binImage(plane, 2, 'max'), np.array([[5, 40]], dtype=np.uint16))
+    assert binImage(plane, 1, 'sum') is plane
+    # Sums saturate instead of wrapping around
+    assert binImage(np.full((2, 2), 60000, dtype=np.uint16), 2, 'sum')[0, 0] == 65535
+    # Leading axes are binned plane by plane
+    assert binImage(np.stack([plane, plane]), 2, 'max').shape == (2, 1, 2)
+    with pytest.raises(ValueError):
+        binImage(plane, 2, 'median')
+
+def test_pixel_crop():
+    assert getPixelCrop((1.9, 2, 3, 4)) == (1, 2, 3, 4)
+    metadata = {'X_microns_per_pixel': 0.5, 'Y_microns_per_pixel': 0.25}
+    assert getPixelCrop((10, 10, 5, 5), 'microns', metadata) == (20, 40, 10, 20)
+    with pytest.raises(ValueError):
+        getPixelCrop((10, 10, 5, 5), 'microns', None)
+    with pytest.raises(ValueError):
+        getPixelCrop((10, 10, 5, 5), 'inches', metadata)
+
+def test_create_ingest_transform():
+    assert createIngestTransform() is None
+    ingest_transform = createIngestTransform((5, 10, 40, 30), binning=3)
+    assert ingest_transform.getOutputShape((4, 65, 97)) == (4, 10, 13)
+    # The crop is clipped to the images
+    assert IngestTransform((90, 60, 40, 30)).getOutputShape((65, 97)) == (5, 7)
+    with pytest.raises(ValueError):
+        IngestTransform((100, 0, 10, 10)).getOutputShape((65, 97))
+    with pytest.raises(ValueError):
+        IngestTransform(binning=0)
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+@pytest.mark.parametrize('byteorder', ['<', '>'])
+def test_read_matches_apply(tmp_path, stack, compression, byteorder):
+    # Uncompressed files are read through a memory map, compressed ones decoded whole and cropped
+    path = str(tmp_path / 'stack.tif')
+    tifffile.imwrite(path, stack, photometric='minisblack', compression=compression, byteorder=byteorder)
+    ingest_transform = IngestTransform((5, 10, 40, 30), binning=2, binning_mode='mean')
+
+    image = ingest_transform.read(path)
+    assert not isinstance(image, np.memmap)
+    assert np.array_equal(image, ingest_transform.apply(stack))
+    assert np.array_equal(image, binImage(stack[:, 10:40, 5:45], 2, 'mean'))
+
+def test_read_tiff_files_with_transform(tmp_path, stack):
+    paths = []
+    for index, plane in enumerate(stack):
+        paths.append(str(tmp_path / f'plane_{index}.tif'))
+        tifffile.imwrite(paths[-1], plane)
+    ingest_transform = IngestTransform((0, 0, 50, 50), binning=2, binning_mode='max')
+
+    # Sequential reads and read-ahead reads give the same planes
+    for read_ahead in [0, 2]:
+        images = list(readTiffFiles(paths, read_ahead=read_ahead, ingest_transform=ingest_transform))
+        assert np.array_equal(np.stack(images), binImage(stack[:, :50, :50], 2, 'max'))
+
+def test_binned_pixel_size_written(tmp_path, stack):
+    metadata = {'X_microns_per_pixel': 0.5, 'Y_microns_per_pixel': 0.25, 'framerate': 1.0}
+    ingest_transform = IngestTransform(binning=2)
+    binned_metadata = ingest_transform.updateMetadata(metadata)
+    assert metadata['X_microns_per_pixel'] == 0.5
+    assert ingest_transform.updateMetadata(None) is None
+
+    path = str(tmp_path / 'binned.tif')
+    saveImageJHyperstack(ingest_transform.apply(stack), 'ZYX', binned_metadata, path)
+    with tifffile.TiffFile(path) as tif:
+        x_resolution, y_resolution = tif.pages[0].resolution
+    assert x_resolution == pytest.approx(1 / 1.0)
+    assert y_resolution == pytest.approx(1 / 0.5)
@@ -0,0 +1,111 @@
+import os
+import json
+import pytest
+import numpy as np
+from domilyzer.workflows.bruker_workflow import processBrukerImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.general_functions import createImageJMetadataTags
+from domilyzer.functions_gui.instrumentation_functions import StageTimer
+from domilyzer.functions_gui.tracing_functions import PipelineTracer
+
+@pytest.fixture
+def default_parameters():
+    folder_path = 'tests/test_data/bruker_multiplane'
+    image_folders = sorted([
+        folder for folder in os.listdir(folder_path)
+        if os.path.isdir(os.path.join(folder_path, folder))
+    ])
+
+    gray = np.tile(np.arange(256, dtype='uint8'), (3, 1))
+
+    return {
+        'folder_path': folder_path,
+        'image_folders': image_folders,
+        'log_details': {
+                    'Files Not Processed': [],
+                   'Files Processed': [],
+                   'Issues': [],
+                   'Other Notes': []
+                   },
+        'options': ConversionOptions(imagej_tags=createImageJMetadataTags(LUTs = {'LUTs': [gray, gray, gray, gray]}))
+        }
+
+def test_stage_timer_records_every_stage(default_parameters, tmp_path):
+    stage_timer = StageTimer()
+    log_details, _ = processBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                         image_folders=default_parameters['image_folders'],
+                                         processed_images_path=str(tmp_path),
+                                         metadata_csv_path=os.path.join(tmp_path, '!image_metadata.csv'),
+                                         options=default_parameters['options'].replace(projection_type='max', stage_timer=stage_timer),
+                                         log_details=default_parameters['log_details'])
+
+    assert log_details['Files Not Processed'] == []
+    records = stage_timer.getRecords()
+    for folder_name in default_parameters['image_folders']:
+        folder_stages = {record['stage']: record for record in records if record['folder'] == folder_name}
+        # Projected stacks are written straight into the hyperstack, there is no separate stack stage
+        assert list(folder_stages) == ['metadata', 'listing', 'read', 'projection', 'write']
+        assert folder_stages['read']['bytes_out'] == folder_stages['projection']['bytes_in']
+        assert folder_stages['write']['bytes_out'] > 0
+
+    json_path, csv_path = stage_timer.writeReport(str(tmp_path))
+    with open(json_path, 'r') as file:
+        report = json.load(file)
+    assert len(report['folders']) == len(records)
+    assert os.path.exists(csv_path)
+    assert 'projection' in stage_timer.formatSummaryTable()
+
+def test_memory_tracking_records_largest_copy():
+    stage_timer = StageTimer(track_memory=True)
+    try:
+        with stage_timer.stage('folder', 'read') as counters:
+            small = np.ones((64, 64), dtype=np.uint16)
+            counters['bytes_out'] = small.nbytes
+        with stage_timer.stage('folder', 'projection') as counters:
+            large = np.ones((16, 256, 256), dtype=np.float64)
+            projected = large.mean(axis=0).astype(np.uint16)
+            del large
+            counters['bytes_out'] = projected.nbytes
+    finally:
+        stage_timer.stopMemoryTracking()
+
+    records = {record['stage']: record for record in stage_timer.getRecords()}
+    assert records['projection']['stage_peak_bytes'] >= 16 * 256 * 256 * 8
+    assert records['read']['stage_peak_bytes'] < records['projection']['stage_peak_bytes']
+
+    folder_memory = stage_timer.getFolderMemory()['folder']
+    assert folder_memory['largest_stage'] == 'projection'
+    assert folder_memory['output_bytes'] == projected.nbytes
+    assert folder_memory['peak_to_output_ratio'] >= 8
+    assert 'projection' in stage_timer.formatMemoryTable()
+
+def test_trace_has_matched_events_per_thread(default_parameters, tmp_path):
+    tracer = PipelineTracer()
+    processBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                        image_folders=default_parameters['image_folders'],
+                        processed_images_path=str(tmp_path),
+                        metadata_csv_path=None,
+                        options=default_parameters['options'].replace(projection_type='max', test=True, read_ahead=2,
+                                                                      stage_timer=StageTimer(tracer=tracer)),
+                        log_details=default_parameters['log_details'])
+
+    with open(tracer.writeTrace(str(tmp_path)), 'r') as file:
+        events = json.load(file)['traceEvents']
+
+    # Every begin has a matching end on the same thread
+    open_spans = {}
+    for event in events:
+        if event['ph'] == 'B':
+            open_spans.setdefault(event['tid'], []).append(event['name'])
+        elif event['ph'] == 'E':
+            assert open_spans[event['tid']].pop() == event['name']
+    assert all(not spans for spans in open_spans.values())
+
+    begin_events = [event for event in events if event['ph'] == 'B']
+    assert {event['name'] for event in begin_events if event['cat'] == 'folder'} == set(default_parameters['image_folders'])
+    assert {event['cat'] for event in begin_events} == {'folder', 'stage', 'read', 'decode'}
+    # File reads run on the read-ahead threads, not the folder thread
+    read_threads = {event['tid'] for event in begin_events if event['cat'] == 'read'}
+    folder_threads = {event['tid'] for event in begin_events if event['cat'] == 'folder'}
+    assert read_threads.isdisjoint(folder_threads)
+    assert any(event['ph'] == 'M' and event['args']['name'].startswith('read_ahead') for event in events)
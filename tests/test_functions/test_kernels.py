@@ -0,0 +1,110 @@
+import os
+import numpy as np
+import pytest
+from domilyzer.functions_gui.kernel_functions import NUMBA_AVAILABLE, useNumba, projectStackInto, fuseSidesInto
+from domilyzer.functions_gui.bruker_functions import projectNumpyArraysBruker
+from domilyzer.functions_gui.flamingo_functions import mergeNumpyArrayIlluminationSidesFlamingo, zProject
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.engine_functions import convertFolder
+
+# The NumPy kernels always, the compiled ones when Numba is installed
+KERNELS = [False, pytest.param(True, marks=pytest.mark.skipif(not NUMBA_AVAILABLE, reason='numba is not installed'))]
+
+def test_use_numba():
+    # Opt-in only, installing Numba does not switch the kernels
+    assert useNumba() is False and useNumba(None) is False
+    assert useNumba(False) is False
+    if not NUMBA_AVAILABLE:
+        with pytest.raises(ImportError):
+            useNumba(True)
+
+@pytest.mark.parametrize('use_numba', KERNELS)
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16, np.float32])
+def test_project_stack_into(use_numba, projection_type, dtype, make_array):
+    stack = make_array((7, 33, 45), dtype)
+    # Bruker averages are rounded to uint16, Flamingo's are kept as floats
+    output_dtype = np.uint16 if projection_type == 'avg' else dtype
+    expected = np.max(stack, axis=0) if projection_type == 'max' else np.round(np.mean(stack, axis=0)).astype(np.uint16)
+    output = np.zeros((33, 45), dtype=output_dtype)
+
+    assert projectStackInto(stack, output, projection_type, use_numba=use_numba) is output
+    assert output.tobytes() == expected.tobytes()
+    float_output = np.zeros((33, 45), dtype=np.float64)
+    if projection_type == 'avg' and dtype != np.float32:
+        projectStackInto(stack, float_output, projection_type, use_numba=use_numba)
+        with pytest.deprecated_call():
+            assert float_output.tobytes() == zProject(stack, 'avg').tobytes()
+    with pytest.raises(ValueError):
+        projectStackInto(stack, output, 'median', use_numba=use_numba)
+
+@pytest.mark.parametrize('use_numba', KERNELS)
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+def test_project_stacks_into_hyperstack(use_numba, projection_type, make_array):
+    # T, C, Z, Y, X
+    hyperstack = make_array((3, 2, 5, 40, 30))
+    with pytest.deprecated_call():
+        expected = projectNumpyArraysBruker(hyperstack, 'multi_plane_multi_timepoint', projection_type)
+
+    # Each stack straight into its plane of the projected hyperstack
+    projected = np.zeros((3, 2, 40, 30), dtype=np.uint16)
+    for t in range(3):
+        for c in range(2):
+            projectStackInto(hyperstack[t, c], projected[t, c], projection_type, use_numba=use_numba)
+    assert np.array_equal(projected, expected)
+
+@pytest.mark.parametrize('use_numba', KERNELS)
+@pytest.mark.parametrize('side_shape', [(40, 30), (6, 40, 30)])
+@pytest.mark.parametrize('num_sides', [1, 2])
+def test_fuse_sides_into(use_numba, side_shape, num_sides, make_array):
+    side_images = [make_array(side_shape, seed=seed) for seed in range(num_sides)]
+    output = np.zeros((side_shape[1], side_shape[0], *side_shape[2:]), dtype=np.uint16)
+
+    fuseSidesInto(side_images, output, use_numba)
+    assert np.array_equal(output, np.rot90(np.max(side_images, axis=0)))
+    with pytest.raises(ValueError):
+        fuseSidesInto(side_images, np.zeros(side_shape[::-1], dtype=np.uint16) if len(side_shape) == 3 else output.T, use_numba)
+
+@pytest.mark.parametrize('use_numba', KERNELS)
+@pytest.mark.parametrize('projection, side_shape', [('max', (40, 30)), (None, (6, 40, 30))])
+def test_fuse_sides_into_matches_merged_sides(use_numba, projection, side_shape, make_array):
+    # Two frames of two channels with two sides each
+    filenames = [f'S000_t{frame:06d}_V000_R0000_X000_Y000_C0{channel}_I{side}_D0_P00006.tif'
+                 for frame in range(2) for channel in range(2) for side in range(2)]
+    images = [make_array(side_shape, seed=seed) for seed in range(len(filenames))]
+    with pytest.deprecated_call():
+        expected = mergeNumpyArrayIlluminationSidesFlamingo(images, filenames, 2, 2, ['00', '01'], projection)
+
+    fused = np.zeros((2, 2, side_shape[1], side_shape[0], *side_shape[2:]), dtype=np.uint16)
+    for frame in range(2):
+        for channel in range(2):
+            fuseSidesInto(images[4 * frame + 2 * channel: 4 * frame + 2 * channel + 2], fused[frame, channel], use_numba)
+    if projection is None:
+        # TZCYX, like the full hyperstacks of mergeNumpyArrayIlluminationSidesFlamingo
+        fused = np.moveaxis(fused, 3, 1)
+    assert np.array_equal(fused, expected)
+
+@pytest.mark.parametrize('use_numba', KERNELS)
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+def test_engine_projections_match_stored_arrays(use_numba, projection_type):
+    loaded_arrays = np.load(f'tests/assets/bruker_multiplane_{projection_type}_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    folder_path = 'tests/test_data/bruker_multiplane'
+    image_folders = sorted(folder for folder in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, folder)))
+    options = ConversionOptions(projection_type=projection_type, auto_metadata_extract=False, use_numba=use_numba, test=True)
+
+    assert len(image_folders) == len(known_arrays)
+    for folder_name, known_array in zip(image_folders, known_arrays):
+        result = convertFolder(os.path.join(folder_path, folder_name), 'Bruker', options=options, return_hyperstack=True)
+        assert result.hyperstack.dtype == known_array.dtype
+        assert np.array_equal(result.hyperstack, known_array), f"{folder_name} differs"
+
+def test_fuse_sides_into_scratch_array(tmp_path, make_array):
+    # Two channels with two unprojected sides each, fused into the channels of a disk-backed frame
+    side_images = [[make_array((6, 40, 30), seed=2 * channel + side) for side in range(2)] for channel in range(2)]
+    scratch = createScratchArray(str(tmp_path), (2, 40, 6, 30), np.uint16)
+
+    for channel, sides in enumerate(side_images):
+        fuseSidesInto(sides, scratch[channel])
+    assert np.array_equal(scratch, np.stack([np.rot90(np.max(sides, axis=0)) for sides in side_images]))
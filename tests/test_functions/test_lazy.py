@@ -0,0 +1,138 @@
+import os
+import numpy as np
+import pytest
+import tifffile
+from benchmarks.synthetic_data import generateBrukerFolder, generateOlympusFolder, generateFlamingoFolder
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack
+from domilyzer.functions_gui.ingest_functions import IngestTransform
+from domilyzer.functions_gui.general_functions import organizeFilesByChannel
+from domilyzer.functions_gui.bruker_functions import createLazyHyperstackBruker
+from domilyzer.functions_gui.olympus_functions import createLazyHyperstackOlympus, planStackGroupsOlympus, extractTNumber
+from domilyzer.functions_gui.flamingo_functions import (FlamingoFileIndex, getNumChannelsFlamingo, getNumFramesFlamingo,
+                                                        createLazyHyperstackFlamingo)
+
+def getBrukerChannelFilenames(folder_path):
+    tif_filenames = sorted(os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith('.tif'))
+    return organizeFilesByChannel(tif_filenames, 'Bruker')
+
+def makeStackFiles(tmp_path, num_files=3, shape=(4, 16, 12)):
+    rng = np.random.default_rng(0)
+    stacks = [rng.integers(0, 4096, size=shape, dtype=np.uint16) for _ in range(num_files)]
+    paths = []
+    for index, stack in enumerate(stacks):
+        paths.append(str(tmp_path / f'stack_{index}.tif'))
+        tifffile.imwrite(paths[-1], stack, photometric='minisblack')
+    return paths, stacks
+
+@pytest.mark.parametrize('ingest_transform', [None, IngestTransform(crop=(2, 3, 20, 12), binning=2, pages=slice(1, None))])
+def test_lazy_bruker_matches_files(tmp_path, ingest_transform):
+    folder_path = generateBrukerFolder(str(tmp_path), 'bruker', T=3, Z=4, C=2, Y=24, X=32)
+    channel_filenames = getBrukerChannelFilenames(folder_path)
+    # One cycle file per timepoint and channel, its pages are the Z planes
+    stacks = [[tifffile.imread(file, is_ome=False) for file in files] for files in channel_filenames.values()]
+    if ingest_transform is not None:
+        stacks = [[ingest_transform.apply(stack) for stack in channel_stacks] for channel_stacks in stacks]
+    expected = np.stack([np.stack(channel_stacks) for channel_stacks in stacks], axis=2)
+
+    hyperstack = createLazyHyperstackBruker(channel_filenames, ingest_transform)
+    assert hyperstack.shape == expected.shape and hyperstack.dtype == expected.dtype
+    assert hyperstack.axes == 'TZCYX' and hyperstack.ndim == 5 and len(hyperstack) == 3
+    assert np.array_equal(np.asarray(hyperstack), expected)
+    assert np.array_equal(np.stack(list(hyperstack.iteratePlanes())), expected.reshape(-1, *expected.shape[-2:]))
+
+def test_lazy_olympus_matches_files(tmp_path):
+    folder_path = generateOlympusFolder(str(tmp_path), 'olympus', T=3, Z=2, C=2, Y=16, X=20)
+    tif_filenames = [os.path.join(folder_path, file) for file in os.listdir(folder_path) if file.endswith('.tif')]
+    channel_filenames = organizeFilesByChannel(tif_filenames, 'Olympus')
+    for files in channel_filenames.values():
+        files.sort(key=extractTNumber)
+    # One file per plane, grouped into the stack of each frame and channel
+    stack_groups = planStackGroupsOlympus(channel_filenames, t_selection=slice(1, None))
+    channel_stacks = {}
+    for channel_name, matching_files, _ in stack_groups:
+        channel_stacks.setdefault(channel_name, []).append(np.stack([tifffile.imread(file, is_ome=False) for file in matching_files]))
+    expected = np.stack([np.stack(stacks) for stacks in channel_stacks.values()], axis=2)
+
+    hyperstack, image_type = createLazyHyperstackOlympus(channel_filenames, t_selection=slice(1, None))
+    assert image_type == 'multiplane_multiframe_raw'
+    assert hyperstack.shape == expected.shape
+    assert np.array_equal(hyperstack[...], expected)
+
+def test_lazy_flamingo_matches_files(tmp_path):
+    folder_path = generateFlamingoFolder(str(tmp_path), 'flamingo', T=2, Z=3, C=2, Y=16, X=24)
+    tif_filenames = sorted(file for file in os.listdir(folder_path) if file.endswith('.tif') and file.startswith('S'))
+    num_channels, channel_names = getNumChannelsFlamingo(tif_filenames)
+    num_frames = getNumFramesFlamingo(tif_filenames)
+    # The planes of a channel are the maximum of its illumination sides, upside down
+    file_index = FlamingoFileIndex(tif_filenames)
+    expected = np.stack([np.stack([np.flip(np.max([tifffile.imread(os.path.join(folder_path, file)) for file in side_files], axis=0), axis=1)
+                                   for side_files in file_index.getFrameChannelFiles(frame, channel_names)], axis=1)
+                         for frame in range(num_frames)])
+
+    hyperstack = createLazyHyperstackFlamingo(folder_path, tif_filenames, num_frames, num_channels, channel_names)
+    assert hyperstack.shape == expected.shape
+    assert np.array_equal(hyperstack[:], expected)
+    assert np.array_equal(hyperstack[1, :, 0], expected[1, :, 0])
+
+def test_slicing_matches_numpy(tmp_path):
+    paths, stacks = makeStackFiles(tmp_path, num_files=4)
+    # 2 timepoints of 2 channels, one file each
+    plane_sources = {(t, z, c): [(paths[2 * t + c], z)] for t in range(2) for z in range(4) for c in range(2)}
+    hyperstack = LazyHyperstack(plane_sources, (2, 4, 2))
+    expected = np.stack([np.stack(stacks[2 * t: 2 * t + 2], axis=1) for t in range(2)])
+
+    for key in [1, -1, (0, slice(None), 1), (slice(None), 2), (..., 3, slice(2, 9, 3)), (1, [3, 0, 3], ..., 5),
+                (np.int64(0), slice(None, None, -1), slice(None), slice(4, 8)), (slice(5, 1),)]:
+        assert np.array_equal(hyperstack[key], expected[key]), key
+        assert hyperstack[key].shape == expected[key].shape, key
+    for key in [2, (0, 4), (0, 0, 0, 0, 0, 0), (None, 0), (..., ..., 0)]:
+        with pytest.raises(IndexError):
+            hyperstack[key]
+
+def test_reads_only_indexed_pages(tmp_path):
+    paths, stacks = makeStackFiles(tmp_path)
+    plane_sources = {(t, z, 0): [(paths[t], z)] for t in range(3) for z in range(4)}
+    hyperstack = LazyHyperstack(plane_sources, (3, 4, 1))
+    assert hyperstack.pages_read == 0
+
+    assert np.array_equal(hyperstack[1, 2, 0], stacks[1][2])
+    assert hyperstack.pages_read == 1
+    assert np.array_equal(hyperstack[1, :, 0, :5], stacks[1][:, :5])
+    assert hyperstack.pages_read == 4
+    # Both cached
+    hyperstack[1]
+    assert hyperstack.pages_read == 4
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    paths, stacks = makeStackFiles(tmp_path)
+    plane_sources = {(t, z, 0): [(paths[t], z)] for t in range(3) for z in range(4)}
+    # Room for two decoded pages
+    hyperstack = LazyHyperstack(plane_sources, (3, 4, 1), cache_bytes=2 * stacks[0][0].nbytes)
+
+    hyperstack[0, 0]
+    hyperstack[0, 1]
+    hyperstack[0, 0]
+    hyperstack[0, 2]
+    assert hyperstack.pages_read == 3
+    # Page 1 was the least recently used, page 0 is still cached
+    hyperstack[0, 0]
+    assert hyperstack.pages_read == 3
+    hyperstack[0, 1]
+    assert hyperstack.pages_read == 4
+    # Larger than the cache, still returned whole
+    assert np.array_equal(hyperstack[2, :, 0], stacks[2])
+
+    hyperstack.clearCache()
+    hyperstack[0, 0]
+    assert hyperstack.pages_read == 9
+
+def test_combined_pages_and_missing_planes(tmp_path):
+    paths, stacks = makeStackFiles(tmp_path, num_files=2)
+    plane_sources = {(0, z, 0): [(paths[0], z), (paths[1], z)] for z in range(4)}
+    hyperstack = LazyHyperstack(plane_sources, (2, 4, 1), plane_function=np.flipud)
+
+    assert np.array_equal(hyperstack[0, :, 0], np.flip(np.maximum(stacks[0], stacks[1]), axis=1))
+    # Planes without sources are zeros
+    assert not hyperstack[1].any()
+    with pytest.raises(ValueError):
+        LazyHyperstack({}, (1, 1, 1))
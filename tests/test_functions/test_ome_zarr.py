@@ -0,0 +1,86 @@
+import os
+import json
+import numpy as np
+import pytest
+import tifffile
+from benchmarks.synthetic_data import generateFlamingoFolder
+from domilyzer.workflows.flamingo_workflow import processFlamingoImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.general_functions import createImageJMetadataTags
+from domilyzer.functions_gui.ome_zarr_functions import OmeZarrArray, saveOmeZarrHyperstack
+
+@pytest.fixture
+def luts():
+    red = np.zeros((3, 256), dtype='uint8')
+    red[0] = np.arange(256, dtype='uint8')
+    magenta = np.zeros((3, 256), dtype='uint8')
+    magenta[0] = np.arange(256, dtype='uint8')
+    magenta[2] = np.arange(256, dtype='uint8')
+    return [red, magenta]
+
+@pytest.fixture
+def hyperstack():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4096, size=(3, 5, 2, 40, 50), dtype=np.uint16)
+
+@pytest.mark.parametrize('compression', ['zlib', None])
+@pytest.mark.parametrize('write_workers', [0, 4])
+def test_ome_zarr_round_trips(tmp_path, hyperstack, luts, compression, write_workers):
+    output_name = str(tmp_path / 'image.ome.zarr')
+    
+    bytes_written = saveOmeZarrHyperstack(hyperstack, 'TZCYX', None, output_name, luts=luts,
+                                          chunks={'Z': 2, 'Y': 16, 'X': 32}, write_workers=write_workers, compression=compression)
+    
+    ome_zarr_array = OmeZarrArray(os.path.join(output_name, '0'))
+    assert ome_zarr_array.chunks == (1, 1, 2, 16, 32)
+    # Stored in OME-NGFF TCZYX order, with partial chunks at the edges
+    assert np.array_equal(ome_zarr_array.read(), hyperstack.transpose(0, 2, 1, 3, 4))
+    assert os.path.exists(os.path.join(output_name, '0', '2', '1', '2', '2', '1'))
+    assert bytes_written > 0
+
+def test_ome_zarr_metadata(tmp_path, hyperstack, luts):
+    output_name = str(tmp_path / 'image.ome.zarr')
+    metadata = {'X_microns_per_pixel': 0.266, 'Y_microns_per_pixel': 0.266, 'Z_microns_per_pixel': 1.0, 'framerate': 2.5}
+    
+    saveOmeZarrHyperstack(hyperstack, 'TZCYX', metadata, output_name, luts=luts)
+    
+    with open(os.path.join(output_name, '.zattrs'), 'r') as file:
+        attributes = json.load(file)
+    multiscale = attributes['multiscales'][0]
+    assert [axis['name'] for axis in multiscale['axes']] == ['t', 'c', 'z', 'y', 'x']
+    assert multiscale['datasets'][0]['coordinateTransformations'][0]['scale'] == [2.5, 1.0, 1.0, 0.266, 0.266]
+    assert [channel['color'] for channel in attributes['omero']['channels']] == ['FF0000', 'FF00FF']
+
+def test_chunks_written_by_separate_writers(tmp_path, hyperstack):
+    output_name = str(tmp_path / 'image.ome.zarr')
+    saveOmeZarrHyperstack(np.zeros_like(hyperstack), 'TZCYX', None, output_name)
+    
+    # Each worker opens the array itself and writes its own timepoints
+    ome_hyperstack = hyperstack.transpose(0, 2, 1, 3, 4)
+    for frame in range(ome_hyperstack.shape[0]):
+        ome_zarr_array = OmeZarrArray(os.path.join(output_name, '0'))
+        for channel in range(ome_hyperstack.shape[1]):
+            for z in range(ome_hyperstack.shape[2]):
+                ome_zarr_array.writeChunk((frame, channel, z, 0, 0), ome_hyperstack[frame, channel, z])
+    
+    assert np.array_equal(OmeZarrArray(os.path.join(output_name, '0')).read(), ome_hyperstack)
+
+def test_ome_zarr_readable_by_zarr(tmp_path, hyperstack):
+    zarr = pytest.importorskip('zarr')
+    output_name = str(tmp_path / 'image.ome.zarr')
+    
+    saveOmeZarrHyperstack(hyperstack, 'TZCYX', None, output_name, chunks={'Y': 16, 'X': 32})
+    
+    assert np.array_equal(zarr.open(os.path.join(output_name, '0'), mode='r')[:], hyperstack.transpose(0, 2, 1, 3, 4))
+
+def test_flamingo_workflow_ome_zarr_output(tmp_path, luts):
+    folder_path = generateFlamingoFolder(str(tmp_path), 'flamingo', T=2, Z=3, C=2, Y=16, X=24)
+    imagej_tags = createImageJMetadataTags(LUTs={'LUTs': luts})
+    
+    options = ConversionOptions(imagej_tags=imagej_tags)
+    processFlamingoImages(folder_path, options)
+    processFlamingoImages(folder_path, options.replace(output_format='ome-zarr', luts=luts, write_workers=2))
+    
+    tiff_hyperstack = tifffile.imread(os.path.join(folder_path, 'flamingo_hyperstack.tif'))
+    ome_zarr_array = OmeZarrArray(os.path.join(folder_path, 'flamingo_hyperstack.ome.zarr', '0'))
+    assert np.array_equal(ome_zarr_array.read(), tiff_hyperstack.transpose(0, 2, 1, 3, 4))
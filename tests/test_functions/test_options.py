@@ -0,0 +1,32 @@
+import os
+import pytest
+from benchmarks.synthetic_data import generateOlympusFolder
+from domilyzer.functions_gui.options_functions import ConversionOptions, getConversionOptions
+from domilyzer.workflows.olympus_workflow import iterateOlympusImages
+
+def test_replace_copies_options():
+    options = ConversionOptions(projection_type='max', read_ahead=2)
+    replaced = options.replace(projection_type='avg', binning=2)
+
+    assert (replaced.projection_type, replaced.binning, replaced.read_ahead) == ('avg', 2, 2)
+    assert (options.projection_type, options.binning) == ('max', 1)
+    assert repr(replaced) == "ConversionOptions(projection_type='avg', read_ahead=2, binning=2)"
+    assert getConversionOptions(options) is options
+    assert repr(getConversionOptions()) == "ConversionOptions()"
+    with pytest.raises(TypeError):
+        options.replace(projection='max')
+
+def test_writer_options_follow_output_format():
+    options = ConversionOptions(write_workers=2, compression='zlib', luts=['lut'])
+    assert options.getWriterOptions() == options.getTiffWriterOptions()
+    assert options.getWriterOptions()['compression'] == 'zlib'
+    assert options.replace(output_format='ome-zarr').getWriterOptions() == {'luts': ['lut'], 'zarr_chunks': None, 'write_workers': 2}
+
+def test_olympus_folder_error_is_returned(tmp_path):
+    generateOlympusFolder(str(tmp_path), 'synthetic', T=2, Z=2, C=1, Y=8, X=8)
+    os.remove(os.path.join(tmp_path, 'synthetic.oif'))
+
+    # The missing .oif file stops its folder only, the error is on the result
+    [result] = iterateOlympusImages(str(tmp_path), str(tmp_path), ConversionOptions(projection_type='max', test=True))
+    assert not result.processed
+    assert result.name == 'synthetic.oif.files' and 'No .oif file' in result.error
@@ -0,0 +1,43 @@
+import os
+import numpy as np
+from benchmarks.synthetic_data import generateFlamingoFolder
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+from domilyzer.functions_gui.general_functions import saveImageJHyperstack, createImageJMetadataTags
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.engine_functions import convertFolder
+
+def test_scratch_array_leaves_no_files(tmp_path):
+    hyperstack = createScratchArray(str(tmp_path), (2, 3, 2, 8, 8), np.uint16)
+    hyperstack[1, 2, 1] = 7
+    
+    assert hyperstack.shape == (2, 3, 2, 8, 8) and hyperstack.dtype == np.uint16
+    assert hyperstack.sum() == 7 * 64
+    # The backing file is anonymous, nothing is left in the scratch directory
+    assert os.listdir(tmp_path) == []
+
+def test_memmap_write_matches_in_memory_write(tmp_path):
+    rng = np.random.default_rng(0)
+    hyperstack = rng.integers(0, 4096, size=(2, 3, 2, 16, 24), dtype=np.uint16)
+    scratch_hyperstack = createScratchArray(str(tmp_path), hyperstack.shape, hyperstack.dtype)
+    scratch_hyperstack[:] = hyperstack
+    imagej_tags = createImageJMetadataTags(LUTs={'LUTs': [np.zeros((3, 256), dtype='uint8')]})
+    metadata = {'X_microns_per_pixel': 0.5, 'Y_microns_per_pixel': 0.5, 'Z_step': 1.0, 'framerate': 2.0}
+    
+    in_memory_path, out_of_core_path = str(tmp_path / 'in_memory.tif'), str(tmp_path / 'out_of_core.tif')
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), in_memory_path, imagej_tags)
+    saveImageJHyperstack(scratch_hyperstack, 'TZCYX', dict(metadata), out_of_core_path, imagej_tags)
+    
+    with open(in_memory_path, 'rb') as in_memory_file, open(out_of_core_path, 'rb') as out_of_core_file:
+        assert in_memory_file.read() == out_of_core_file.read()
+
+def test_flamingo_out_of_core_matches_in_memory(tmp_path):
+    folder_path = generateFlamingoFolder(str(tmp_path), 'flamingo', T=2, Z=3, C=2, Y=16, X=24)
+    scratch_directory = tmp_path / 'scratch'
+    scratch_directory.mkdir()
+    
+    in_memory = convertFolder(folder_path, 'Flamingo', options=ConversionOptions(), return_hyperstack=True).hyperstack
+    out_of_core = convertFolder(folder_path, 'Flamingo', options=ConversionOptions(scratch_directory=str(scratch_directory), read_ahead=2),
+                                return_hyperstack=True).hyperstack
+    
+    assert isinstance(out_of_core, np.memmap) and not isinstance(in_memory, np.memmap)
+    assert np.array_equal(out_of_core, in_memory)
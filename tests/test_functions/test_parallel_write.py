@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+import tifffile
+from domilyzer.functions_gui.general_functions import (
+    saveImageJHyperstack,
+    createImageJMetadataTags,
+    createImageJHyperstackFile,
+    NATIVE_BYTEORDER
+)
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+
+@pytest.fixture
+def hyperstack():
+    rng = np.random.default_rng(0)
+    # Transposed like the Olympus TZCYX hyperstacks, so the planes are not contiguous
+    return rng.integers(0, 4096, size=(3, 2, 4, 16, 24), dtype=np.uint16).transpose(0, 2, 1, 3, 4)
+
+def readImageJFile(path):
+    with tifffile.TiffFile(path) as tif:
+        return tif.asarray(), tif.series[0].axes, tif.imagej_metadata, tif.pages[0].resolution, tif.byteorder
+
+def assertSameImageJFile(path, expected_path):
+    data, axes, imagej_metadata, resolution, byteorder = readImageJFile(path)
+    expected_data, expected_axes, expected_imagej_metadata, expected_resolution, expected_byteorder = readImageJFile(expected_path)
+    
+    assert np.array_equal(data, expected_data)
+    assert (axes, resolution, byteorder) == (expected_axes, expected_resolution, expected_byteorder)
+    assert np.array_equal(imagej_metadata.pop('LUTs'), expected_imagej_metadata.pop('LUTs'))
+    assert imagej_metadata == expected_imagej_metadata
+
+@pytest.mark.parametrize('write_workers', [1, 3, 64])
+def test_parallel_write_matches_serial_write(tmp_path, hyperstack_parameters, write_workers):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    serial_path, parallel_path = str(tmp_path / 'serial.tif'), str(tmp_path / 'parallel.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), serial_path, imagej_tags)
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), parallel_path, imagej_tags, write_workers=write_workers)
+    
+    assertSameImageJFile(parallel_path, serial_path)
+
+def test_parallel_write_from_scratch_array(tmp_path, hyperstack_parameters):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    scratch_hyperstack = createScratchArray(str(tmp_path), hyperstack.shape, hyperstack.dtype)
+    scratch_hyperstack[:] = hyperstack
+    serial_path, parallel_path = str(tmp_path / 'serial.tif'), str(tmp_path / 'parallel.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', None, serial_path, imagej_tags)
+    saveImageJHyperstack(scratch_hyperstack, 'TZCYX', None, parallel_path, imagej_tags, write_workers=2)
+    
+    assertSameImageJFile(parallel_path, serial_path)
+
+def test_preallocated_file_can_be_reopened_for_writing(tmp_path, hyperstack_parameters):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    output_path = str(tmp_path / 'preallocated.tif')
+    output_hyperstack = createImageJHyperstackFile(output_path, hyperstack.shape, hyperstack.dtype, 'TZCYX', metadata, imagej_tags)
+    output_hyperstack[0] = hyperstack[0]
+    output_hyperstack.flush()
+    del output_hyperstack
+    
+    # Another writer, e.g. a worker process, opens the same file and fills the remaining frames
+    reopened_hyperstack = tifffile.memmap(output_path)
+    reopened_hyperstack[1:] = hyperstack[1:]
+    reopened_hyperstack.flush()
+    del reopened_hyperstack
+    
+    assert np.array_equal(tifffile.imread(output_path), hyperstack)
+
+def test_native_byteorder_by_default(tmp_path, hyperstack_parameters):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    output_path = str(tmp_path / 'native.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), output_path, imagej_tags)
+    
+    data, axes, imagej_metadata, _, byteorder = readImageJFile(output_path)
+    assert byteorder == NATIVE_BYTEORDER
+    assert np.array_equal(data, hyperstack)
+    assert len(imagej_metadata['LUTs']) == 2
+
+@pytest.mark.parametrize('byteorder', ['<', '>'])
+def test_selectable_byteorder(tmp_path, hyperstack_parameters, byteorder):
+    hyperstack, _, metadata = hyperstack_parameters
+    lut = np.tile(np.arange(256, dtype='uint8'), (3, 1))
+    imagej_tags = createImageJMetadataTags(LUTs={'LUTs': [lut, lut]}, byteorder=byteorder)
+    output_path = str(tmp_path / 'selected.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), output_path, imagej_tags, byteorder=byteorder)
+    
+    data, _, imagej_metadata, _, file_byteorder = readImageJFile(output_path)
+    assert file_byteorder == byteorder
+    assert np.array_equal(data, hyperstack)
+    assert np.array_equal(imagej_metadata['LUTs'][1], lut)
+    assert imagej_metadata['finterval'] == metadata['framerate']
+
+def test_mismatched_tag_byteorder_raises(tmp_path, hyperstack_parameters):
+    hyperstack, _, metadata = hyperstack_parameters
+    other_byteorder = '>' if NATIVE_BYTEORDER == '<' else '<'
+    imagej_tags = createImageJMetadataTags(LUTs={'LUTs': [np.zeros((3, 256), dtype='uint8')]}, byteorder=other_byteorder)
+    
+    with pytest.raises(ValueError):
+        saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), str(tmp_path / 'mismatch.tif'), imagej_tags)
@@ -0,0 +1,69 @@
+import os
+import pytest
+import numpy as np
+from benchmarks.synthetic_data import generateBrukerFolder, generateOlympusFolder, generateFlamingoFolder
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.engine_functions import convertFolder
+from domilyzer.functions_gui.planning_functions import planConversion
+
+def generateFolder(tmp_path, microscope_type):
+    if microscope_type == 'Bruker':
+        return generateBrukerFolder(str(tmp_path), 'bruker', T=4, Z=5, C=2, Y=24, X=32)
+    if microscope_type == 'Olympus':
+        return generateOlympusFolder(str(tmp_path), 'olympus', T=4, Z=5, C=2, Y=24, X=32)
+    return generateFlamingoFolder(str(tmp_path), 'flamingo', T=4, Z=5, C=2, Y=24, X=32)
+
+@pytest.mark.parametrize('folder_path, projection_type, single_plane, asset_name', [
+    ('tests/test_data/bruker_multiplane', None, False, 'bruker_multiplane'),
+    ('tests/test_data/bruker_multiplane', 'max', False, 'bruker_multiplane_max'),
+    ('tests/test_data/bruker_multiplane', 'avg', False, 'bruker_multiplane_avg'),
+    ('tests/test_data/bruker_singleplane', None, True, 'bruker_singleplane'),
+])
+def test_bruker_plan_matches_converted_arrays(folder_path, projection_type, single_plane, asset_name):
+    loaded_arrays = np.load(f'tests/assets/{asset_name}_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+
+    conversion_plan = planConversion(parent_folder_path=folder_path,
+                                     microscope_type='Bruker',
+                                     projection_type=projection_type,
+                                     single_plane=single_plane)
+
+    assert len(conversion_plan) == len(known_arrays)
+    for folder_plan, known_array in zip(conversion_plan, known_arrays):
+        assert folder_plan['shape'] == known_array.shape
+        assert folder_plan['output_bytes'] == known_array.nbytes
+        assert folder_plan['warnings'] == []
+
+def test_olympus_plan_matches_converted_arrays():
+    loaded_arrays = np.load('tests/assets/olympus_noProject_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+
+    # The assets hold the arrays of the first folders only, in the sorted order the workflow processes them
+    image_folders = sorted([folder for folder in os.listdir('tests/test_data/olympus')
+                            if os.path.isdir(os.path.join('tests/test_data/olympus', folder))])[:len(known_arrays)]
+    conversion_plan = planConversion(parent_folder_path='tests/test_data/olympus',
+                                     microscope_type='Olympus',
+                                     projection_type=None,
+                                     image_folders=image_folders)
+
+    assert len(conversion_plan) == len(known_arrays)
+    for folder_plan, known_array in zip(conversion_plan, known_arrays):
+        assert folder_plan['shape'] == known_array.shape
+        assert folder_plan['estimated_seconds'] > 0
+
+@pytest.mark.parametrize('microscope_type', ['Bruker', 'Olympus', 'Flamingo'])
+@pytest.mark.parametrize('projection_type', [None, 'max'])
+@pytest.mark.parametrize('crop_unit', ['pixels', 'microns'])
+def test_plan_follows_crop_binning_and_selections(tmp_path, microscope_type, projection_type, crop_unit):
+    if microscope_type == 'Flamingo' and crop_unit == 'microns':
+        pytest.skip('Flamingo folders have no pixel size')
+    folder_path = generateFolder(tmp_path, microscope_type)
+    options = ConversionOptions(projection_type=projection_type, crop=(2, 3, 21, 15), crop_unit=crop_unit, binning=2,
+                                z_selection=slice(1, None, 2), t_selection=slice(1, None), test=True)
+    hyperstack = convertFolder(folder_path, microscope_type, options=options, return_hyperstack=True).hyperstack
+
+    # Flamingo runs are planned from the acquisition folder, the others from their parent folder
+    parent_folder_path = folder_path if microscope_type == 'Flamingo' else str(tmp_path)
+    [folder_plan] = planConversion(parent_folder_path, microscope_type, projection_type, options=options)
+    assert folder_plan['shape'] == hyperstack.shape
+    assert folder_plan['output_bytes'] == hyperstack.nbytes
@@ -0,0 +1,59 @@
+import os
+import time
+import pytest
+import tifffile
+import numpy as np
+from domilyzer.functions_gui.prefetch_functions import (
+    ReadAheadPrefetcher,
+    readFileBytes,
+    readTiffFiles
+)
+
+@pytest.fixture
+def tif_file_paths(tmp_path):
+    file_paths = []
+    for i in range(12):
+        file_path = os.path.join(tmp_path, f'image_{i:03d}.tif')
+        tifffile.imwrite(file_path, np.full((3, 16, 16), i, dtype='uint16'), photometric='minisblack')
+        file_paths.append(file_path)
+    return file_paths
+
+def slowReadFileBytes(file_path):
+    # Simulate the per-file latency of a network share
+    time.sleep(0.05)
+    return readFileBytes(file_path)
+
+def test_prefetcher_preserves_file_order(tif_file_paths):
+    prefetcher = ReadAheadPrefetcher(tif_file_paths, read_ahead=4, read_function=slowReadFileBytes)
+    read_paths = [file_path for file_path, _ in prefetcher]
+
+    assert read_paths == tif_file_paths
+
+def test_read_tiff_files_matches_sequential_read(tif_file_paths):
+    known_arrays = [tifffile.imread(file_path) for file_path in tif_file_paths]
+    prefetched_arrays = list(readTiffFiles(tif_file_paths, read_ahead=4, read_function=slowReadFileBytes))
+
+    for i, (arr1, arr2) in enumerate(zip(prefetched_arrays, known_arrays)):
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+def test_read_ahead_hides_latency(tif_file_paths):
+    start_time = time.perf_counter()
+    list(readTiffFiles(tif_file_paths, read_ahead=0, read_function=slowReadFileBytes))
+    sequential_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    list(readTiffFiles(tif_file_paths, read_ahead=6, read_function=slowReadFileBytes))
+    prefetched_time = time.perf_counter() - start_time
+
+    assert prefetched_time < sequential_time / 2
+
+def test_prefetcher_respects_byte_budget(tif_file_paths):
+    file_size = os.path.getsize(tif_file_paths[0])
+    prefetcher = ReadAheadPrefetcher(tif_file_paths,
+                                     read_ahead=8,
+                                     max_buffer_bytes=3 * file_size,
+                                     read_function=slowReadFileBytes)
+    for _ in prefetcher:
+        assert prefetcher.buffered_bytes <= 3 * file_size
+
+    assert prefetcher.peak_buffered_bytes <= 3 * file_size
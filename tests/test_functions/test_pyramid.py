@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+import tifffile
+from domilyzer.functions_gui.general_functions import saveImageJHyperstack
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+from domilyzer.functions_gui.pyramid_functions import binPlane, getPyramidLevelShapes
+
+@pytest.fixture
+def hyperstack():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4096, size=(2, 3, 2, 65, 97), dtype=np.uint16)
+
+def test_bin_plane():
+    plane = np.array([[1, 2, 10, 30, 7],
+                      [3, 5, 20, 40, 7],
+                      [9, 9, 9, 9, 9]], dtype=np.uint16)
+    
+    # The odd last row and column are dropped, the mean is rounded half up
+    assert np.array_equal(binPlane(plane, 'mean'), np.array([[3, 25]], dtype=np.uint16))
+    assert np.array_equal(binPlane(plane, 'max'), np.array([[5, 40]], dtype=np.uint16))
+    assert binPlane(plane, 'mean').dtype == np.uint16
+    with pytest.raises(ValueError):
+        binPlane(plane, 'median')
+
+def test_pyramid_level_shapes():
+    assert getPyramidLevelShapes((65, 97), 3) == [(32, 48), (16, 24), (8, 12)]
+    # Levels stop before a dimension would be empty
+    assert getPyramidLevelShapes((5, 97), 4) == [(2, 48), (1, 24)]
+
+@pytest.mark.parametrize('pyramid_binning', ['mean', 'max'])
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_pyramid_output(tmp_path, hyperstack_parameters, pyramid_binning, compression):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    plain_path, pyramid_path = str(tmp_path / 'plain.tif'), str(tmp_path / 'pyramid.tif')
+    
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), plain_path, imagej_tags)
+    saveImageJHyperstack(hyperstack, 'TZCYX', dict(metadata), pyramid_path, imagej_tags, compression=compression,
+                         pyramid_levels=3, pyramid_binning=pyramid_binning)
+    
+    # ImageJ readers see the same hyperstack
+    with tifffile.TiffFile(pyramid_path) as pyramid, tifffile.TiffFile(plain_path) as plain:
+        assert pyramid.is_imagej
+        assert pyramid.pages[0].description == plain.pages[0].description
+        assert np.array_equal(pyramid.imagej_metadata['LUTs'], plain.imagej_metadata['LUTs'])
+        assert pyramid.pages[0].resolution == plain.pages[0].resolution
+        assert np.array_equal(pyramid.asarray(), hyperstack)
+        assert len(pyramid.pages) == len(plain.pages)
+    
+    # Pyramid-aware readers see the downsampled levels of every plane
+    with tifffile.TiffFile(pyramid_path, is_imagej=False) as pyramid:
+        levels = pyramid.series[0].levels
+        assert [level.shape for level in levels] == [(12, 65, 97), (12, 32, 48), (12, 16, 24), (12, 8, 12)]
+        expected_level = hyperstack.reshape(12, 65, 97)
+        for level in levels[1:]:
+            expected_level = np.stack([binPlane(plane, pyramid_binning) for plane in expected_level])
+            assert np.array_equal(level.asarray(), expected_level)
+        assert levels[1].pages[0].resolution == (1.0, 1.0)
+
+def test_pyramid_output_from_scratch_array(tmp_path, hyperstack_parameters):
+    hyperstack, imagej_tags, metadata = hyperstack_parameters
+    scratch_hyperstack = createScratchArray(str(tmp_path), hyperstack.shape, hyperstack.dtype)
+    scratch_hyperstack[:] = hyperstack
+    pyramid_path = str(tmp_path / 'pyramid.tif')
+    
+    saveImageJHyperstack(scratch_hyperstack, 'TZCYX', dict(metadata), pyramid_path, imagej_tags, pyramid_levels=1)
+    
+    assert np.array_equal(tifffile.imread(pyramid_path), hyperstack)
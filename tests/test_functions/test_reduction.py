@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from domilyzer.functions_gui.reduction_functions import REDUCTIONS, reduceAxis, getTileBounds, isRowMajor
+from domilyzer.functions_gui.outofcore_functions import createScratchArray
+from domilyzer.functions_gui.kernel_functions import projectStackInto
+
+def test_tile_bounds():
+    # 4 planes of 10 uint16 pixels per row, 80 bytes per row
+    assert getTileBounds((4, 7, 10), 2, tile_bytes=200) == [(0, 2), (2, 4), (4, 6), (6, 7)]
+    # At least one row per tile
+    assert getTileBounds((4, 3, 10), 2, tile_bytes=1) == [(0, 1), (1, 2), (2, 3)]
+    assert getTileBounds((4, 3, 10), 2, tile_bytes=10 ** 9) == [(0, 3)]
+
+def test_row_major(make_array):
+    stack = make_array((3, 5, 7), np.uint16)
+    assert isRowMajor(stack)
+    assert isRowMajor(stack[::2, :, 1::3])
+    assert not isRowMajor(np.moveaxis(stack, 0, -1))
+
+@pytest.mark.parametrize('reduction', REDUCTIONS)
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16, np.int32, np.float32, np.float64])
+@pytest.mark.parametrize('shape, axis', [((9, 37, 41), 0), ((3, 4, 2, 33, 29), 2), ((2, 5, 31, 19), -1)])
+@pytest.mark.parametrize('workers', [1, 3])
+def test_bit_identical_to_numpy(reduction, dtype, shape, axis, workers, make_array):
+    array = make_array(shape, dtype)
+    expected = getattr(np, reduction)(array, axis=axis)
+    # Small tiles, so every array is split into many of them
+    result = reduceAxis(array, axis, reduction, workers=workers, tile_bytes=512)
+
+    assert result.dtype == expected.dtype
+    assert result.tobytes() == expected.tobytes()
+
+@pytest.mark.parametrize('reduction', REDUCTIONS)
+def test_bit_identical_for_views(reduction, make_array):
+    array = make_array((6, 40, 50), np.float32)
+    # Strided and transposed views, and a reduction over Y, which is left to NumPy
+    for view, axis in [(array[::2, 3:, ::3], 0), (np.moveaxis(array, 0, -1), 2), (np.moveaxis(array, 0, -1), 0), (array, 1)]:
+        expected = getattr(np, reduction)(view, axis=axis)
+        assert reduceAxis(view, axis, reduction, workers=2, tile_bytes=256).tobytes() == expected.tobytes()
+
+def test_memmapped_input(tmp_path, make_array):
+    stack = createScratchArray(str(tmp_path), (8, 64, 48), np.uint16)
+    stack[:] = make_array((8, 64, 48), np.uint16)
+    projection = reduceAxis(stack, 0, 'max', workers=2, tile_bytes=1024)
+
+    assert not isinstance(projection, np.memmap)
+    assert np.array_equal(projection, np.max(np.asarray(stack), axis=0))
+
+def test_invalid_reduction(make_array):
+    with pytest.raises(ValueError):
+        reduceAxis(make_array((2, 3, 4), np.uint16), 0, 'median')
+
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+def test_projections_unchanged(projection_type, make_array):
+    stack = make_array((5, 64, 48), np.uint16)
+    # Rounded to uint16 like Bruker and Olympus averages, and kept as floats like Flamingo's
+    for dtype in [np.uint16, np.float64]:
+        expected = projectStackInto(stack, np.empty((64, 48), dtype=dtype), projection_type, use_numba=False)
+        projected = projectStackInto(stack, np.empty((64, 48), dtype=dtype), projection_type, reduce_workers=2, use_numba=False)
+        assert projected.tobytes() == expected.tobytes()
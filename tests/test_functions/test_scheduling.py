@@ -0,0 +1,104 @@
+import os
+import time
+import pytest
+import threading
+from domilyzer.functions_gui.engine_functions import READER_BACKENDS, ReaderBackend, registerReaderBackend
+from domilyzer.functions_gui.scheduling_functions import (
+    orderImageFolders,
+    estimateFolderPeakMemory,
+    runFoldersWithinMemoryBudget,
+    iterateFoldersWithinMemoryBudget
+)
+
+def test_scheduler_respects_ram_budget():
+    folder_estimates = {'a': 40, 'b': 30, 'c': 50, 'd': 20, 'e': 60, 'f': 10}
+    lock = threading.Lock()
+    running = set()
+    peak_bytes = [0]
+
+    def processFolder(folder_name, streaming):
+        with lock:
+            running.add(folder_name)
+            peak_bytes[0] = max(peak_bytes[0], sum(folder_estimates[name] for name in running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(folder_name)
+        return folder_name, streaming
+
+    results = runFoldersWithinMemoryBudget(folder_names=list(folder_estimates),
+                                           folder_estimates=folder_estimates,
+                                           process_folder=processFolder,
+                                           ram_budget_bytes=100,
+                                           max_workers=4)
+
+    assert results == [(folder_name, False) for folder_name in folder_estimates]
+    assert peak_bytes[0] <= 100
+
+def test_scheduler_runs_oversized_folders_alone_and_streaming():
+    folder_estimates = {'small_a': 10, 'huge': 500, 'small_b': 10}
+    lock = threading.Lock()
+    running = set()
+    overlaps = []
+
+    def processFolder(folder_name, streaming):
+        with lock:
+            running.add(folder_name)
+            if 'huge' in running and len(running) > 1:
+                overlaps.append(set(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(folder_name)
+        return streaming
+
+    results = runFoldersWithinMemoryBudget(folder_names=list(folder_estimates),
+                                           folder_estimates=folder_estimates,
+                                           process_folder=processFolder,
+                                           ram_budget_bytes=100)
+
+    assert results == [False, True, False]
+    assert overlaps == []
+
+def test_order_image_folders(tmp_path):
+    folder_sizes = {'b_small': 10, 'a_large': 1000, 'c_medium': 100}
+    for i, (folder_name, folder_bytes) in enumerate(folder_sizes.items()):
+        os.makedirs(os.path.join(tmp_path, folder_name))
+        with open(os.path.join(tmp_path, folder_name, 'image.tif'), 'wb') as file:
+            file.write(b'0' * folder_bytes)
+        os.utime(os.path.join(tmp_path, folder_name), (1000 + i, 1000 + i))
+    image_folders = list(folder_sizes)
+
+    assert orderImageFolders(tmp_path, image_folders, 'name') == ['a_large', 'b_small', 'c_medium']
+    assert orderImageFolders(tmp_path, image_folders, 'smallest_first') == ['b_small', 'c_medium', 'a_large']
+    assert orderImageFolders(tmp_path, image_folders, 'newest_first') == ['c_medium', 'a_large', 'b_small']
+    with pytest.raises(ValueError):
+        orderImageFolders(tmp_path, image_folders, 'random')
+
+def test_estimate_uses_the_factors_of_the_reader_backend(tmp_path):
+    with open(os.path.join(tmp_path, 'image.tif'), 'wb') as file:
+        file.write(b'0' * 1000)
+    registerReaderBackend(ReaderBackend('Synthetic', None, None, peak_memory_factors={'read': 2.0, 'streaming': 0.25}))
+    try:
+        assert estimateFolderPeakMemory(tmp_path, None, 'Synthetic') == 2000
+        assert estimateFolderPeakMemory(tmp_path, 'max', 'Synthetic', streaming=True) == 250
+        # Paths the backend does not calibrate use the defaults
+        assert estimateFolderPeakMemory(tmp_path, 'max', 'Synthetic') == 1400
+    finally:
+        del READER_BACKENDS['Synthetic']
+    with pytest.raises(ValueError):
+        estimateFolderPeakMemory(tmp_path, None, 'Unknown')
+
+def test_scheduler_yields_results_as_folders_complete():
+    folder_estimates = {'slow': 10, 'fast': 10, 'huge': 500}
+
+    def processFolder(folder_name, streaming):
+        time.sleep(0.2 if folder_name == 'slow' else 0)
+        return folder_name, streaming
+
+    results = list(iterateFoldersWithinMemoryBudget(folder_names=list(folder_estimates),
+                                                    folder_estimates=folder_estimates,
+                                                    process_folder=processFolder,
+                                                    ram_budget_bytes=100,
+                                                    max_workers=2))
+
+    # The fast folder completes first, the huge one runs alone once both are done
+    assert results == [('fast', ('fast', False)), ('slow', ('slow', False)), ('huge', ('huge', True))]
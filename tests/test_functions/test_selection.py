@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import tifffile
+from domilyzer.functions_gui.selection_functions import parseSelection, getSelectionStep, selectIndices, selectFilesByNumber
+from domilyzer.functions_gui.ingest_functions import IngestTransform
+from domilyzer.functions_gui.olympus_functions import planStackGroupsOlympus, extractTNumber
+from domilyzer.functions_gui.flamingo_functions import getFrameNumberFlamingo, getFrameNumbersFlamingo
+
+def test_parse_selection():
+    assert parseSelection(None) is None
+    assert parseSelection('') is None
+    assert parseSelection('10:40') == slice(10, 40)
+    assert parseSelection('::5') == slice(None, None, 5)
+    assert parseSelection('7') == slice(7, 8)
+    assert getSelectionStep(parseSelection('1:9:3')) == 3
+    assert getSelectionStep(None) == 1
+    for text in ['::0', '::-1', '-5:', '1:2:3:4']:
+        with pytest.raises(ValueError):
+            parseSelection(text)
+
+def test_select_indices():
+    assert selectIndices(10, slice(2, 8, 3)) == [2, 5]
+    assert selectIndices(3, None) == [0, 1, 2]
+    # Stops past the end are clipped, like list slicing
+    assert selectIndices(3, slice(1, 40)) == [1, 2]
+
+def test_select_files_by_number():
+    filenames = ['s_C001T003.tif', 's_C002T003.tif', 's_C001T001.tif', 's_C001T002.tif', 's_C001.tif']
+    # Positions in the sorted T numbers, files without one are kept
+    assert selectFilesByNumber(filenames, extractTNumber, slice(None, None, 2)) == ['s_C001T003.tif', 's_C002T003.tif', 's_C001T001.tif', 's_C001.tif']
+    assert selectFilesByNumber(filenames, extractTNumber, None) == filenames
+
+def test_flamingo_frame_numbers():
+    filenames = [f'S000_t{frame:06d}_V000_R0000_X000_Y000_C00_I{side}_D0_P00010.tif' for frame in [4, 2, 0] for side in [0, 1]]
+    assert getFrameNumberFlamingo(filenames[0]) == 4
+    assert getFrameNumberFlamingo('notes.tif') is None
+    assert getFrameNumbersFlamingo(filenames) == [0, 2, 4]
+    assert getFrameNumbersFlamingo(selectFilesByNumber(filenames, getFrameNumberFlamingo, slice(1, None))) == [2, 4]
+
+def test_olympus_stack_groups_selection():
+    channel_filenames = {'C001': [f's_C001Z{z:03d}T{t:03d}.tif' for t in range(1, 6) for z in range(1, 6)]}
+    stack_groups = planStackGroupsOlympus(channel_filenames, z_selection=slice(1, 4), t_selection=slice(None, None, 2))
+
+    assert [extractTNumber(files[0]) for _, files, _ in stack_groups] == [1, 3, 5]
+    assert [files for _, files, _ in stack_groups][0] == ['s_C001Z002T001.tif', 's_C001Z003T001.tif', 's_C001Z004T001.tif']
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_read_selected_pages(tmp_path, compression):
+    rng = np.random.default_rng(0)
+    stack = rng.integers(0, 4096, size=(9, 32, 48), dtype=np.uint16)
+    path = str(tmp_path / 'stack.tif')
+    tifffile.imwrite(path, stack, photometric='minisblack', compression=compression)
+    ingest_transform = IngestTransform(crop=(4, 2, 20, 10), pages=slice(1, 8, 3))
+
+    assert np.array_equal(ingest_transform.read(path), stack[1:8:3, 2:12, 4:24])
+    assert np.array_equal(ingest_transform.apply(stack), stack[1:8:3, 2:12, 4:24])
+    assert ingest_transform.getOutputShape(stack.shape) == (3, 10, 20)
+    # Single pages have no pages to select
+    assert IngestTransform(pages=slice(1, 2)).apply(stack[0]).shape == (32, 48)
+    with pytest.raises(ValueError):
+        IngestTransform(pages=slice(20, 30)).read(path)
@@ -0,0 +1,87 @@
+import os
+import pytest
+import numpy as np
+import tifffile
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures.process import BrokenProcessPool
+from domilyzer.functions_gui.shared_memory_functions import SharedArrayManager, projectFilesInProcesses
+from domilyzer.functions_gui.engine_functions import projectFileStack
+from domilyzer.functions_gui.tracing_functions import PipelineTracer
+
+def crashingProjection(image, projection_type):
+    # Kills worker processes outright, like a segfault would
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return projectFileStack(image, projection_type)
+
+@pytest.fixture
+def stack_paths(tmp_path):
+    rng = np.random.default_rng(0)
+    stacks = [rng.integers(0, 4096, size=(5, 16, 24), dtype=np.uint16) for _ in range(4)]
+    paths = []
+    for index, stack in enumerate(stacks):
+        path = os.path.join(tmp_path, f'stack_{index}.tif')
+        tifffile.imwrite(path, stack, photometric='minisblack')
+        paths.append(path)
+    return stacks, paths
+
+@pytest.mark.parametrize('projection_type', ['max', 'avg'])
+def test_process_projection_matches_in_process(stack_paths, projection_type):
+    stacks, paths = stack_paths
+    planes, bytes_read = projectFilesInProcesses(paths, project_function=projectFileStack, projection_type=projection_type, process_workers=2)
+
+    assert bytes_read == sum(stack.nbytes for stack in stacks)
+    expected = np.stack([projectFileStack(stack, projection_type) for stack in stacks])
+    assert planes.dtype == expected.dtype
+    np.testing.assert_array_equal(planes, expected)
+
+def test_arrays_outlive_manager_and_segments_are_unlinked():
+    with SharedArrayManager() as shared_arrays:
+        array, descriptor = shared_arrays.createArray((3, 4), np.uint16)
+        array[:] = 7
+        planes = list(array)
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=descriptor['name'])
+    del array
+    assert sum(plane.sum() for plane in planes) == 7 * 12
+
+def test_worker_crash_raises_and_cleans_up(stack_paths, monkeypatch):
+    _, paths = stack_paths
+    created_names = []
+    original_create = SharedArrayManager.createArray
+
+    def recordingCreate(self, shape, dtype):
+        array, descriptor = original_create(self, shape, dtype)
+        created_names.append(descriptor['name'])
+        return array, descriptor
+
+    monkeypatch.setattr(SharedArrayManager, 'createArray', recordingCreate)
+    with pytest.raises(BrokenProcessPool):
+        projectFilesInProcesses(paths, project_function=crashingProjection, projection_type='max', process_workers=2)
+
+    assert len(created_names) == 1
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=created_names[0])
+
+def test_worker_reads_are_traced(stack_paths):
+    _, paths = stack_paths
+    tracer = PipelineTracer()
+    projectFilesInProcesses(paths, project_function=projectFileStack, projection_type='max', process_workers=2, tracer=tracer)
+
+    begin_events = [event for event in tracer.events if event['ph'] == 'B']
+    # Every file is read and projected once, the first one in this process and the others in the workers
+    for category in ['read', 'projection']:
+        assert sorted(event['name'] for event in begin_events if event['cat'] == category) == sorted(os.path.basename(path) for path in paths)
+    worker_pids = {event['pid'] for event in begin_events} - {os.getpid()}
+    assert 1 <= len(worker_pids) <= 2
+    # Each worker track is labelled once, and the events are on the parent's timeline
+    assert sorted(event['pid'] for event in tracer.events if event['ph'] == 'M') == sorted({os.getpid()} | worker_pids)
+    assert all(0 <= event['ts'] <= tracer.timestamp() for event in begin_events)
+    open_spans = {}
+    for event in tracer.events:
+        if event['ph'] == 'B':
+            open_spans.setdefault((event['pid'], event['tid']), []).append(event['name'])
+        elif event['ph'] == 'E':
+            assert open_spans[(event['pid'], event['tid'])].pop() == event['name']
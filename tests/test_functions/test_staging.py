@@ -0,0 +1,103 @@
+import os
+import pytest
+from benchmarks.synthetic_data import generateBrukerFolder
+from domilyzer.functions_gui.staging_functions import StagingCache
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.engine_functions import convertFolder
+
+def createFolder(parent_path, folder_name, num_files, file_bytes):
+    folder_path = os.path.join(parent_path, folder_name)
+    os.makedirs(os.path.join(folder_path, 'References'))
+    for i in range(num_files):
+        with open(os.path.join(folder_path, f'{folder_name}_Cycle{i:05d}_Ch1_000001.ome.tif'), 'wb') as file:
+            file.write(os.urandom(file_bytes))
+    with open(os.path.join(folder_path, 'References', 'reference.tif'), 'wb') as file:
+        file.write(b'reference')
+    return folder_path
+
+@pytest.fixture
+def source_path(tmp_path):
+    source_path = os.path.join(tmp_path, 'share')
+    for folder_name in ['folder_a', 'folder_b', 'folder_c']:
+        createFolder(source_path, folder_name, num_files=4, file_bytes=1000)
+    return source_path
+
+def test_stage_copies_folder(source_path, tmp_path):
+    cache = StagingCache(cache_dir=os.path.join(tmp_path, 'scratch'), max_bytes=10 ** 6)
+    staged_path = cache.stage(os.path.join(source_path, 'folder_a'))
+
+    assert staged_path.startswith(cache.cache_dir)
+    assert sorted(os.listdir(staged_path)) == sorted(os.listdir(os.path.join(source_path, 'folder_a')))
+    assert os.path.exists(os.path.join(staged_path, 'References', 'reference.tif'))
+
+def test_stage_reuses_copy_until_source_changes(source_path, tmp_path):
+    cache = StagingCache(cache_dir=os.path.join(tmp_path, 'scratch'), max_bytes=10 ** 6)
+    folder_path = os.path.join(source_path, 'folder_a')
+    staged_path = cache.stage(folder_path)
+    marker_path = os.path.join(staged_path, 'marker')
+    open(marker_path, 'w').close()
+
+    assert cache.stage(folder_path) == staged_path
+    assert os.path.exists(marker_path)
+
+    with open(os.path.join(folder_path, 'new_file.tif'), 'wb') as file:
+        file.write(b'new')
+
+    assert cache.stage(folder_path) != staged_path
+
+def stageAndRelease(cache, folder_path):
+    staged_path = cache.stage(folder_path)
+    cache.release(os.path.basename(staged_path))
+    return staged_path
+
+def test_stage_evicts_least_recently_used(source_path, tmp_path):
+    # Room for two of the three folders
+    cache = StagingCache(cache_dir=os.path.join(tmp_path, 'scratch'), max_bytes=9000)
+    staged_a = stageAndRelease(cache, os.path.join(source_path, 'folder_a'))
+    staged_b = stageAndRelease(cache, os.path.join(source_path, 'folder_b'))
+    stageAndRelease(cache, os.path.join(source_path, 'folder_a'))
+    staged_c = stageAndRelease(cache, os.path.join(source_path, 'folder_c'))
+
+    assert os.path.isdir(staged_a)
+    assert not os.path.exists(staged_b)
+    assert os.path.isdir(staged_c)
+    assert cache.totalBytes() <= 9000
+
+def test_stage_keeps_folders_in_use(source_path, tmp_path):
+    # Room for two of the three folders, but folder_a and folder_b are still being converted
+    cache = StagingCache(cache_dir=os.path.join(tmp_path, 'scratch'), max_bytes=9000)
+    staged_a = cache.stage(os.path.join(source_path, 'folder_a'))
+    staged_b = cache.stage(os.path.join(source_path, 'folder_b'))
+    staged_c = stageAndRelease(cache, os.path.join(source_path, 'folder_c'))
+
+    assert all(os.path.isdir(staged_path) for staged_path in [staged_a, staged_b, staged_c])
+    assert cache.isInUse(os.path.basename(staged_a)) and not cache.isInUse(os.path.basename(staged_c))
+    assert cache.totalBytes() > 9000
+
+    # Once released, the least recently used one is evicted the next time a folder is staged
+    cache.release(os.path.basename(staged_a))
+    cache.release(os.path.basename(staged_b))
+    stageAndRelease(cache, os.path.join(source_path, 'folder_c'))
+    assert not os.path.exists(staged_a) and os.path.isdir(staged_b)
+    assert cache.totalBytes() <= 9000
+    with pytest.raises(ValueError):
+        cache.release(os.path.basename(staged_a))
+
+def test_convert_folder_releases_staged_folder(tmp_path):
+    cache = StagingCache(cache_dir=os.path.join(tmp_path, 'scratch'), max_bytes=10 ** 6)
+    folder_path = generateBrukerFolder(str(tmp_path), 'bruker', T=2, Z=2, C=1, Y=8, X=8)
+    options = ConversionOptions(projection_type='max', staging_cache=cache)
+    convertFolder(folder_path, 'Bruker', options=options)
+    [staging_name] = cache.loadIndex()
+    assert not cache.isInUse(staging_name)
+
+    # Released when the conversion fails too, here writing to a missing directory
+    with pytest.raises(Exception):
+        convertFolder(folder_path, 'Bruker', os.path.join(tmp_path, 'missing'), options)
+    assert not cache.isInUse(staging_name)
+
+def test_stage_skips_folders_larger_than_cache(source_path, tmp_path):
+    cache = StagingCache(cache_dir=os.path.join(tmp_path, 'scratch'), max_bytes=100)
+    folder_path = os.path.join(source_path, 'folder_a')
+
+    assert cache.stage(folder_path) == folder_path
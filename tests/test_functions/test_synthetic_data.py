@@ -0,0 +1,71 @@
+import os
+import numpy as np
+from benchmarks.synthetic_data import generatePlanePool, getPlanes, generateBrukerFolder, generateOlympusFolder
+from benchmarks.run_benchmarks import SCENARIOS, generateScenarioData, runScenario
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.workflows.olympus_workflow import iterateOlympusImages
+
+def test_synthetic_bruker_folder_converts_to_generated_planes(tmp_path):
+    T, Z, C, Y, X = 3, 4, 2, 16, 24
+    generateBrukerFolder(str(tmp_path), 'synthetic-001', T=T, Z=Z, C=C, Y=Y, X=X)
+    log_details = {'Files Not Processed': [], 'Files Processed': [], 'Issues': [], 'Other Notes': []}
+    results = list(iterateBrukerImages(parent_folder_path=str(tmp_path),
+                                       image_folders=['synthetic-001'],
+                                       processed_images_path=str(tmp_path),
+                                       metadata_csv_path=None,
+                                       options=ConversionOptions(test=True),
+                                       log_details=log_details,
+                                       return_hyperstacks=True))
+
+    assert log_details['Files Not Processed'] == []
+    assert [result.name for result in results] == ['synthetic-001'] and results[0].output_path is None
+    hyperstack = results[0].hyperstack
+    assert hyperstack.shape == (T, Z, C, Y, X)
+    plane_pool = generatePlanePool((Y, X))
+    for t in range(T):
+        for c in range(C):
+            np.testing.assert_array_equal(hyperstack[t, :, c], getPlanes(plane_pool, ((t + 1) * C + c + 1) * Z, Z))
+
+def test_synthetic_olympus_folder_converts(tmp_path):
+    generateOlympusFolder(str(tmp_path), 'synthetic', T=3, Z=2, C=2, Y=16, X=24)
+    results = list(iterateOlympusImages(parent_folder_path=str(tmp_path),
+                                        image_folders=['synthetic.oif.files'],
+                                        processed_images_path=str(tmp_path),
+                                        options=ConversionOptions(projection_type='max', test=True),
+                                        return_hyperstacks=True))
+
+    assert results[0].image_type == 'multiplane_multiframe_maxproject'
+    assert results[0].hyperstack.shape == (3, 2, 16, 24)
+
+def test_smoke_scenarios_report_throughput_and_memory(tmp_path):
+    for scenario in SCENARIOS['smoke']:
+        parent_folder_path = generateScenarioData(scenario, str(tmp_path))
+        result = runScenario(scenario, parent_folder_path, os.path.join(tmp_path, 'output'), repeat=1, read_ahead=2)
+
+        assert len(result['seconds']) == 1
+        assert result['input_bytes'] > 0 and result['output_bytes'] > 0
+        assert result['input_mb_per_second'] > 0
+        assert result['peak_traced_bytes'] > 0
+        assert 'read' in result['stage_totals'] and 'write' in result['stage_totals']
+
+def test_bruker_results_are_yielded_as_folders_complete(tmp_path):
+    for folder_name in ['synthetic-001', 'synthetic-002']:
+        generateBrukerFolder(str(tmp_path), folder_name, T=2, Z=3, C=1, Y=16, X=24)
+    output_path = tmp_path / 'output'
+    output_path.mkdir()
+    results = iterateBrukerImages(parent_folder_path=str(tmp_path),
+                                  image_folders=['synthetic-001', 'synthetic-002'],
+                                  processed_images_path=str(output_path),
+                                  metadata_csv_path=str(output_path / '!image_metadata.csv'),
+                                  options=ConversionOptions(projection_type='max'),
+                                  log_details={'Files Not Processed': [], 'Files Processed': [], 'Issues': [], 'Other Notes': []})
+
+    # Nothing is converted until a result is asked for, and only one folder at a time
+    assert os.listdir(output_path) == []
+    first_result = next(results)
+    assert first_result.name == 'synthetic-001' and first_result.processed
+    assert first_result.output_path == str(output_path / 'MAX_synthetic-001_raw.tif')
+    assert first_result.hyperstack is None and first_result.metadata['framerate'] > 0
+    assert sorted(os.listdir(output_path)) == ['!image_metadata.csv', 'MAX_synthetic-001_raw.tif']
+    assert [result.name for result in results] == ['synthetic-002']
@@ -0,0 +1,151 @@
+import json
+import numpy as np
+import pytest
+import tifffile
+from benchmarks.synthetic_data import generatePlanePool, getPlanes, generateBrukerFolder
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.ingest_functions import binImage, createIngestTransform
+from domilyzer.functions_gui.lazy_functions import LazyHyperstack
+from domilyzer.functions_gui.engine_functions import convertFolder, getReaderBackend
+from domilyzer.functions_gui.transform_functions import (USER_TRANSFORMS, UserTransforms, DarkFrameSubtraction, FlatFieldCorrection,
+                                                         ClipValues, registerUserTransform, createUserTransforms)
+
+@pytest.fixture
+def stack():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4096, size=(4, 65, 97), dtype=np.uint16)
+
+@pytest.fixture
+def dark_frame():
+    rng = np.random.default_rng(1)
+    return rng.integers(90, 110, size=(65, 97)).astype(np.float32)
+
+def test_builtin_transforms(stack, dark_frame):
+    plane = stack[0]
+    user_transforms = UserTransforms([DarkFrameSubtraction(dark_frame)])
+    corrected = user_transforms.apply(plane)
+    assert corrected.dtype == np.uint16
+    assert np.array_equal(corrected, np.clip(np.round(plane - dark_frame), 0, None).astype(np.uint16))
+
+    # A stack of dark frames is averaged, and the flat field is normalized to a mean of 1
+    flat_field = np.linspace(0.5, 1.5, 97, dtype=np.float32)[np.newaxis].repeat(65, axis=0)
+    user_transforms = UserTransforms([DarkFrameSubtraction(np.stack([dark_frame - 1, dark_frame + 1])),
+                                      FlatFieldCorrection(flat_field * 200)])
+    expected = np.clip(np.round(plane - dark_frame), 0, None) / flat_field
+    # Up to rounding of the normalized flat field
+    assert np.abs(user_transforms.apply(plane) - expected).max() <= 0.5 + 1e-3
+
+    assert np.array_equal(UserTransforms([ClipValues(maximum=1000)]).apply(stack), np.minimum(stack, 1000))
+    with pytest.raises(ValueError):
+        ClipValues()
+    with pytest.raises(ValueError):
+        DarkFrameSubtraction(dark_frame[:10])(plane)
+
+def test_transform_levels(stack):
+    calls = []
+    user_transforms = UserTransforms()
+
+    @user_transforms.register
+    def invert(plane):
+        calls.append(plane.shape)
+        return 4095 - plane
+
+    # Subtract the mean of the Z-stack, the corrected values are clipped at 0
+    user_transforms.register(lambda frame: frame.astype(np.float64) - frame.mean(axis=0), level='frame')
+    corrected = user_transforms.apply(stack)
+    assert calls == [(65, 97)] * 4
+    inverted = 4095 - stack
+    assert np.array_equal(corrected, np.clip(np.round(inverted - inverted.mean(axis=0)), 0, None).astype(np.uint16))
+    assert len(user_transforms) == 2
+
+    with pytest.raises(ValueError):
+        UserTransforms([(invert, 'pixel')])
+    with pytest.raises(TypeError):
+        UserTransforms(['dark_frame'])
+    with pytest.raises(ValueError):
+        UserTransforms([lambda plane: plane[:10]]).apply(stack)
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_ingest_applies_transforms_before_binning(tmp_path, stack, dark_frame, compression):
+    file_path = str(tmp_path / 'stack.tif')
+    tifffile.imwrite(file_path, stack, photometric='minisblack', compression=compression)
+    user_transforms = UserTransforms([DarkFrameSubtraction(dark_frame), ClipValues(maximum=3000)])
+    ingest_transform = createIngestTransform((5, 10, 40, 30), binning=2, pages=slice(1, None), user_transforms=user_transforms)
+
+    # Same as correcting the raw planes, then cropping and binning them
+    expected = binImage(user_transforms.apply(stack[1:])[:, 10:40, 5:45], 2)
+    assert np.array_equal(ingest_transform.read(file_path), expected)
+    assert np.array_equal(ingest_transform.apply(stack), expected)
+    hyperstack = LazyHyperstack({(0, z, 0): [(file_path, page)] for z, page in enumerate([1, 2, 3])}, (1, 3, 1), ingest_transform)
+    assert np.array_equal(hyperstack[0, :, 0], expected)
+    # Transforms alone make an ingest transform
+    assert createIngestTransform(user_transforms=user_transforms) is not None
+    assert createIngestTransform(user_transforms=UserTransforms()) is None
+
+def test_frame_transforms_get_the_same_stacks_from_the_engine_and_lazy_hyperstacks(tmp_path):
+    folder_path = generateBrukerFolder(str(tmp_path), 'synthetic-001', T=2, Z=5, C=2, Y=16, X=24)
+    shapes = []
+
+    def subtractStackMean(frame):
+        shapes.append(frame.shape)
+        return frame.astype(np.float64) - frame.mean(axis=0) + 2048
+
+    options = ConversionOptions(test=True, crop=(2, 3, 16, 10), z_selection=slice(1, None),
+                                user_transforms=UserTransforms([(subtractStackMean, 'frame')]))
+    converted = convertFolder(folder_path, 'Bruker', options=options, return_hyperstack=True).hyperstack
+    engine_shapes = set(shapes)
+    shapes.clear()
+
+    # Indexing a single plane still corrects it with the stack of the selected Z planes of its file
+    backend = getReaderBackend('Bruker')
+    ingest_transform = createIngestTransform(options.crop, pages=backend.page_selection(options), user_transforms=options.user_transforms)
+    hyperstack = backend.index_folder(folder_path, ingest_transform, options).hyperstack
+    plane = hyperstack[1, 2, 0]
+    assert engine_shapes == set(shapes) == {(4, 10, 16)}
+    assert np.array_equal(plane, converted[1, 2, 0])
+    assert np.array_equal(hyperstack[...], converted)
+
+def test_create_user_transforms(tmp_path, dark_frame):
+    dark_frame_path = str(tmp_path / 'dark.tif')
+    tifffile.imwrite(dark_frame_path, dark_frame)
+    config_path = str(tmp_path / 'transforms.json')
+    with open(config_path, 'w') as file:
+        json.dump([{'transform': 'dark_frame', 'dark_frame': dark_frame_path},
+                   {'transform': 'clip', 'minimum': 10, 'level': 'frame'}], file)
+
+    user_transforms = createUserTransforms(config_path)
+    assert [(type(function), level) for function, level in user_transforms.transforms] == [(DarkFrameSubtraction, 'plane'), (ClipValues, 'frame')]
+    assert np.array_equal(user_transforms.transforms[0][0].dark_frame, dark_frame)
+    assert createUserTransforms([]) is None
+    with pytest.raises(ValueError):
+        createUserTransforms([{'transform': 'denoise'}])
+
+    registerUserTransform('offset', lambda value: lambda plane: plane.astype(np.int64) + value)
+    try:
+        offset = createUserTransforms([{'transform': 'offset', 'value': 70000}])
+        # Converted back to uint16, saturating
+        assert offset.apply(np.array([[0, 10]], dtype=np.uint16)).tolist() == [[65535, 65535]]
+    finally:
+        del USER_TRANSFORMS['offset']
+
+def test_workflow_corrects_planes_before_projection(tmp_path):
+    T, Z, C, Y, X = 2, 4, 2, 16, 24
+    generateBrukerFolder(str(tmp_path), 'synthetic-001', T=T, Z=Z, C=C, Y=Y, X=X)
+    dark_frame = np.full((Y, X), 500, dtype=np.uint16)
+    results = list(iterateBrukerImages(parent_folder_path=str(tmp_path),
+                                       image_folders=['synthetic-001'],
+                                       processed_images_path=str(tmp_path),
+                                       metadata_csv_path=None,
+                                       options=ConversionOptions(projection_type='avg', test=True,
+                                                                 user_transforms=UserTransforms([DarkFrameSubtraction(dark_frame)])),
+                                       log_details={'Files Not Processed': [], 'Files Processed': [], 'Issues': [], 'Other Notes': []},
+                                       return_hyperstacks=True))
+
+    hyperstack = results[0].hyperstack
+    plane_pool = generatePlanePool((Y, X))
+    for t in range(T):
+        for c in range(C):
+            planes = getPlanes(plane_pool, ((t + 1) * C + c + 1) * Z, Z)
+            corrected = np.clip(planes.astype(np.int64) - 500, 0, None)
+            np.testing.assert_array_equal(hyperstack[t, c], np.round(corrected.mean(axis=0)).astype(np.uint16))
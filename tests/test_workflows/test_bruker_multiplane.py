@@ -2,7 +2,9 @@ import os
 import pytest
 import numpy as np
 import pandas as pd
-from domilyzer.workflows.bruker_workflow import processBrukerImages
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
+from domilyzer.functions_gui.ingest_functions import binImage
 
 from domilyzer.functions_gui.general_functions import createImageJMetadataTags
 
@@ -50,18 +52,96 @@ def test_bruker_multiplane_workflow(default_parameters):
     loaded_arrays = np.load('tests/assets/bruker_multiplane_hyperstack_arrays.npz')
     known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
     
-    log_details, list_of_arrays = processBrukerImages(parent_folder_path=default_parameters['folder_path'],
-                                                         image_folders=default_parameters['image_folders'],
-                                                         processed_images_path='none',
-                                                         metadata_csv_path=default_parameters['metadata_csv_path'],
-                                                         microscope_type=default_parameters['microscope_type'],
-                                                         projection_type=default_parameters['projection_type'],
-                                                         single_plane=default_parameters['single_plane'],
-                                                         auto_metadata_extract=default_parameters['auto_metadata_extract'],
-                                                         test=default_parameters['test'],
-                                                         imagej_tags=default_parameters['imagej_tags'],
-                                                         log_details=default_parameters['log_details']
-                                                         )
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags']),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
     
+    assert len(list_of_arrays) == len(known_arrays)
     for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
-        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
\ No newline at end of file
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+def test_bruker_multiplane_workflow_out_of_core(default_parameters, tmp_path):
+    loaded_arrays = np.load('tests/assets/bruker_multiplane_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # Hyperstacks are assembled in disk-backed arrays in the scratch directory
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 scratch_directory=str(tmp_path)),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert isinstance(arr1, np.memmap)
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+@pytest.mark.parametrize('scratch', [False, True])
+def test_bruker_multiplane_workflow_crop_and_binning(default_parameters, tmp_path, scratch):
+    loaded_arrays = np.load('tests/assets/bruker_multiplane_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # Every plane is cropped to a 60 x 50 pixel region and 2 x 2 binned as it is read
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 scratch_directory=str(tmp_path) if scratch else None,
+                                                                 crop=(10, 20, 60, 50),
+                                                                 binning=2,
+                                                                 binning_mode='sum'),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert np.array_equal(arr1, binImage(arr2[..., 20:70, 10:70], 2, 'sum')), f"Arrays at index {i} differ"
+
+@pytest.mark.parametrize('scratch', [False, True])
+def test_bruker_multiplane_workflow_z_and_t_selection(default_parameters, tmp_path, scratch):
+    loaded_arrays = np.load('tests/assets/bruker_multiplane_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # Z planes 1 to 3 of every other cycle
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 scratch_directory=str(tmp_path) if scratch else None,
+                                                                 z_selection=slice(1, 4),
+                                                                 t_selection=slice(None, None, 2)),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert np.array_equal(arr1, arr2[::2, 1:4]), f"Arrays at index {i} differ"
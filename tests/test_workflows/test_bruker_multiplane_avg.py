@@ -2,7 +2,8 @@ import os
 import pytest
 import numpy as np
 import pandas as pd
-from domilyzer.workflows.bruker_workflow import processBrukerImages
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
 
 from domilyzer.functions_gui.general_functions import createImageJMetadataTags
 
@@ -50,18 +51,89 @@ def test_bruker_avg_workflow(default_parameters):
     loaded_arrays = np.load('tests/assets/bruker_multiplane_avg_hyperstack_arrays.npz')
     known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
     
-    log_details, list_of_arrays = processBrukerImages(parent_folder_path=default_parameters['folder_path'],
-                                                         image_folders=default_parameters['image_folders'],
-                                                         processed_images_path='none',
-                                                         metadata_csv_path=default_parameters['metadata_csv_path'],
-                                                         microscope_type=default_parameters['microscope_type'],
-                                                         projection_type=default_parameters['projection_type'],
-                                                         single_plane=default_parameters['single_plane'],
-                                                         auto_metadata_extract=default_parameters['auto_metadata_extract'],
-                                                         test=default_parameters['test'],
-                                                         imagej_tags=default_parameters['imagej_tags'],
-                                                         log_details=default_parameters['log_details']
-                                                         )
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags']),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
     
+    assert len(list_of_arrays) == len(known_arrays)
     for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
-        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
\ No newline at end of file
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+def test_bruker_avg_workflow_streaming(default_parameters):
+    loaded_arrays = np.load('tests/assets/bruker_multiplane_avg_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # A RAM budget smaller than any folder sends every folder down the streaming path
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 ram_budget_bytes=1),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+def test_bruker_avg_workflow_process_workers(default_parameters):
+    loaded_arrays = np.load('tests/assets/bruker_multiplane_avg_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # Stacks are projected in worker processes and handed back through shared memory
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 process_workers=2),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+@pytest.mark.parametrize('ram_budget_bytes', [None, 1])
+def test_bruker_avg_workflow_reduce_workers(default_parameters, ram_budget_bytes):
+    loaded_arrays = np.load('tests/assets/bruker_multiplane_avg_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # Stacks are projected in tiles of rows by a thread pool, in memory and while streaming
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 ram_budget_bytes=ram_budget_bytes,
+                                                                 reduce_workers=2),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
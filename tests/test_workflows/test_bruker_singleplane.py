@@ -2,7 +2,8 @@ import os
 import pytest
 import numpy as np
 import pandas as pd
-from domilyzer.workflows.bruker_workflow import processBrukerImages
+from domilyzer.workflows.bruker_workflow import iterateBrukerImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
 
 from domilyzer.functions_gui.general_functions import createImageJMetadataTags
 
@@ -50,18 +51,42 @@ def test_bruker_singleplane_workflow(default_parameters):
     loaded_arrays = np.load('tests/assets/bruker_singleplane_hyperstack_arrays.npz')
     known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
     
-    log_details, list_of_arrays = processBrukerImages(parent_folder_path=default_parameters['folder_path'],
-                                                         image_folders=default_parameters['image_folders'],
-                                                         processed_images_path='none',
-                                                         metadata_csv_path=default_parameters['metadata_csv_path'],
-                                                         microscope_type=default_parameters['microscope_type'],
-                                                         projection_type=default_parameters['projection_type'],
-                                                         single_plane=default_parameters['single_plane'],
-                                                         auto_metadata_extract=default_parameters['auto_metadata_extract'],
-                                                         test=default_parameters['test'],
-                                                         imagej_tags=default_parameters['imagej_tags'],
-                                                         log_details=default_parameters['log_details']
-                                                         )
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags']),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
     
+    assert len(list_of_arrays) == len(known_arrays)
     for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
-        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
\ No newline at end of file
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+def test_bruker_singleplane_workflow_t_selection(default_parameters):
+    loaded_arrays = np.load('tests/assets/bruker_singleplane_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # The frames of a single plane are the pages of its files, single-frame folders are unchanged
+    results = list(iterateBrukerImages(parent_folder_path=default_parameters['folder_path'],
+                                       image_folders=default_parameters['image_folders'],
+                                       processed_images_path='none',
+                                       metadata_csv_path=default_parameters['metadata_csv_path'],
+                                       options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                 single_plane=default_parameters['single_plane'],
+                                                                 auto_metadata_extract=default_parameters['auto_metadata_extract'],
+                                                                 test=default_parameters['test'],
+                                                                 imagej_tags=default_parameters['imagej_tags'],
+                                                                 t_selection=slice(1, None, 2)),
+                                       log_details=default_parameters['log_details'],
+                                       return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(known_arrays)
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        expected = arr2[1::2] if arr2.ndim == 5 else arr2
+        assert np.array_equal(arr1, expected), f"Arrays at index {i} differ"
@@ -2,7 +2,8 @@ import os
 import pytest
 import numpy as np
 import pandas as pd
-from domilyzer.workflows.olympus_workflow import processOlympusImages
+from domilyzer.workflows.olympus_workflow import iterateOlympusImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
 
 from domilyzer.functions_gui.general_functions import createImageJMetadataTags
 
@@ -41,14 +42,16 @@ def test_olympus_max_workflow(default_parameters):
     loaded_arrays = np.load('tests/assets/olympus_avg_hyperstack_arrays.npz')
     known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
     
-    list_of_arrays = processOlympusImages(parent_folder_path=default_parameters['folder_path'],
+    results = list(iterateOlympusImages(parent_folder_path=default_parameters['folder_path'],
                                         image_folders=default_parameters['image_folders'],
                                         processed_images_path='none',
-                                        microscope_type=default_parameters['microscope_type'],
-                                        projection_type=default_parameters['projection_type'],
-                                        imagej_tags=default_parameters['imagej_tags'],
-                                        test=default_parameters['test'])
+                                        options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                  imagej_tags=default_parameters['imagej_tags'],
+                                                                  test=default_parameters['test']),
+                                        return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
                                                          
+    assert len(list_of_arrays) == len(default_parameters['image_folders'])
     
     for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
         assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
\ No newline at end of file
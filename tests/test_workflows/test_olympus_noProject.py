@@ -2,7 +2,9 @@ import os
 import pytest
 import numpy as np
 import pandas as pd
-from domilyzer.workflows.olympus_workflow import processOlympusImages
+import tifffile
+from domilyzer.workflows.olympus_workflow import iterateOlympusImages
+from domilyzer.functions_gui.options_functions import ConversionOptions
 
 from domilyzer.functions_gui.general_functions import createImageJMetadataTags
 
@@ -41,14 +43,72 @@ def test_olympus_max_workflow(default_parameters):
     loaded_arrays = np.load('tests/assets/olympus_noProject_hyperstack_arrays.npz')
     known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
     
-    list_of_arrays = processOlympusImages(parent_folder_path=default_parameters['folder_path'],
+    results = list(iterateOlympusImages(parent_folder_path=default_parameters['folder_path'],
                                         image_folders=default_parameters['image_folders'],
                                         processed_images_path='none',
-                                        microscope_type=default_parameters['microscope_type'],
-                                        projection_type=default_parameters['projection_type'],
-                                        imagej_tags=default_parameters['imagej_tags'],
-                                        test=default_parameters['test'])
+                                        options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                  imagej_tags=default_parameters['imagej_tags'],
+                                                                  test=default_parameters['test']),
+                                        return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
                                                          
+    assert len(list_of_arrays) == len(default_parameters['image_folders'])
     
     for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
-        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
\ No newline at end of file
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+def test_olympus_noProject_workflow_out_of_core(default_parameters, tmp_path):
+    loaded_arrays = np.load('tests/assets/olympus_noProject_hyperstack_arrays.npz')
+    known_arrays = [loaded_arrays[f'array_{i}'] for i in range(len(loaded_arrays.files))]
+    
+    # Hyperstacks are assembled in disk-backed arrays in the scratch directory
+    results = list(iterateOlympusImages(parent_folder_path=default_parameters['folder_path'],
+                                        image_folders=default_parameters['image_folders'],
+                                        processed_images_path='none',
+                                        options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                  imagej_tags=default_parameters['imagej_tags'],
+                                                                  test=default_parameters['test'],
+                                                                  scratch_directory=str(tmp_path)),
+                                        return_hyperstacks=True))
+    list_of_arrays = [result.hyperstack for result in results if result.processed]
+    
+    assert len(list_of_arrays) == len(default_parameters['image_folders'])
+    for i, (arr1, arr2) in enumerate(zip(list_of_arrays, known_arrays)):
+        assert isinstance(arr1, np.memmap)
+        assert np.array_equal(arr1, arr2), f"Arrays at index {i} differ"
+
+@pytest.mark.parametrize('scratch', [False, True])
+def test_olympus_noProject_workflow_z_and_t_selection(default_parameters, tmp_path, scratch):
+    image_folders = ['2C_5T_5Z.oif.files']
+    imagej_tags = createImageJMetadataTags(LUTs = {'LUTs': [np.zeros((3, 256), dtype='uint8')] * 2})
+    full_path, selected_path = tmp_path / 'full', tmp_path / 'selected'
+    full_path.mkdir()
+    selected_path.mkdir()
+    
+    [full_result] = iterateOlympusImages(parent_folder_path=default_parameters['folder_path'],
+                                         image_folders=image_folders,
+                                         processed_images_path=str(full_path),
+                                         options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                   imagej_tags=imagej_tags,
+                                                                   test=False),
+                                         return_hyperstacks=True)
+    # Z planes 1 to 3 of every other frame, the other files are never read
+    [selected_result] = iterateOlympusImages(parent_folder_path=default_parameters['folder_path'],
+                                             image_folders=image_folders,
+                                             processed_images_path=str(selected_path),
+                                             options=ConversionOptions(projection_type=default_parameters['projection_type'],
+                                                                       imagej_tags=imagej_tags,
+                                                                       test=False,
+                                                                       scratch_directory=str(tmp_path) if scratch else None,
+                                                                       z_selection=slice(1, 4),
+                                                                       t_selection=slice(None, None, 2)),
+                                             return_hyperstacks=True)
+    
+    assert np.array_equal(selected_result.hyperstack, full_result.hyperstack[::2, 1:4])
+    assert selected_result.output_path == str(selected_path / '2C_5T_5Z_raw.tif')
+    
+    # The frame interval written matches the frames kept
+    with tifffile.TiffFile(full_result.output_path) as full_tif, \
+         tifffile.TiffFile(selected_result.output_path) as selected_tif:
+        assert selected_tif.imagej_metadata['frames'] == 3
+        assert selected_tif.imagej_metadata['finterval'] == pytest.approx(2 * full_tif.imagej_metadata['finterval'])